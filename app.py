@@ -1,27 +1,63 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, Response, stream_with_context, make_response, g, has_request_context, abort, send_file
 from flask_cors import CORS
 import hashlib
+import hmac
 import json
+import logging
+import mimetypes
 import os
 from functools import wraps
 from werkzeug.utils import secure_filename
+from werkzeug.wsgi import get_input_stream
 from datetime import datetime
+import random
+import threading
 import time
+from datastore import DataStore, WriteConflict
+from search_index import SearchIndex
+from feed import DashboardFeed
+from connection_graph import ConnectionGraph
+from skill_index import SkillIndex
+from recommendations import Recommender
+from site_stats import SiteStats, BUCKETS as STATS_BUCKETS
+from events import ConnectionWatcher, EventHub, format_sse, notify_connection_change
+from unit_of_work import UnitOfWork
+from passwords import PasswordHasher, HasherBusy
+from avatars import AvatarPipeline, AVATAR_SIZES, FORMATS, DEFAULT_AVATAR, SMALL, MEDIUM, LARGE, sniff_image
+from uploads import UploadRequest, UploadRejected, is_content_name
+from assets import AssetManifest
+from compression import Compressor
+from bulk import BulkImporter, export_ndjson, EXPORT_TYPES, IMPORT_BATCH
+from metrics import Registry, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from logs import configure_logging
 ADMIN_EMAIL = "admin@skillswap.com"
 ADMIN_PASSWORD = "admin123"
 app = Flask(__name__)
+
+# Log records are queued to a background writer thread. DEBUG adds per-
+# connection detail, of which 1 in SKILLSWAP_LOG_SAMPLE lines is kept.
+configure_logging(
+    level=os.environ.get('SKILLSWAP_LOG_LEVEL', 'INFO'),
+    fmt=os.environ.get('SKILLSWAP_LOG_FORMAT', 'json'),
+    debug_sample_rate=int(os.environ.get('SKILLSWAP_LOG_SAMPLE', 100))
+)
+profile_log = logging.getLogger('skillswap.profile')
+skills_log = logging.getLogger('skillswap.skills')
+connections_log = logging.getLogger('skillswap.connections')
 CORS(app)
 app.secret_key = 'your-secret-key-here'  # Change this to a secure secret key
 
+DATA_DIR = os.environ.get('SKILLSWAP_DATA_DIR', 'data')
+
 # Ensure the data directory exists
-if not os.path.exists('data'):
-    os.makedirs('data')
+if not os.path.exists(DATA_DIR):
+    os.makedirs(DATA_DIR)
 
 # Initialize JSON files if they don't exist
 def init_json_files():
-    files = ['users.json', 'skills.json', 'user_skills.json', 'user_interests.json', 'connections.json']
+    files = ['users.json', 'skills.json', 'user_skills.json', 'user_interests.json', 'connections.json', 'uploads.json']
     for file in files:
-        path = f'data/{file}'
+        path = os.path.join(DATA_DIR, file)
         if not os.path.exists(path):
             with open(path, 'w') as f:
                 if file == 'skills.json':
@@ -33,26 +69,201 @@ def init_json_files():
 
 init_json_files()
 
+# Parsed collections are cached in memory and shared between requests.
+# SKILLSWAP_STORAGE_MODE=journal appends per-record changes instead of
+# rewriting whole files on every save.
+store = DataStore(
+    DATA_DIR,
+    mode=os.environ.get('SKILLSWAP_STORAGE_MODE', 'json'),
+    fsync=os.environ.get('SKILLSWAP_FSYNC', 'always'),
+    journal_max_bytes=int(os.environ.get('SKILLSWAP_JOURNAL_MAX_BYTES', 1024 * 1024))
+)
+
+# Substring search over user names, locations and skills for /api/search
+search_index = SearchIndex(store)
+
+# Ranked skill cards for the dashboard
+dashboard_feed = DashboardFeed(store)
+
+# Per-user adjacency over connections.json
+connection_graph = ConnectionGraph(store)
+
+# Skill -> users over skills.json for the /connections matches
+skill_index = SkillIndex(store)
+MATCHES_PER_PAGE = 20
+
+# Most similar users by skills and interests, recomputed in the background
+# every SKILLSWAP_RECOMMEND_INTERVAL seconds once the dashboard is first shown
+recommender = Recommender(store, interval=int(os.environ.get('SKILLSWAP_RECOMMEND_INTERVAL', 900)))
+
+# Counts and growth series for the admin dashboard
+site_stats = SiteStats(store)
+
+# Password hashing runs on a small pool so a burst of logins cannot occupy
+# every request thread; SKILLSWAP_PASSWORD_COST is PBKDF2 iterations or scrypt N
+password_hasher = PasswordHasher(
+    scheme=os.environ.get('SKILLSWAP_PASSWORD_HASHER', 'pbkdf2'),
+    cost=int(os.environ.get('SKILLSWAP_PASSWORD_COST', 0)) or None,
+    workers=int(os.environ.get('SKILLSWAP_HASH_WORKERS', 2))
+)
+
+# Pushes connection events to open /api/connections/stream responses,
+# including changes saved by other worker processes
+event_hub = EventHub()
+connection_watcher = ConnectionWatcher(
+    event_hub, connection_graph, store,
+    interval=float(os.environ.get('SKILLSWAP_EVENTS_POLL_INTERVAL', 2))
+)
+
+# Shared with blueprints, which cannot import app
+app.extensions['datastore'] = store
+app.extensions['connection_graph'] = connection_graph
+app.extensions['event_hub'] = event_hub
+app.extensions['connection_watcher'] = connection_watcher
+
+# Served by /admin/metrics. Sizes and byte totals are only read when scraped.
+metrics = Registry()
+request_duration = metrics.histogram(
+    'skillswap_request_duration_seconds', 'Time to handle a request', ('endpoint', 'method'))
+request_count = metrics.counter(
+    'skillswap_requests_total', 'Requests handled', ('endpoint', 'method', 'status'))
+store_call_duration = metrics.histogram(
+    'skillswap_store_call_duration_seconds', 'Calls of load_json and save_json and their duration',
+    ('call', 'collection'))
+flush_duration = metrics.histogram(
+    'skillswap_flush_duration_seconds', 'Time to write the saves of a request')
+metrics.counter('skillswap_storage_read_bytes_total', 'Bytes read from storage', ('collection',),
+                collect=lambda: {(name,): n for name, n in store.io_totals()[0].items()})
+metrics.counter('skillswap_storage_written_bytes_total', 'Bytes written to storage', ('collection',),
+                collect=lambda: {(name,): n for name, n in store.io_totals()[1].items()})
+
+def collection_sizes():
+    return {
+        ('users',): len(load_json('users.json')),
+        ('profiles',): len(load_json('profile.json')),
+        ('skills',): sum(len(skills) for skills in load_json('skills.json').get('user_skills', {}).values()),
+        ('connections',): len(load_json('connections.json')),
+        ('uploads',): len(load_json('uploads.json')),
+    }
+
+metrics.gauge('skillswap_collection_records', 'Records per collection', ('collection',), collect=collection_sizes)
+
 def load_json(filename):
+    started = time.perf_counter()
+    try:
+        if has_request_context() and 'uow' in g:
+            return g.uow.load(filename)
+        return store.load(filename)
+    finally:
+        store_call_duration.observe(('load_json', filename), time.perf_counter() - started)
+
+def save_json(data, filename, changed=None, removed=None):
+    # changed/removed name the record keys touched, letting the store
+    # persist just those records. Inside a request the write is deferred
+    # to the end of the request.
+    started = time.perf_counter()
+    try:
+        if has_request_context() and 'uow' in g:
+            g.uow.save(data, filename, changed=changed, removed=removed)
+        else:
+            store.save(data, filename, changed=changed, removed=removed)
+    finally:
+        store_call_duration.observe(('save_json', filename), time.perf_counter() - started)
+
+def flush_unit_of_work(uow):
+    started = time.perf_counter()
     try:
-        with open(f'data/{filename}', 'r') as f:
-            return json.load(f)
-    except:
-        return [] if filename != 'skills.json' else {}
+        uow.flush()
+    finally:
+        flush_duration.observe((), time.perf_counter() - started)
+
+@app.before_request
+def begin_unit_of_work():
+    g.request_started = time.perf_counter()
+    g.uow = UnitOfWork(store)
+    store.pin()
+
+def observe_request(status):
+    if 'request_started' in g:
+        endpoint = request.endpoint or 'unmatched'
+        request_duration.observe((endpoint, request.method), time.perf_counter() - g.pop('request_started'))
+        request_count.inc((endpoint, request.method, str(status)))
+
+@app.after_request
+def record_request_metrics(response):
+    observe_request(response.status_code)
+    return response
+
+@app.teardown_request
+def end_unit_of_work(exception):
+    if exception is not None:
+        # Unhandled errors skip after_request
+        observe_request(500)
+    uow = g.pop('uow', None)
+    try:
+        if uow is not None and exception is None:
+            flush_unit_of_work(uow)
+        elif uow is not None:
+            # The view's edits to the cached collections must not outlive it
+            uow.rollback()
+    except WriteConflict as e:
+        app.logger.warning('Dropped changes to %s in %s after a write conflict', e, request.path)
+        uow.rollback()
+    finally:
+        store.unpin()
+    if uow is not None:
+        app.logger.info('%s %s loads=%d flushes=%d', request.method, request.path, uow.loads, uow.flushes)
+
+def notify_after_flush(connection):
+    """Send connection events once this request's writes are stored"""
+    g.uow.after_flush(lambda: notify_connection_change(connection_watcher, connection))
+
+def default_profile(user_id):
+    return {
+        "user_id": user_id,
+        "profile_picture": "default-avatar.png",
+        "about": "",
+        "location": "",
+        "interests": [],
+        "created_at": datetime.now().isoformat(),
+        "updated_at": datetime.now().isoformat()
+    }
 
-def save_json(data, filename):
-    with open(f'data/{filename}', 'w') as f:
-        json.dump(data, f, indent=4)
+def ensure_profile(profiles, user_id):
+    """Return the user's profile, adding a default one for users without one"""
+    profile_data = store.profile(user_id)
+    if not profile_data:
+        profile_data = default_profile(user_id)
+        profiles.append(profile_data)
+        # Later lookups in the same request (e.g. /api/batch) find it
+        store.index('profile.json', 'key')[str(user_id)] = profile_data
+        # Saved with the request, or dropped by a rollback, even if the
+        # caller fails before saving its own change
+        save_json(profiles, 'profile.json', changed=[user_id])
+    return profile_data
 
 def hash_password(password):
-    salt = "skillswap_salt"
-    salted_password = password + salt
-    return hashlib.sha256(salted_password.encode()).hexdigest()
+    return password_hasher.hash(password)
 
 def verify_password(stored_hash, password):
-    salt = "skillswap_salt"
-    salted_password = password + salt
-    return stored_hash == hashlib.sha256(salted_password.encode()).hexdigest()
+    return password_hasher.verify(stored_hash, password)
+
+def upgrade_password_hash(user_id, password):
+    """Re-hash a password stored with the legacy scheme or an outdated cost"""
+    try:
+        new_hash = hash_password(password)
+    except HasherBusy:
+        # The login succeeded anyway; the next one tries again
+        return
+    with write_lock:
+        users = load_json('users.json')
+        store.user(user_id)['password'] = new_hash
+        save_json(users, 'users.json', changed=[user_id])
+        try:
+            g.uow.flush()
+        except WriteConflict:
+            # The old hash still works; the next login tries again
+            g.uow.rollback()
 
 def login_required(f):
     @wraps(f)
@@ -63,10 +274,84 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
-# Configure upload folder
-UPLOAD_FOLDER = os.path.join('static', 'uploads', 'profiles')
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+# Views that save data run one at a time per process; across processes a
+# conflicting save makes the view run again on fresh data
+write_lock = threading.Lock()
+TRANSACTION_ATTEMPTS = 5
+
+def transactional(f):
+    """Run a view and flush its saves as one unit, retrying on WriteConflict.
+
+    GET and HEAD requests only read, so they run without the write lock.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if request.method in ('GET', 'HEAD'):
+            return f(*args, **kwargs)
+        with write_lock:
+            flashes = list(session.get('_flashes', []))
+            for attempt in range(TRANSACTION_ATTEMPTS):
+                try:
+                    response = f(*args, **kwargs)
+                    flush_unit_of_work(g.uow)
+                    return response
+                except WriteConflict as e:
+                    app.logger.info('Write conflict on %s in %s, attempt %d', e, request.path, attempt + 1)
+                    g.uow.rollback()
+                    store.pin()
+                    # Undo what the abandoned attempt flashed and read
+                    session['_flashes'] = list(flashes)
+                    for file in request.files.values():
+                        file.stream.seek(0)
+                    time.sleep(random.uniform(0, 0.01 * 2 ** attempt))
+                except BaseException:
+                    # Drop the view's in-place edits before releasing the lock
+                    g.uow.rollback()
+                    raise
+        return jsonify({'success': False, 'message': 'Please try again'}), 503
+    return decorated_function
+
+def conditional_get(*filenames):
+    """Answer If-None-Match with 304 while the given collections are unchanged.
+
+    The ETag covers the collections' stored save counters and signatures,
+    the logged-in user and the request path and query, and is checked
+    before the view loads anything.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            # Stored state rather than this process's counters, so every
+            # worker gives unchanged data the same tag
+            tags = [store.stored_tag(filename) for filename in filenames]
+            key = f"{tags}:{session.get('user_id')}:{request.full_path}"
+            etag = hashlib.sha1(key.encode()).hexdigest()
+
+            if request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            # Let browsers keep the body but revalidate it on every use
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return decorated_function
+    return decorator
+
+# Configure upload folder. Originals are kept out of static/ since they may
+# carry EXIF data; pages only link to the thumbnails served by avatar().
+# Uploads stream to disk while being hashed and are stored once per content
+# as <sha256>.<ext>, with their reference counts in uploads.json.
+app.request_class = UploadRequest
+UPLOAD_FOLDER = os.path.join(DATA_DIR, 'uploads', 'profiles')
+LEGACY_UPLOAD_FOLDER = os.path.join(app.static_folder, 'uploads', 'profiles')
+THUMBNAIL_FOLDER = os.path.join(DATA_DIR, 'uploads', 'thumbnails')
+ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 MAX_CONTENT_LENGTH = 5 * 1024 * 1024  # 5MB max file size
+# NDJSON bodies of /admin/import, SKILLSWAP_IMPORT_MAX_BYTES (default 1GB)
+IMPORT_MAX_CONTENT_LENGTH = int(os.environ.get('SKILLSWAP_IMPORT_MAX_BYTES', 1024 ** 3))
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
@@ -74,29 +359,65 @@ app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
 # Create upload folder if it doesn't exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# Renders uploads into AVATAR_SIZES thumbnails on a background thread
+avatar_pipeline = AvatarPipeline(
+    [UPLOAD_FOLDER, LEGACY_UPLOAD_FOLDER],
+    THUMBNAIL_FOLDER,
+    os.path.join(app.static_folder, 'images', DEFAULT_AVATAR)
+)
+avatar_pipeline.render_defaults()
+
+# CSS, JS and images are linked under content-hashed names, built into
+# static/dist/ by scripts/build_assets.py with gzip and brotli copies, so
+# browsers can keep them without revalidating
+asset_manifest = AssetManifest(os.path.join(app.static_folder, 'dist'))
+
+@app.url_defaults
+def fingerprint_static_urls(endpoint, values):
+    if endpoint == 'static' and 'filename' in values:
+        values['filename'] = asset_manifest.url_name(values['filename'])
+
+def static_asset(filename):
+    """Serve a fingerprinted asset, precompressed if the client accepts it"""
+    name = asset_manifest.original(filename)
+    if name is None:
+        return app.send_static_file(filename)
+    path, encoding = asset_manifest.variant(filename, request.accept_encodings)
+    response = send_file(path, mimetype=mimetypes.guess_type(name)[0], max_age=31536000)
+    response.cache_control.immutable = True
+    if encoding:
+        response.content_encoding = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+app.view_functions['static'] = static_asset
+
+# gzip for JSON and HTML responses of at least SKILLSWAP_COMPRESS_MIN_SIZE bytes
+compressor = Compressor(
+    min_size=int(os.environ.get('SKILLSWAP_COMPRESS_MIN_SIZE', 1024)),
+    level=int(os.environ.get('SKILLSWAP_COMPRESS_LEVEL', 6))
+)
+compressor.init_app(app)
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+@app.template_global()
+def avatar_url(profile_picture, size=MEDIUM):
+    """URL of a profile picture's thumbnail; SMALL for lists, MEDIUM for cards, LARGE for the profile page"""
+    return url_for('avatar', size=size, name=profile_picture or DEFAULT_AVATAR)
+
 @app.context_processor
 def inject_profile():
     if 'user_id' in session:
         user_id = str(session['user_id'])
-        profiles = load_json('profile.json')
-        user_profiles = [p for p in profiles if str(p['user_id']) == user_id]
+        load_json('profile.json')
+        user_profiles = store.profiles(user_id)
         user_profile = max(user_profiles, key=lambda x: x.get('updated_at', '')) if user_profiles else None
         
         if not user_profile:
-            user_profile = {
-                "user_id": user_id,
-                "profile_picture": "default-avatar.png",
-                "about": "",
-                "location": "",
-                "interests": [],
-                "created_at": datetime.now().isoformat(),
-                "updated_at": datetime.now().isoformat()
-            }
-            profiles.append(user_profile)
-            save_json(profiles, 'profile.json')
+            # Rendering never writes; the profile is stored on the first edit
+            user_profile = default_profile(user_id)
         
         return {'profile': user_profile}
     return {'profile': None}
@@ -111,10 +432,17 @@ def login():
         email = request.form.get('email')
         password = request.form.get('password')
         
-        users = load_json('users.json')
-        user = next((user for user in users if user['email'] == email), None)
+        user = store.user_by_email(email)
         
-        if user and verify_password(user['password'], password):
+        try:
+            valid = user is not None and verify_password(user['password'], password)
+        except HasherBusy:
+            flash('Too many sign-ins right now, please try again in a moment', 'error')
+            return render_template('login.html'), 503
+
+        if valid:
+            if password_hasher.needs_upgrade(user['password']):
+                upgrade_password_hash(user['id'], password)
             session['user_id'] = user['id']
             session['user_name'] = user['fullname']
             flash('Successfully logged in!', 'success')
@@ -136,28 +464,50 @@ def register():
             flash('Passwords do not match', 'error')
             return redirect(url_for('register'))
         
-        users = load_json('users.json')
-        
-        if any(user['email'] == email for user in users):
+        if store.user_by_email(email) is not None:
             flash('Email already registered', 'error')
             return redirect(url_for('register'))
         
-        new_user = {
-            'id': len(users) + 1,
-            'fullname': fullname,
-            'email': email,
-            'password': hash_password(password),
-            'about': ''
-        }
-        
-        users.append(new_user)
-        save_json(users, 'users.json')
+        # Hashed before taking the write lock, and only once across retries
+        try:
+            password_hash = hash_password(password)
+        except HasherBusy:
+            flash('Too many sign-ups right now, please try again in a moment', 'error')
+            return redirect(url_for('register'))
         
-        flash('Registration successful! Please login.', 'success')
-        return redirect(url_for('login'))
+        return create_user(fullname, email, password_hash)
     
     return render_template('register.html')
 
+@transactional
+def create_user(fullname, email, password_hash):
+    users = load_json('users.json')
+    
+    # Someone may have registered the email while the password was hashed
+    if store.user_by_email(email) is not None:
+        flash('Email already registered', 'error')
+        return redirect(url_for('register'))
+    
+    new_user = {
+        'id': len(users) + 1,
+        'fullname': fullname,
+        'email': email,
+        'password': password_hash,
+        'about': '',
+        'created_at': datetime.now().isoformat()
+    }
+    
+    users.append(new_user)
+    save_json(users, 'users.json', changed=[new_user['id']])
+    
+    # Every user starts with an empty profile
+    profiles = load_json('profile.json')
+    profiles.append(default_profile(new_user['id']))
+    save_json(profiles, 'profile.json', changed=[new_user['id']])
+    
+    flash('Registration successful! Please login.', 'success')
+    return redirect(url_for('login'))
+
 @app.route('/admin/login', methods=['GET', 'POST'])
 def admin_login():
     if request.method == 'POST':
@@ -177,112 +527,130 @@ def admin_dashboard():
     if not session.get('admin'):
         return redirect(url_for('admin_login'))
 
-    users = load_json('users.json')
-    skills = load_json('skills.json')
-    connections = load_json('connections.json')
-
     return render_template(
         'admin_dashboard.html',
-        users=users,
-        skills=skills,
-        connections=connections
+        stats=site_stats.summary(),
+        series=site_stats.series('day')
     )
 
+@app.route('/admin/api/stats')
+def admin_stats():
+    """Totals, top skills and signup/connection series per hour, day or month"""
+    if not session.get('admin'):
+        abort(403)
+    bucket = request.args.get('bucket', 'day')
+    if bucket not in STATS_BUCKETS:
+        return jsonify({'success': False, 'error': f"bucket must be one of {', '.join(STATS_BUCKETS)}"}), 400
+    series = site_stats.series(bucket)
+    return jsonify({
+        'success': True,
+        'stats': site_stats.summary(),
+        'bucket': bucket,
+        'series': {name: [{'bucket': key, 'count': count} for key, count in points]
+                   for name, points in series.items()}
+    })
+
+@app.route('/admin/export')
+def admin_export():
+    """Stream users, profiles, skills and connections (or ?types=a,b) as NDJSON"""
+    if not session.get('admin'):
+        abort(403)
+    types = request.args.get('types', ','.join(EXPORT_TYPES)).split(',')
+    unknown = [t for t in types if t not in EXPORT_TYPES]
+    if unknown:
+        return jsonify({'success': False, 'error': f"Unknown types: {', '.join(unknown)}"}), 400
+    filename = f"skillswap-{datetime.now().strftime('%Y%m%d-%H%M%S')}.ndjson"
+    return Response(stream_with_context(export_ndjson(store, types)), mimetype='application/x-ndjson',
+                    headers={'Content-Disposition': f'attachment; filename={filename}',
+                             'Cache-Control': 'no-store'})
+
+@app.route('/admin/import', methods=['POST'])
+def admin_import():
+    """Import an NDJSON body in the export format; answers with counts and records per second"""
+    if not session.get('admin'):
+        abort(403)
+    # Read line by line under its own size limit rather than MAX_CONTENT_LENGTH,
+    # which is meant for pictures
+    body = get_input_stream(request.environ, max_content_length=IMPORT_MAX_CONTENT_LENGTH)
+    batch_size = request.args.get('batch_size', IMPORT_BATCH, type=int)
+    report = BulkImporter(store, batch_size=max(1, batch_size), lock=write_lock).run(body)
+    app.logger.info('Imported NDJSON', extra={key: report[key] for key in ('imported', 'rejected', 'records_per_second')})
+    return jsonify({'success': True, **report})
+
+@app.route('/admin/metrics')
+def admin_metrics():
+    """Prometheus metrics, for an admin session or a bearer SKILLSWAP_METRICS_TOKEN"""
+    token = os.environ.get('SKILLSWAP_METRICS_TOKEN')
+    authorization = request.headers.get('Authorization', '')
+    if not session.get('admin') and not (token and hmac.compare_digest(authorization, f'Bearer {token}')):
+        abort(403)
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE, headers={'Cache-Control': 'no-store'})
+
+def recommended_users(user_id, k=4):
+    """The k most similar users not yet connected to user_id, in the featured users format"""
+    recommender.start()
+    featured = []
+    for other_id, similarity in recommender.neighbours(user_id) or []:
+        user, profile = store.user(other_id), store.profile(other_id)
+        if user is None or profile is None or connection_graph.between(user_id, other_id):
+            continue
+        featured.append({
+            'id': other_id,
+            'name': user['fullname'],
+            'profile_picture': profile.get('profile_picture', 'default-avatar.png'),
+            'skills': [skill['skill_name'] for skill in store.user_skills(other_id)[:3]],
+            'similarity': similarity
+        })
+        if len(featured) == k:
+            break
+    return featured
+
 @app.route('/dashboard')
 @login_required
 def dashboard():
     user_id = str(session['user_id'])
     
     # Load profile data
-    profiles = load_json('profile.json')  # LIST
-    users = load_json('users.json')
-
-    user_profile = next(
-    (p for p in profiles if str(p.get('user_id')) == user_id),
-    None
-)
-
-    if not user_profile:
-        return "User profile not found", 404
+    load_json('profile.json')
+    user_profile = store.profile(user_id) or default_profile(user_id)
 
     # Load skills data
-    skills_data = load_json('skills.json')
-    user_skills = skills_data.get('user_skills', {}).get(user_id, [])
+    user_skills = store.user_skills(user_id)
     
     # Get user's interests
     user_interests = user_profile.get('interests', []) if user_profile else []
     
-    # Get other users' skills
-    other_users_skills = []
-    for profile in profiles:
-        if str(profile['user_id']) != user_id:
-            user_data = next((u for u in users if str(u['id']) == str(profile['user_id'])), None)
-            user_skills_list = skills_data.get('user_skills', {}).get(str(profile['user_id']), [])
-            if user_skills_list and user_data:
-                for skill in user_skills_list:
-                    other_users_skills.append({
-                        'user_id': str(user_data['id']),  # Ensure user_id is a string
-                        'user_name': user_data['fullname'],
-                        'profile_picture': profile.get('profile_picture', 'default-avatar.png'),
-                        'skill_name': skill['skill_name'],
-                        'qualification': skill['qualification'],
-                        'years_of_experience': skill['years_of_experience'],
-                        'description': skill['description'],
-                        'matches_interest': skill['skill_name'] in user_interests
-                    })
+    # Get other users' skills, interest matches first, one page at a time
+    other_users_skills, next_cursor = dashboard_feed.page(user_id, user_interests, request.args.get('cursor'))
     
-    # Sort skills: prioritize matching interests, then by years of experience
-    other_users_skills.sort(key=lambda x: (-x['matches_interest'], -x['years_of_experience']))
-    
-    # Get featured users (users with similar interests)
-    featured_users = []
-    for profile in profiles:
-        if str(profile['user_id']) != user_id:
-            user_data = next((u for u in users if str(u['id']) == str(profile['user_id'])), None)
-            user_skills_list = skills_data.get('user_skills', {}).get(str(profile['user_id']), [])
-            if user_skills_list and user_data:
-                featured_users.append({
-                    'id': str(user_data['id']),
-                    'name': user_data['fullname'],
-                    'profile_picture': profile.get('profile_picture', 'default-avatar.png'),
-                    'skills': [skill['skill_name'] for skill in user_skills_list[:3]]
-                })
+    # Get featured users (most similar users, else best-ranked for this user's interests)
+    featured_users = recommended_users(user_id) or dashboard_feed.featured(user_id, user_interests)
     
     return render_template('dashboard.html',
                          active_page='home',
                          profile=user_profile,
                          user_skills=user_skills,
                          other_users_skills=other_users_skills,
-                         featured_users=featured_users[:4])
+                         next_cursor=next_cursor,
+                         featured_users=featured_users)
 
 @app.route('/profile')
 @login_required
 def profile():
     user_id = session['user_id']
-    users = load_json('users.json')
-    user = next((u for u in users if u['id'] == user_id), None)
+    user = store.user(user_id)
     
     # Load profile data
-    profiles = load_json('profile.json')
-    profile_data = next((p for p in profiles if p['user_id'] == user_id), None)
+    load_json('profile.json')
+    profile_data = store.profile(user_id)
     
     # Load user's skills from skills.json
     skills_data = load_json('skills.json')
     user_skills = skills_data.get('user_skills', {}).get(str(user_id), [])
     
     if not profile_data:
-        # Create default profile if none exists
-        profile_data = {
-            "user_id": user_id,
-            "profile_picture": "default-avatar.png",
-            "about": "",
-            "location": "",
-            "interests": [],
-            "created_at": datetime.now().isoformat(),
-            "updated_at": datetime.now().isoformat()
-        }
-        profiles.append(profile_data)
-        save_json(profiles, 'profile.json')
+        # Show a default profile; it is stored on the first edit
+        profile_data = default_profile(user_id)
     
     return render_template('profile.html',
                          active_page='profile',
@@ -292,39 +660,62 @@ def profile():
 
 @app.route('/api/profile/update', methods=['POST'])
 @login_required
+@transactional
 def update_profile():
     user_id = session['user_id']
     profiles = load_json('profile.json')
-    profile_data = next((p for p in profiles if p['user_id'] == user_id), None)
-    
-    if not profile_data:
-        return jsonify({'success': False, 'error': 'Profile not found'})
+    profile_data = ensure_profile(profiles, user_id)
     
     # Handle profile picture upload
     if 'profile_picture' in request.files:
         file = request.files['profile_picture']
         if file and allowed_file(file.filename):
             try:
-                filename = secure_filename(file.filename)
-                # Add timestamp to filename to prevent overwriting
-                filename = f"{int(time.time())}_{filename}"
-                file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(file_path)
+                upload = file.stream
+                # Check dimensions before anything refers to the upload
+                if sniff_image(upload.temp_path) is None:
+                    return jsonify({'success': False, 'error': 'Unsupported or damaged image'})
+                filename = upload.content_name
                 
-                # Delete old profile picture if it exists and is not the default
                 old_picture = profile_data.get('profile_picture')
-                if old_picture and old_picture != 'default-avatar.png':
-                    old_file_path = os.path.join(app.config['UPLOAD_FOLDER'], old_picture)
-                    if os.path.exists(old_file_path):
-                        os.remove(old_file_path)
+                if filename != old_picture:
+                    uploads = load_json('uploads.json')
+                    changed, removed = [filename], []
+                    record = store.upload(filename)
+                    if record:
+                        record['refs'] += 1
+                    else:
+                        uploads.append({'name': filename, 'refs': 1, 'size': upload.size,
+                                        'created_at': datetime.now().isoformat()})
+                    
+                    # Release the old picture; its file goes with the last reference
+                    old_record = store.upload(old_picture) if old_picture else None
+                    if old_record:
+                        old_record['refs'] -= 1
+                        if old_record['refs'] > 0:
+                            changed.append(old_picture)
+                        else:
+                            uploads.remove(old_record)
+                            removed.append(old_picture)
+                    save_json(uploads, 'uploads.json', changed=changed, removed=removed)
+                    
+                    # File changes happen under the uploads.json lock, so no other
+                    # worker counts a reference to a file that is about to go
+                    g.uow.on_commit(lambda: upload.commit(app.config['UPLOAD_FOLDER']))
+                    if old_record and old_record['refs'] <= 0:
+                        g.uow.on_commit(lambda: remove_picture(old_picture))
+                    elif not old_record and old_picture and old_picture != DEFAULT_AVATAR:
+                        # Pictures from before content addressing belong to one profile
+                        g.uow.after_flush(lambda: remove_picture(old_picture))
                 
                 # Update profile picture in profile data
                 profile_data['profile_picture'] = filename
                 profile_data['updated_at'] = datetime.now().isoformat()
-                save_json(profiles, 'profile.json')
-                return jsonify({'success': True})
+                save_json(profiles, 'profile.json', changed=[user_id])
+                g.uow.after_flush(lambda: avatar_pipeline.submit(filename))
+                return jsonify({'success': True, 'profile_picture_url': avatar_url(filename, LARGE)})
             except Exception as e:
-                print(f"Error uploading file: {str(e)}")
+                profile_log.exception('Error uploading file')
                 return jsonify({'success': False, 'error': str(e)})
     
     # Handle other profile updates
@@ -332,18 +723,58 @@ def update_profile():
     profile_data['about'] = data.get('about', profile_data.get('about', ''))
     profile_data['location'] = data.get('location', profile_data.get('location', ''))
     profile_data['updated_at'] = datetime.now().isoformat()
-    save_json(profiles, 'profile.json')
+    save_json(profiles, 'profile.json', changed=[user_id])
     
     return jsonify({'success': True})
 
-@app.route('/api/skills/add', methods=['POST'])
-@login_required
-def add_skill():
-    user_id = str(session['user_id'])
-    data = request.get_json()
+def remove_picture(picture):
+    for folder in (UPLOAD_FOLDER, LEGACY_UPLOAD_FOLDER):
+        path = os.path.join(folder, picture)
+        if os.path.exists(path):
+            os.remove(path)
+    avatar_pipeline.discard(picture)
+
+@app.route('/avatars/<int:size>/<name>')
+def avatar(size, name):
+    """Serve a profile picture thumbnail as WebP, or JPEG to clients that do not accept WebP"""
+    if size not in AVATAR_SIZES or name != secure_filename(name):
+        abort(404)
+    # Wildcards like */* match WebP too; JPEG goes first so only clients
+    # naming image/webp get it
+    best = request.accept_mimetypes.best_match(['image/jpeg', 'image/webp'])
+    ext = 'webp' if best == 'image/webp' else 'jpg'
+    path = avatar_pipeline.get(name, size, ext)
+    if path and is_content_name(name):
+        # A content-addressed name never points at other bytes
+        response = send_file(os.path.abspath(path), mimetype=FORMATS[ext][1], max_age=31536000)
+        response.cache_control.immutable = True
+    else:
+        path = path or avatar_pipeline.get(DEFAULT_AVATAR, size, ext)
+        response = send_file(os.path.abspath(path), mimetype=FORMATS[ext][1], max_age=86400)
+    response.vary.add('Accept')
+    return response
+
+@app.errorhandler(UploadRejected)
+def upload_rejected(e):
+    return jsonify({'success': False, 'error': e.description}), e.code
+
+# Profile and skill changes by name; each route applies one, /api/batch several
+OPERATIONS = {}
+BATCH_MAX_OPERATIONS = 100
+
+def operation(name):
+    """Register f(user_id, data) -> response dict as a named operation"""
+    def decorator(f):
+        OPERATIONS[name] = f
+        return f
+    return decorator
+
+@operation('skills.add')
+def add_skill_op(user_id, data):
+    user_id = str(user_id)
     
     if not data.get('skill_name'):
-        return jsonify({'success': False, 'error': 'Skill name is required'})
+        return {'success': False, 'error': 'Skill name is required'}
     
     skills_data = load_json('skills.json')
     
@@ -368,12 +799,19 @@ def add_skill():
     
     # Add the new skill to user's skills
     skills_data['user_skills'][user_id].append(new_skill)
-    save_json(skills_data, 'skills.json')
+    save_json(skills_data, 'skills.json', changed=[user_id])
     
-    return jsonify({'success': True, 'skill': new_skill})
+    return {'success': True, 'skill': new_skill}
+
+@app.route('/api/skills/add', methods=['POST'])
+@login_required
+@transactional
+def add_skill():
+    return jsonify(add_skill_op(session['user_id'], request.get_json()))
 
 @app.route('/api/interests/add', methods=['POST'])
 @login_required
+@transactional
 def add_user_interest():
     user_id = session['user_id']
     interest = request.get_json().get('interest')
@@ -393,7 +831,7 @@ def add_user_interest():
             'interests': [interest]
         })
     
-    save_json(user_interests, 'user_interests.json')
+    save_json(user_interests, 'user_interests.json', changed=[user_id])
     return jsonify({'success': True})
 
 @app.route('/search')
@@ -403,6 +841,7 @@ def search():
 
 @app.route('/api/search')
 @login_required
+@conditional_get('users.json', 'profile.json', 'skills.json')
 def api_search():
     query = request.args.get('q', '').strip().lower()
     
@@ -417,28 +856,27 @@ def api_search():
         'skills': []
     }
     
-    # Load all necessary data
-    users = load_json('users.json')
-    profiles = load_json('profile.json')
-    skills_data = load_json('skills.json')
+    # Look up candidate users in the trigram indexes
+    user_ids, skill_user_ids = search_index.search(query)
     
     # Search users
-    for user in users:
-        if (query in user['fullname'].lower() or 
-            (user.get('location') and query in user['location'].lower())):
+    for user_id in user_ids:
+        user = store.user(user_id)
+        if user:
             # Don't include the current user in results
             if str(user['id']) != str(session['user_id']):
                 # Get user's profile
-                user_profile = next((p for p in profiles if str(p['user_id']) == str(user['id'])), None)
+                user_profile = store.profile(user['id'])
                 
                 # Get user's skills
-                user_skills = skills_data.get('user_skills', {}).get(str(user['id']), [])
+                user_skills = store.user_skills(user['id'])
                 
                 results['users'].append({
                     'id': user['id'],
                     'username': user['fullname'],
                     'location': user_profile.get('location', 'Not specified') if user_profile else 'Not specified',
                     'profile_picture': user_profile.get('profile_picture', 'default-avatar.png') if user_profile else 'default-avatar.png',
+                    'profile_picture_url': avatar_url(user_profile.get('profile_picture') if user_profile else None, MEDIUM),
                     'about': user_profile.get('about', '') if user_profile else '',
                     'skills': [{
                         'name': skill['skill_name'],
@@ -449,15 +887,15 @@ def api_search():
                 })
     
     # Search skills
-    for user_id, user_skills in skills_data.get('user_skills', {}).items():
-        for skill in user_skills:
+    for user_id in skill_user_ids:
+        for skill in store.user_skills(user_id):
             if (query in skill['skill_name'].lower() or 
                 query in skill['description'].lower()):
                 # Get user information
-                user = next((u for u in users if str(u['id']) == str(user_id)), None)
+                user = store.user(user_id)
                 if user and str(user['id']) != str(session['user_id']):
                     # Get user's profile
-                    user_profile = next((p for p in profiles if str(p['user_id']) == str(user_id)), None)
+                    user_profile = store.profile(user_id)
                     
                     results['skills'].append({
                         'id': skill['skill_id'],
@@ -472,6 +910,7 @@ def api_search():
                             'username': user['fullname'],
                             'location': user_profile.get('location', 'Not specified') if user_profile else 'Not specified',
                             'profile_picture': user_profile.get('profile_picture', 'default-avatar.png') if user_profile else 'default-avatar.png',
+                            'profile_picture_url': avatar_url(user_profile.get('profile_picture') if user_profile else None, SMALL),
                             'about': user_profile.get('about', '') if user_profile else ''
                         }
                     })
@@ -506,14 +945,14 @@ def skills():
                          user_skills=current_user_skills,
                          available_skills=available_skills)
 
-@app.route('/api/skills/remove/<skill_id>', methods=['POST'])
-@login_required
-def remove_skill(skill_id):
-    user_id = str(session['user_id'])
+@operation('skills.remove')
+def remove_skill_op(user_id, data):
+    user_id = str(user_id)
+    skill_id = data.get('skill_id')
     skills_data = load_json('skills.json')
     
     if 'user_skills' not in skills_data or user_id not in skills_data['user_skills']:
-        return jsonify({'success': False, 'error': 'No skills found'})
+        return {'success': False, 'error': 'No skills found'}
     
     # Remove the skill from user's skills
     skills_data['user_skills'][user_id] = [
@@ -521,94 +960,102 @@ def remove_skill(skill_id):
         if skill['skill_id'] != skill_id
     ]
     
-    save_json(skills_data, 'skills.json')
-    return jsonify({'success': True})
+    save_json(skills_data, 'skills.json', changed=[user_id])
+    return {'success': True}
+
+@app.route('/api/skills/remove/<skill_id>', methods=['POST'])
+@login_required
+@transactional
+def remove_skill(skill_id):
+    return jsonify(remove_skill_op(session['user_id'], {'skill_id': skill_id}))
 
 @app.route('/connections')
 @login_required
 def connections():
     user_id = session['user_id']
-    users = load_json('users.json')
-    user_skills = load_json('user_skills.json')
-    
-    # Get current user's skills
-    current_user_skills = next((item['skills'] for item in user_skills if item['user_id'] == user_id), [])
+    try:
+        page = max(1, int(request.args.get('page', 1)))
+    except ValueError:
+        page = 1
     
-    # Get connected users (users with matching skills)
+    # Users with matching skills, most shared skills first
+    total_matches, matches = skill_index.matches(user_id, limit=MATCHES_PER_PAGE,
+                                                 offset=(page - 1) * MATCHES_PER_PAGE)
     connected_users = []
-    for user in users:
-        if user['id'] == user_id:  # Skip current user
+    for other_id, matching_skills in matches:
+        user = store.user(other_id)
+        if user is None:
             continue
-            
-        user_skill_list = next((item['skills'] for item in user_skills if item['user_id'] == user['id']), [])
-        
-        # Check for matching skills
-        matching_skills = set(current_user_skills) & set(user_skill_list)
-        if matching_skills:
-            connected_users.append({
-                'username': user['fullname'],
-                'profile_picture': url_for('static', filename='images/default-avatar.png'),
-                'matching_skills': list(matching_skills)
-            })
+        connected_users.append({
+            'id': user['id'],
+            'username': user['fullname'],
+            'profile_picture': DEFAULT_AVATAR,
+            'profile_picture_url': avatar_url(None, MEDIUM),
+            'matching_skills': matching_skills
+        })
     
     return render_template('connections.html',
                          active_page='connections',
-                         connected_users=connected_users)
-
-@app.route('/api/profile/interests/add', methods=['POST'])
-@login_required
-def add_interest():
-    user_id = session['user_id']
-    interest = request.get_json().get('interest')
+                         connected_users=connected_users,
+                         page=page,
+                         total_matches=total_matches,
+                         has_more=page * MATCHES_PER_PAGE < total_matches)
+
+@operation('interests.add')
+def add_interest_op(user_id, data):
+    interest = data.get('interest')
     
     if not interest:
-        return jsonify({'success': False, 'error': 'No interest provided'})
+        return {'success': False, 'error': 'No interest provided'}
     
     profiles = load_json('profile.json')
-    profile_data = next((p for p in profiles if p['user_id'] == user_id), None)
+    profile_data = ensure_profile(profiles, user_id)
     
-    if profile_data and interest not in profile_data['interests']:
+    if interest not in profile_data['interests']:
         profile_data['interests'].append(interest)
         profile_data['updated_at'] = datetime.now().isoformat()
-        save_json(profiles, 'profile.json')
-        return jsonify({'success': True})
+        save_json(profiles, 'profile.json', changed=[user_id])
+        return {'success': True}
     
-    return jsonify({'success': False, 'error': 'Interest already exists'})
+    return {'success': False, 'error': 'Interest already exists'}
 
-@app.route('/api/profile/interests/remove', methods=['POST'])
+@app.route('/api/profile/interests/add', methods=['POST'])
 @login_required
-def remove_interest():
-    user_id = session['user_id']
-    interest = request.get_json().get('interest')
+@transactional
+def add_interest():
+    return jsonify(add_interest_op(session['user_id'], request.get_json()))
+
+@operation('interests.remove')
+def remove_interest_op(user_id, data):
+    interest = data.get('interest')
     
     if not interest:
-        return jsonify({'success': False, 'error': 'No interest provided'})
+        return {'success': False, 'error': 'No interest provided'}
     
     profiles = load_json('profile.json')
-    profile_data = next((p for p in profiles if p['user_id'] == user_id), None)
+    profile_data = store.profile(user_id)
     
     if profile_data and interest in profile_data['interests']:
         profile_data['interests'].remove(interest)
         profile_data['updated_at'] = datetime.now().isoformat()
-        save_json(profiles, 'profile.json')
-        return jsonify({'success': True})
+        save_json(profiles, 'profile.json', changed=[user_id])
+        return {'success': True}
     
-    return jsonify({'success': False, 'error': 'Interest not found'})
+    return {'success': False, 'error': 'Interest not found'}
 
-@app.route('/api/profile/education/add', methods=['POST'])
+@app.route('/api/profile/interests/remove', methods=['POST'])
 @login_required
-def add_education():
-    user_id = session['user_id']
-    education_data = request.get_json()
-    
+@transactional
+def remove_interest():
+    return jsonify(remove_interest_op(session['user_id'], request.get_json()))
+
+@operation('education.add')
+def add_education_op(user_id, education_data):
     # Load current profile data
     profiles = load_json('profile.json')
     
     # Find user's profile
-    user_profile = next((p for p in profiles if p['user_id'] == user_id), None)
-    
-    if not user_profile:
-        return jsonify({'success': False, 'message': 'Profile not found'})
+    user_profile = ensure_profile(profiles, user_id)
     
     # Initialize education list if it doesn't exist
     if 'education' not in user_profile:
@@ -619,24 +1066,23 @@ def add_education():
     user_profile['updated_at'] = datetime.now().isoformat()
     
     # Save updated profile data
-    save_json(profiles, 'profile.json')
+    save_json(profiles, 'profile.json', changed=[user_id])
     
-    return jsonify({'success': True})
+    return {'success': True}
 
-@app.route('/api/profile/work/add', methods=['POST'])
+@app.route('/api/profile/education/add', methods=['POST'])
 @login_required
-def add_work():
-    user_id = session['user_id']
-    work_data = request.get_json()
-    
+@transactional
+def add_education():
+    return jsonify(add_education_op(session['user_id'], request.get_json()))
+
+@operation('work.add')
+def add_work_op(user_id, work_data):
     # Load current profile data
     profiles = load_json('profile.json')
     
     # Find user's profile
-    user_profile = next((p for p in profiles if p['user_id'] == user_id), None)
-    
-    if not user_profile:
-        return jsonify({'success': False, 'message': 'Profile not found'})
+    user_profile = ensure_profile(profiles, user_id)
     
     # Initialize work experience list if it doesn't exist
     if 'work_experience' not in user_profile:
@@ -647,19 +1093,24 @@ def add_work():
     user_profile['updated_at'] = datetime.now().isoformat()
     
     # Save updated profile data
-    save_json(profiles, 'profile.json')
+    save_json(profiles, 'profile.json', changed=[user_id])
     
-    return jsonify({'success': True})
+    return {'success': True}
+
+@app.route('/api/profile/work/add', methods=['POST'])
+@login_required
+@transactional
+def add_work():
+    return jsonify(add_work_op(session['user_id'], request.get_json()))
 
 @app.route('/api/profile/education/<education_id>', methods=['GET'])
 @login_required
 def get_education(education_id):
     try:
         user_id = session['user_id']
-        profiles = load_json('profile.json')
         
         # Find user's profile
-        user_profile = next((p for p in profiles if p['user_id'] == user_id), None)
+        user_profile = store.profile(user_id)
         
         if not user_profile or 'education' not in user_profile:
             return jsonify({'success': False, 'message': 'Profile or education not found'})
@@ -670,38 +1121,40 @@ def get_education(education_id):
             return jsonify({'success': False, 'message': 'Education not found'})
         
         return jsonify({'success': True, 'education': education})
-    except Exception as e:
-        print(f"Error in get_education: {str(e)}")
+    except Exception:
+        profile_log.exception('Error in get_education')
         return jsonify({'success': False, 'message': 'Internal server error'})
 
+@operation('education.update')
+def update_education_op(user_id, education_data):
+    profiles = load_json('profile.json')
+    user_profile = store.profile(user_id)
+    
+    if not user_profile or 'education' not in user_profile:
+        return {'success': False, 'message': 'Profile or education not found'}
+    
+    education_list = user_profile['education']
+    
+    # Find and update the education entry
+    for i, edu in enumerate(education_list):
+        if edu['id'] == education_data['id']:
+            education_list[i] = education_data
+            break
+    
+    user_profile['education'] = education_list
+    user_profile['updated_at'] = datetime.now().isoformat()
+    
+    save_json(profiles, 'profile.json', changed=[user_id])
+    return {'success': True}
+
 @app.route('/api/profile/education/update', methods=['POST'])
 @login_required
+@transactional
 def update_education():
     try:
-        user_id = session['user_id']
-        education_data = request.get_json()
-        
-        profiles = load_json('profile.json')
-        user_profile = next((p for p in profiles if p['user_id'] == user_id), None)
-        
-        if not user_profile or 'education' not in user_profile:
-            return jsonify({'success': False, 'message': 'Profile or education not found'})
-        
-        education_list = user_profile['education']
-        
-        # Find and update the education entry
-        for i, edu in enumerate(education_list):
-            if edu['id'] == education_data['id']:
-                education_list[i] = education_data
-                break
-        
-        user_profile['education'] = education_list
-        user_profile['updated_at'] = datetime.now().isoformat()
-        
-        save_json(profiles, 'profile.json')
-        return jsonify({'success': True})
-    except Exception as e:
-        print(f"Error in update_education: {str(e)}")
+        return jsonify(update_education_op(session['user_id'], request.get_json()))
+    except Exception:
+        profile_log.exception('Error in update_education')
         return jsonify({'success': False, 'message': 'Internal server error'})
 
 @app.route('/api/profile/work/<work_id>', methods=['GET'])
@@ -709,10 +1162,9 @@ def update_education():
 def get_work(work_id):
     try:
         user_id = session['user_id']
-        profiles = load_json('profile.json')
         
         # Find user's profile
-        user_profile = next((p for p in profiles if p['user_id'] == user_id), None)
+        user_profile = store.profile(user_id)
         
         if not user_profile or 'work_experience' not in user_profile:
             return jsonify({'success': False, 'message': 'Profile or work experience not found'})
@@ -723,113 +1175,150 @@ def get_work(work_id):
             return jsonify({'success': False, 'message': 'Work experience not found'})
         
         return jsonify({'success': True, 'work': work})
-    except Exception as e:
-        print(f"Error in get_work: {str(e)}")
+    except Exception:
+        profile_log.exception('Error in get_work')
         return jsonify({'success': False, 'message': 'Internal server error'})
 
+@operation('work.update')
+def update_work_op(user_id, work_data):
+    profiles = load_json('profile.json')
+    user_profile = store.profile(user_id)
+    
+    if not user_profile or 'work_experience' not in user_profile:
+        return {'success': False, 'message': 'Profile or work experience not found'}
+    
+    work_list = user_profile['work_experience']
+    
+    # Find and update the work entry
+    for i, work in enumerate(work_list):
+        if work['id'] == work_data['id']:
+            work_list[i] = work_data
+            break
+    
+    user_profile['work_experience'] = work_list
+    user_profile['updated_at'] = datetime.now().isoformat()
+    
+    save_json(profiles, 'profile.json', changed=[user_id])
+    return {'success': True}
+
 @app.route('/api/profile/work/update', methods=['POST'])
 @login_required
+@transactional
 def update_work():
     try:
-        user_id = session['user_id']
-        work_data = request.get_json()
-        
-        profiles = load_json('profile.json')
-        user_profile = next((p for p in profiles if p['user_id'] == user_id), None)
-        
-        if not user_profile or 'work_experience' not in user_profile:
-            return jsonify({'success': False, 'message': 'Profile or work experience not found'})
-        
-        work_list = user_profile['work_experience']
-        
-        # Find and update the work entry
-        for i, work in enumerate(work_list):
-            if work['id'] == work_data['id']:
-                work_list[i] = work_data
-                break
-        
-        user_profile['work_experience'] = work_list
-        user_profile['updated_at'] = datetime.now().isoformat()
-        
-        save_json(profiles, 'profile.json')
-        return jsonify({'success': True})
-    except Exception as e:
-        print(f"Error in update_work: {str(e)}")
+        return jsonify(update_work_op(session['user_id'], request.get_json()))
+    except Exception:
+        profile_log.exception('Error in update_work')
         return jsonify({'success': False, 'message': 'Internal server error'})
 
 @app.route('/api/skills/<skill_id>', methods=['GET'])
 @login_required
+@conditional_get('skills.json')
 def get_skill(skill_id):
     try:
-        user_id = str(session['user_id'])
-        skills_data = load_json('skills.json')
+        # Reads just this user's skills from skills.json.records when current
+        user_skills = store.record('skills.json', session['user_id'])
         
-        if 'user_skills' not in skills_data or user_id not in skills_data['user_skills']:
+        if user_skills is None:
             return jsonify({'success': False, 'message': 'No skills found'})
         
-        skill = next((s for s in skills_data['user_skills'][user_id] if s['skill_id'] == skill_id), None)
+        skill = next((s for s in user_skills if s['skill_id'] == skill_id), None)
         
         if not skill:
             return jsonify({'success': False, 'message': 'Skill not found'})
         
         return jsonify({'success': True, 'skill': skill})
-    except Exception as e:
-        print(f"Error in get_skill: {str(e)}")
+    except Exception:
+        skills_log.exception('Error in get_skill')
         return jsonify({'success': False, 'message': 'Internal server error'})
 
+@operation('skills.update')
+def update_skill_op(user_id, skill_data):
+    user_id = str(user_id)
+    
+    if not skill_data.get('skill_id'):
+        return {'success': False, 'message': 'Skill ID is required'}
+    
+    skills_data = load_json('skills.json')
+    
+    if 'user_skills' not in skills_data or user_id not in skills_data['user_skills']:
+        return {'success': False, 'message': 'No skills found'}
+    
+    skill_list = skills_data['user_skills'][user_id]
+    
+    # Find and update the skill
+    for i, skill in enumerate(skill_list):
+        if skill['skill_id'] == skill_data['skill_id']:
+            skill_list[i] = {
+                **skill,
+                **skill_data,
+                'updated_at': datetime.now().isoformat()
+            }
+            break
+    
+    skills_data['user_skills'][user_id] = skill_list
+    save_json(skills_data, 'skills.json', changed=[user_id])
+    
+    return {'success': True}
+
 @app.route('/api/skills/update', methods=['POST'])
 @login_required
+@transactional
 def update_skill():
     try:
-        user_id = str(session['user_id'])
-        skill_data = request.get_json()
-        
-        if not skill_data.get('skill_id'):
-            return jsonify({'success': False, 'message': 'Skill ID is required'})
-        
-        skills_data = load_json('skills.json')
-        
-        if 'user_skills' not in skills_data or user_id not in skills_data['user_skills']:
-            return jsonify({'success': False, 'message': 'No skills found'})
-        
-        skill_list = skills_data['user_skills'][user_id]
-        
-        # Find and update the skill
-        for i, skill in enumerate(skill_list):
-            if skill['skill_id'] == skill_data['skill_id']:
-                skill_list[i] = {
-                    **skill,
-                    **skill_data,
-                    'updated_at': datetime.now().isoformat()
-                }
-                break
-        
-        skills_data['user_skills'][user_id] = skill_list
-        save_json(skills_data, 'skills.json')
-        
-        return jsonify({'success': True})
-    except Exception as e:
-        print(f"Error in update_skill: {str(e)}")
+        return jsonify(update_skill_op(session['user_id'], request.get_json()))
+    except Exception:
+        skills_log.exception('Error in update_skill')
         return jsonify({'success': False, 'message': 'Internal server error'})
 
+@app.route('/api/batch', methods=['POST'])
+@login_required
+@transactional
+def batch():
+    """Apply a list of {"op": name, "data": {...}} operations in order, all or none.
+
+    Every collection is loaded once and saved once at the end. The first
+    operation that fails stops the batch and none of the changes are kept.
+    """
+    operations = (request.get_json(silent=True) or {}).get('operations')
+    if not isinstance(operations, list) or not 0 < len(operations) <= BATCH_MAX_OPERATIONS:
+        return jsonify({'success': False, 'error': f'operations must be a list of 1 to {BATCH_MAX_OPERATIONS} operations'}), 400
+    for i, entry in enumerate(operations):
+        if not isinstance(entry, dict) or entry.get('op') not in OPERATIONS or not isinstance(entry.get('data', {}), dict):
+            return jsonify({'success': False, 'error': f'Invalid operation at index {i}'}), 400
+    
+    user_id = session['user_id']
+    results = []
+    for i, entry in enumerate(operations):
+        try:
+            result = OPERATIONS[entry['op']](user_id, entry.get('data', {}))
+        except Exception:
+            profile_log.exception('Error in batch operation %s', entry['op'])
+            result = {'success': False, 'message': 'Internal server error'}
+            # It may have changed records without saving them
+            for filename in ('profile.json', 'skills.json'):
+                store.invalidate(filename)
+        results.append(result)
+        if not result.get('success'):
+            g.uow.rollback()
+            return jsonify({'success': False, 'failed': i, 'results': results})
+    
+    return jsonify({'success': True, 'results': results})
+
 @app.route('/api/profile/<user_id>')
+@conditional_get('users.json', 'profile.json', 'skills.json')
 def get_user_profile(user_id):
     try:
-        # Load user data from JSON files
-        users = load_json('users.json')
-        profiles = load_json('profile.json')
-        skills_data = load_json('skills.json')
-        
-        # Find user
-        user = next((u for u in users if str(u['id']) == str(user_id)), None)
+        # Find user; only the records asked for are read when record files are current
+        user = store.record('users.json', user_id)
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
         # Get user's profile
-        user_profile = next((p for p in profiles if str(p['user_id']) == str(user_id)), None)
+        user_profile = store.record('profile.json', user_id)
         
         # Get user's skills
-        user_skills = skills_data.get('user_skills', {}).get(str(user_id), [])
+        user_skills = store.record('skills.json', user_id, [])
         
         # Prepare response
         response = {
@@ -838,59 +1327,52 @@ def get_user_profile(user_id):
             'email': user['email'],
             'location': user_profile.get('location', 'Not specified') if user_profile else 'Not specified',
             'profile_picture': user_profile.get('profile_picture', 'default-avatar.png') if user_profile else 'default-avatar.png',
+            'profile_picture_url': avatar_url(user_profile.get('profile_picture') if user_profile else None, MEDIUM),
             'skills': user_skills
         }
         
         return jsonify(response)
-    except Exception as e:
-        print(f"Error fetching user profile: {str(e)}")
+    except Exception:
+        profile_log.exception('Error fetching user profile')
         return jsonify({'error': 'Internal server error'}), 500
 
 @app.route('/api/connections', methods=['GET'])
 @login_required
+@conditional_get('connections.json', 'users.json', 'profile.json', 'skills.json')
 def get_connections():
     """Get all connections for the current user"""
     try:
-        connections = load_json('connections.json')
         current_user_id = session['user_id']
-        users = load_json('users.json')
-        profiles = load_json('profile.json')
-        skills_data = load_json('skills.json')
-
-        print(f"Current user ID: {current_user_id}")
-        print(f"All connections: {connections}")
-        print(f"All users: {users}")
+        connections_log.debug('Listing connections', extra={'user_id': current_user_id})
 
-        # Filter connections for current user
+        # Look up the current user's connections in the graph, and the other
+        # users by key, so SQLite storage reads only the rows involved
+        user_pending, user_connected = connection_graph.for_user(current_user_id)
         pending_connections = []
         connected_users = []
 
-        for conn in connections:
-            print(f"Processing connection: {conn}")
-            # Check if this connection involves the current user
-            if str(conn['user_id']) != str(current_user_id) and str(conn['connected_user_id']) != str(current_user_id):
-                print(f"Skipping connection - not relevant to current user")
-                continue
+        for conn in user_pending + user_connected:
+            connections_log.debug('Processing connection', extra={'connection_id': conn['id']})
 
             # Get user information based on who initiated the connection
             if str(conn['user_id']) == str(current_user_id):
                 other_user_id = conn['connected_user_id']
-                print(f"Current user is sender, other user ID: {other_user_id}")
+                connections_log.debug('Current user is sender', extra={'other_user_id': other_user_id})
             else:
                 other_user_id = conn['user_id']
-                print(f"Current user is receiver, other user ID: {other_user_id}")
+                connections_log.debug('Current user is receiver', extra={'other_user_id': other_user_id})
 
             # Get user details
-            user = next((u for u in users if str(u['id']) == str(other_user_id)), None)
+            user = store.record('users.json', other_user_id)
             if not user:
-                print(f"User not found for ID: {other_user_id}")
+                connections_log.warning('User not found', extra={'other_user_id': other_user_id, 'connection_id': conn['id']})
                 continue
 
             # Get user profile
-            user_profile = next((p for p in profiles if str(p['user_id']) == str(other_user_id)), None)
+            user_profile = store.record('profile.json', other_user_id)
             
             # Get user skills
-            user_skills = skills_data.get('user_skills', {}).get(str(other_user_id), [])
+            user_skills = store.record('skills.json', other_user_id, [])
             matching_skills = [skill['skill_name'] for skill in user_skills]
 
             # Prepare user data
@@ -898,11 +1380,12 @@ def get_connections():
                 'id': user['id'],
                 'username': user['fullname'],
                 'profile_picture': user_profile.get('profile_picture', 'default-avatar.png') if user_profile else 'default-avatar.png',
+                'profile_picture_url': avatar_url(user_profile.get('profile_picture') if user_profile else None, MEDIUM),
                 'matching_skills': matching_skills
             }
 
             if conn['status'] == 'pending':
-                print(f"Adding pending connection: {conn}")
+                connections_log.debug('Adding pending connection', extra={'connection_id': conn['id']})
                 # Include the original connection data for proper status display
                 pending_connections.append({
                     'id': conn['id'],
@@ -912,44 +1395,76 @@ def get_connections():
                     'created_at': conn['created_at']
                 })
             elif conn['status'] == 'connected':
-                print(f"Adding connected user: {user_data}")
+                connections_log.debug('Adding connected user', extra={'other_user_id': user['id']})
                 connected_users.append(user_data)
 
-        print(f"Final pending connections: {pending_connections}")
-        print(f"Final connected users: {connected_users}")
+        connections_log.debug('Listed connections', extra={
+            'user_id': current_user_id, 'pending': len(pending_connections), 'connected': len(connected_users)})
 
         return jsonify({
             'pending_connections': pending_connections,
             'connected_users': connected_users
         })
-    except Exception as e:
-        print(f"Error in get_connections: {str(e)}")
+    except Exception:
+        connections_log.exception('Error in get_connections')
         return jsonify({'success': False, 'message': 'Internal server error'}), 500
 
+@app.route('/api/connections/stream')
+@login_required
+def connection_events():
+    """Server-Sent Events stream of pending counts and new connection requests.
+
+    A stream occupies its worker thread (or greenlet) while it is open, so
+    serve many idle subscribers with threaded or gevent workers.
+    """
+    user_id = str(session['user_id'])
+    connection_watcher.start()
+
+    def stream():
+        with event_hub.subscribe(user_id) as subscription:
+            yield format_sse('pending_count', {'count': connection_watcher.track(user_id)})
+            while True:
+                messages = subscription.get()
+                if not messages:
+                    # Keep-alive comment so proxies don't close an idle stream
+                    yield ': keep-alive\n\n'
+                for event, data in messages:
+                    yield format_sse(event, data)
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/connections/pending-count')
+@login_required
+def pending_connections_count():
+    """Pending connection count for clients without EventSource"""
+    return jsonify({'count': connection_graph.pending_count(session['user_id'])})
+
 @app.route('/api/connections/accept/<connection_id>', methods=['POST'])
 @login_required
+@transactional
 def accept_connection(connection_id):
     """Accept a connection request"""
     try:
         connections = load_json('connections.json')
         current_user_id = str(session['user_id'])  # Convert to string for comparison
         
-        print(f"Accepting connection {connection_id} for user {current_user_id}")
-        print(f"All connections: {connections}")
+        connections_log.debug('Accepting connection', extra={
+            'connection_id': connection_id, 'user_id': current_user_id, 'connections': len(connections)})
         
         # Find the connection
-        connection = next((conn for conn in connections if str(conn['id']) == str(connection_id)), None)
+        connection = store.connection(connection_id)
         if not connection:
-            print(f"Connection {connection_id} not found")
+            connections_log.info('Connection not found', extra={'connection_id': connection_id})
             return jsonify({'success': False, 'message': 'Connection not found'}), 404
             
-        print(f"Found connection: {connection}")
-        print(f"Connection receiver ID: {connection['connected_user_id']}")
-        print(f"Current user ID: {current_user_id}")
+        connections_log.debug('Found connection', extra={
+            'connection_id': connection_id, 'receiver_id': connection['connected_user_id'], 'user_id': current_user_id})
             
         # Verify the current user is the receiver of the request
         if str(connection['connected_user_id']) != current_user_id:
-            print(f"Unauthorized access attempt. Current user: {current_user_id}, Connection receiver: {connection['connected_user_id']}")
+            connections_log.warning('Unauthorized access attempt', extra={
+                'connection_id': connection_id, 'user_id': current_user_id, 'receiver_id': connection['connected_user_id']})
             return jsonify({'success': False, 'message': 'Unauthorized'}), 403
             
         # Update connection status
@@ -957,16 +1472,18 @@ def accept_connection(connection_id):
         connection['accepted_at'] = datetime.now().isoformat()
         
         # Save updated connections
-        save_json(connections, 'connections.json')
-        print("Connection updated successfully")
+        save_json(connections, 'connections.json', changed=[connection['id']])
+        notify_after_flush(connection)
+        connections_log.info('Connection accepted', extra={'connection_id': connection_id, 'user_id': current_user_id})
         
         return jsonify({'success': True, 'message': 'Connection request accepted'})
-    except Exception as e:
-        print(f"Error in accept_connection: {str(e)}")
+    except Exception:
+        connections_log.exception('Error in accept_connection')
         return jsonify({'success': False, 'message': 'Internal server error'}), 500
 
 @app.route('/api/connections/reject/<connection_id>', methods=['POST'])
 @login_required
+@transactional
 def reject_connection(connection_id):
     """Reject a connection request"""
     try:
@@ -974,7 +1491,7 @@ def reject_connection(connection_id):
         current_user_id = session['user_id']
 
         # Find the connection
-        connection = next((conn for conn in connections if conn['id'] == connection_id), None)
+        connection = store.connection(connection_id)
         
         if not connection:
             return jsonify({'success': False, 'message': 'Connection not found'}), 404
@@ -984,16 +1501,18 @@ def reject_connection(connection_id):
             return jsonify({'success': False, 'message': 'Unauthorized'}), 403
 
         # Remove the connection
-        connections = [conn for conn in connections if conn['id'] != connection_id]
-        save_json(connections, 'connections.json')
+        connections.remove(connection)
+        save_json(connections, 'connections.json', removed=[connection['id']])
+        notify_after_flush(connection)
 
         return jsonify({'success': True, 'message': 'Connection rejected'})
-    except Exception as e:
-        print(f"Error in reject_connection: {str(e)}")
+    except Exception:
+        connections_log.exception('Error in reject_connection')
         return jsonify({'success': False, 'message': 'Internal server error'}), 500
 
 @app.route('/api/connections/request', methods=['POST'])
 @login_required
+@transactional
 def request_connection():
     """Send a connection request"""
     try:
@@ -1007,19 +1526,14 @@ def request_connection():
         current_user_id = session['user_id']
 
         # Check if connection already exists
-        existing_connection = next(
-            (conn for conn in connections 
-             if (conn['user_id'] == current_user_id and conn['connected_user_id'] == target_user_id) or
-             (conn['user_id'] == target_user_id and conn['connected_user_id'] == current_user_id)),
-            None
-        )
+        existing_connection = connection_graph.between(current_user_id, target_user_id)
 
         if existing_connection:
             return jsonify({'success': False, 'message': 'Connection already exists'}), 400
 
         # Create new connection request
         new_connection = {
-            'id': str(len(connections) + 1),
+            'id': connection_graph.next_id(),
             'user_id': current_user_id,
             'connected_user_id': target_user_id,
             'status': 'pending',
@@ -1027,15 +1541,17 @@ def request_connection():
         }
 
         connections.append(new_connection)
-        save_json(connections, 'connections.json')
+        save_json(connections, 'connections.json', changed=[new_connection['id']])
+        notify_after_flush(new_connection)
 
         return jsonify({'success': True, 'message': 'Connection request sent'})
-    except Exception as e:
-        print(f"Error in request_connection: {str(e)}")
+    except Exception:
+        connections_log.exception('Error in request_connection')
         return jsonify({'success': False, 'message': 'Internal server error'}), 500
 
 @app.route('/api/connections/test', methods=['POST'])
 @login_required
+@transactional
 def test_connection():
     """Create a test connection request"""
     try:
@@ -1044,7 +1560,7 @@ def test_connection():
         
         # Create a test connection request
         test_connection = {
-            'id': str(len(connections) + 1),
+            'id': connection_graph.next_id(),
             'user_id': current_user_id,  # Current user sends the request
             'connected_user_id': '2',  # Connect to user with ID 2 (as string)
             'status': 'pending',
@@ -1052,11 +1568,12 @@ def test_connection():
         }
 
         connections.append(test_connection)
-        save_json(connections, 'connections.json')
+        save_json(connections, 'connections.json', changed=[test_connection['id']])
+        notify_after_flush(test_connection)
 
         return jsonify({'success': True, 'message': 'Test connection request created'})
-    except Exception as e:
-        print(f"Error in test_connection: {str(e)}")
+    except Exception:
+        connections_log.exception('Error in test_connection')
         return jsonify({'success': False, 'message': 'Internal server error'}), 500
 
 @app.route('/api/connections/debug', methods=['GET'])
@@ -1084,8 +1601,8 @@ def debug_connections():
             'current_user_id_type': str(type(current_user_id)),
             'connections': debug_connections
         })
-    except Exception as e:
-        print(f"Error in debug_connections: {str(e)}")
+    except Exception:
+        connections_log.exception('Error in debug_connections')
         return jsonify({'success': False, 'message': 'Internal server error'}), 500
 
 if __name__ == '__main__':
@@ -0,0 +1,123 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Subdirectories of static/ that get fingerprinted; uploads/ holds user files
+ASSET_DIRS = ('css', 'js', 'images')
+
+# Variants written next to each asset, preferred in this order: (Content-Encoding, suffix)
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+# Compressing pays off for text; images are compressed already
+COMPRESSIBLE = {'.css', '.js', '.svg', '.json', '.txt'}
+
+MANIFEST = 'manifest.json'
+
+logger = logging.getLogger(__name__)
+
+
+def fingerprint(name, content):
+    """'css/styles.css' -> 'css/styles.<first 12 hex of sha256>.css'"""
+    stem, ext = os.path.splitext(name)
+    return f'{stem}.{hashlib.sha256(content).hexdigest()[:12]}{ext}'
+
+
+def _compress(encoding, content):
+    if encoding == 'gzip':
+        # mtime=0 keeps the output identical between builds
+        return gzip.compress(content, compresslevel=9, mtime=0)
+    return brotli.compress(content, quality=11)
+
+
+def _write(path, data):
+    # A name per process, so builds running side by side don't share a temp file
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def load_manifest(output_dir):
+    """The manifest written by build_manifest(), or None if output_dir has none"""
+    try:
+        with open(os.path.join(output_dir, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def build_manifest(static_dir, output_dir):
+    """Copy every asset to output_dir under its fingerprinted name, plus compressed variants.
+
+    Returns and writes the manifest, {name: fingerprinted name}. Outputs
+    that already exist are left alone, as equal names mean equal content,
+    and so is an unchanged manifest.
+    """
+    manifest = {}
+    for asset_dir in ASSET_DIRS:
+        for root, _, files in os.walk(os.path.join(static_dir, asset_dir)):
+            for filename in sorted(files):
+                path = os.path.join(root, filename)
+                name = os.path.relpath(path, static_dir).replace(os.sep, '/')
+                with open(path, 'rb') as f:
+                    content = f.read()
+                manifest[name] = fingerprint(name, content)
+
+                target = os.path.join(output_dir, manifest[name])
+                outputs = [(target, content)]
+                if os.path.splitext(name)[1] in COMPRESSIBLE:
+                    for encoding, suffix in ENCODINGS:
+                        if encoding == 'br' and brotli is None:
+                            continue
+                        if not os.path.exists(target + suffix):
+                            outputs.append((target + suffix, _compress(encoding, content)))
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                for output, data in outputs:
+                    if not os.path.exists(output):
+                        _write(output, data)
+
+    if load_manifest(output_dir) != manifest:
+        _write(os.path.join(output_dir, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return manifest
+
+
+class AssetManifest:
+    """Fingerprinted names of the static assets and their precompressed files.
+
+    A fingerprinted URL changes whenever the content does, so the files can
+    be cached by browsers forever. The manifest is only read here; it is
+    built by scripts/build_assets.py. Without one, assets are linked and
+    served under their own names.
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.names = load_manifest(output_dir)
+        if self.names is None:
+            logger.warning('No %s in %s; run scripts/build_assets.py to serve fingerprinted assets',
+                           MANIFEST, output_dir)
+            self.names = {}
+        self.fingerprinted = {v: k for k, v in self.names.items()}
+
+    def url_name(self, name):
+        """Fingerprinted name to link to, or name itself if it is not an asset"""
+        return self.names.get(name, name)
+
+    def original(self, fingerprinted_name):
+        """Asset name for a fingerprinted name, or None"""
+        return self.fingerprinted.get(fingerprinted_name)
+
+    def variant(self, fingerprinted_name, accept_encodings):
+        """(path, Content-Encoding or None) of the best file for the client"""
+        path = os.path.join(self.output_dir, fingerprinted_name)
+        for encoding, suffix in ENCODINGS:
+            if encoding in accept_encodings and os.path.exists(path + suffix):
+                return path + suffix, encoding
+        return path, None
@@ -0,0 +1,155 @@
+import logging
+import os
+import queue
+import threading
+
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Square thumbnail edges in px: list rows, cards, the profile page
+AVATAR_SIZES = (48, 96, 200)
+SMALL, MEDIUM, LARGE = AVATAR_SIZES
+
+# Extension -> (Pillow format, MIME type, save options); WebP first, JPEG as fallback
+FORMATS = {
+    'webp': ('WEBP', 'image/webp', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', 'image/jpeg', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+DEFAULT_AVATAR = 'default-avatar.png'
+
+# Pillow formats accepted as uploads
+UPLOAD_FORMATS = {'PNG', 'JPEG', 'GIF', 'WEBP'}
+
+# Larger uploads are refused before decoding; 40 MP is well beyond any camera photo
+MAX_PIXELS = 40_000_000
+
+# Seconds a request waits for the worker to render a missing thumbnail
+RENDER_TIMEOUT = 10
+
+
+def sniff_image(path):
+    """Return the Pillow format of an uploaded image, or None if it is not one we accept.
+
+    Only reads the header, so it is cheap enough to run in the request.
+    """
+    try:
+        with Image.open(path) as image:
+            if image.format not in UPLOAD_FORMATS or image.width * image.height > MAX_PIXELS:
+                return None
+            return image.format
+    except (OSError, Image.DecompressionBombError):
+        return None
+
+
+def _stem(name):
+    return os.path.splitext(name)[0]
+
+
+class AvatarPipeline:
+    """Renders profile pictures into fixed-size square thumbnails.
+
+    Uploads are decoded on a single background thread. Each is rendered at
+    every AVATAR_SIZES edge as WebP and JPEG. Thumbnails are encoded from
+    the decoded pixels only, so EXIF (including GPS position), ICC profiles
+    and comments are left behind. A request for a thumbnail that is not
+    rendered yet (e.g. a picture uploaded before this pipeline) queues it
+    and waits briefly.
+    """
+
+    def __init__(self, source_dirs, thumbnail_dir, default_source):
+        self.source_dirs = list(source_dirs)
+        self.thumbnail_dir = thumbnail_dir
+        self.default_source = default_source
+        os.makedirs(thumbnail_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._pending = {}  # picture name -> Event set once rendered
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._work, name='avatar-renderer', daemon=True)
+        self._worker.start()
+
+    def thumbnail_path(self, name, size, ext):
+        return os.path.join(self.thumbnail_dir, f'{_stem(name)}_{size}.{ext}')
+
+    def source_path(self, name):
+        if name == DEFAULT_AVATAR:
+            return self.default_source
+        for directory in self.source_dirs:
+            path = os.path.join(directory, name)
+            if os.path.isfile(path):
+                return path
+        return None
+
+    def render_defaults(self):
+        """Render the default avatar at every size unless already up to date"""
+        newest = os.path.getmtime(self.default_source)
+        outputs = [self.thumbnail_path(DEFAULT_AVATAR, size, ext)
+                   for size in AVATAR_SIZES for ext in FORMATS]
+        if any(not os.path.exists(p) or os.path.getmtime(p) < newest for p in outputs):
+            self._render(DEFAULT_AVATAR)
+
+    def submit(self, name):
+        """Queue a picture for rendering; returns an Event set when it is done"""
+        with self._lock:
+            event = self._pending.get(name)
+            if event is None:
+                event = self._pending[name] = threading.Event()
+                self._queue.put(name)
+            return event
+
+    def get(self, name, size, ext):
+        """Path of a rendered thumbnail, rendering it first if needed; None if there is no such picture"""
+        path = self.thumbnail_path(name, size, ext)
+        if os.path.exists(path):
+            return path
+        if self.source_path(name) is None:
+            return None
+        self.submit(name).wait(RENDER_TIMEOUT)
+        return path if os.path.exists(path) else None
+
+    def discard(self, name):
+        """Remove a picture's thumbnails"""
+        for size in AVATAR_SIZES:
+            for ext in FORMATS:
+                try:
+                    os.remove(self.thumbnail_path(name, size, ext))
+                except OSError:
+                    pass
+
+    def _work(self):
+        while True:
+            name = self._queue.get()
+            try:
+                self._render(name)
+            except Exception:
+                logger.exception('Error rendering avatar', extra={'picture': name})
+            finally:
+                with self._lock:
+                    self._pending.pop(name).set()
+
+    def _render(self, name):
+        source = self.source_path(name)
+        if source is None:
+            return
+        with Image.open(source) as image:
+            if image.width * image.height > MAX_PIXELS:
+                raise ValueError(f'{image.width}x{image.height} image is too large')
+            # Apply the EXIF orientation before the EXIF data is dropped
+            image = ImageOps.exif_transpose(image)
+            if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+                # JPEG has no alpha; flatten transparent areas onto white
+                rgba = image.convert('RGBA')
+                image = Image.new('RGB', rgba.size, 'white')
+                image.paste(rgba, mask=rgba)
+            else:
+                image = image.convert('RGB')
+            square = ImageOps.fit(image, (max(AVATAR_SIZES),) * 2, Image.LANCZOS)
+
+        for size in AVATAR_SIZES:
+            thumbnail = square if size == square.width else square.resize((size, size), Image.LANCZOS)
+            for ext, (fmt, _, options) in FORMATS.items():
+                path = self.thumbnail_path(name, size, ext)
+                tmp_path = f'{path}.tmp'
+                thumbnail.save(tmp_path, fmt, **options)
+                os.replace(tmp_path, path)
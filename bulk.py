@@ -0,0 +1,320 @@
+import json
+import time
+from datetime import datetime
+
+from connection_graph import pair_key
+from datastore import WriteConflict
+
+# NDJSON record types, in the order they are exported; records may only
+# refer to users exported before them
+EXPORT_TYPES = {
+    'users': 'users.json',
+    'profiles': 'profile.json',
+    'skills': 'skills.json',
+    'connections': 'connections.json',
+}
+
+# Records serialized per store lock acquisition while exporting
+EXPORT_CHUNK = 500
+IMPORT_BATCH = 5000
+IMPORT_ATTEMPTS = 5
+CONNECTION_STATUSES = ('pending', 'connected')
+MAX_REPORTED_ERRORS = 100
+
+
+class RecordRejected(ValueError):
+    """A record failed validation; it is skipped and reported"""
+
+
+def _numeric(key):
+    # ASCII digits only: isdigit() also takes characters like '²' that int() rejects
+    return key.isascii() and key.isdecimal()
+
+
+def export_ndjson(store, types=EXPORT_TYPES):
+    """Yield one '{"type": ..., "data": {...}}' line per record of the given types.
+
+    Records are serialized a chunk at a time straight from the cached
+    collections, so beyond the store's own cache memory use does not grow
+    with the data set. Each skill is a line of its own carrying its user_id.
+    """
+    for type_name in types:
+        filename = EXPORT_TYPES[type_name]
+        with store.lock:
+            data = store.load(filename)
+            # The list (or skills' key list) as of now; later saves are not picked up
+            keys = list(data.get('user_skills', {})) if filename == 'skills.json' else None
+        total = len(keys) if keys is not None else len(data)
+        for start in range(0, total, EXPORT_CHUNK):
+            with store.lock:
+                if keys is None:
+                    lines = [_line(type_name, record) for record in data[start:start + EXPORT_CHUNK]]
+                else:
+                    skills = data.get('user_skills', {})
+                    lines = [_line(type_name, {**skill, 'user_id': user_id})
+                             for user_id in keys[start:start + EXPORT_CHUNK]
+                             for skill in skills.get(user_id, [])]
+            yield ''.join(lines)
+
+
+def _line(type_name, record):
+    return json.dumps({'type': type_name, 'data': record}) + '\n'
+
+
+class BulkImporter:
+    """Validate NDJSON records and commit them in batches of `batch_size`.
+
+    Each batch is one save_many() of the collections it touches, retried
+    on fresh data if another process saved them in between. Users keep
+    their id unless it is taken, in which case the next free one is used;
+    later records of the import naming the old id are pointed at the new
+    one. Profiles replace the user's existing profile, skills are appended,
+    and connections between users that already have one are rejected.
+    Invalid records are skipped and reported with their line number.
+    """
+
+    def __init__(self, store, batch_size=IMPORT_BATCH, lock=None):
+        self.store = store
+        self.batch_size = batch_size
+        self.lock = lock  # held around each batch, e.g. the app's write lock
+        self._user_ids = {}  # user id in the import -> id stored
+        self.imported = dict.fromkeys(EXPORT_TYPES, 0)
+        self.rejected = 0
+        self.errors = []
+        self.lines = 0
+
+    def run(self, lines):
+        """Import an iterable of NDJSON lines (str or bytes); returns report()"""
+        started = time.perf_counter()
+        batch = []
+        for number, line in enumerate(lines, 1):
+            self.lines = number
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+                if not isinstance(entry, dict) or entry.get('type') not in EXPORT_TYPES \
+                        or not isinstance(entry.get('data'), dict):
+                    raise RecordRejected('expected {"type": one of %s, "data": {...}}' % ', '.join(EXPORT_TYPES))
+            except ValueError as e:
+                self._reject(number, str(e))
+                continue
+            batch.append((number, entry['type'], entry['data']))
+            if len(batch) >= self.batch_size:
+                self._commit(batch)
+                batch = []
+        if batch:
+            self._commit(batch)
+        return self.report(time.perf_counter() - started)
+
+    def report(self, seconds):
+        records = sum(self.imported.values())
+        return {
+            'imported': dict(self.imported),
+            'rejected': self.rejected,
+            'errors': sorted(self.errors, key=lambda error: error['line']),
+            'lines': self.lines,
+            'seconds': round(seconds, 3),
+            'records_per_second': round(records / seconds, 1) if seconds else None,
+        }
+
+    def _reject(self, number, error):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': number, 'error': error})
+
+    def _commit(self, batch):
+        for attempt in range(IMPORT_ATTEMPTS):
+            if self.lock is not None:
+                self.lock.acquire()
+            try:
+                with self.store.lock:
+                    applied = _Batch(self.store, self._user_ids)
+                    try:
+                        rejected = applied.apply(batch)
+                        applied.save()
+                    except WriteConflict:
+                        applied.discard()
+                        continue
+                    except BaseException:
+                        applied.discard()
+                        raise
+            finally:
+                if self.lock is not None:
+                    self.lock.release()
+            self._user_ids.update(applied.user_ids)
+            for type_name, count in applied.counts.items():
+                self.imported[type_name] += count
+            for number, error in rejected:
+                self._reject(number, error)
+            return
+        raise WriteConflict(', '.join(sorted(applied.dirty)))
+
+
+class _Batch:
+    """One batch applied to the cached collections, ready to be saved"""
+
+    def __init__(self, store, user_ids):
+        self.store = store
+        self.known_ids = user_ids
+        self.user_ids = {}  # mappings added by this batch; None for users rejected
+        self.counts = dict.fromkeys(EXPORT_TYPES, 0)
+        self.changed = {}   # filename -> changed keys
+        self.data = {}
+        self.now = datetime.now().isoformat()
+        self._next_user_id = None
+        self._next_connection_id = None
+        self._pairs = None
+        self._indexes = {}
+
+    @property
+    def dirty(self):
+        return list(self.changed)
+
+    def apply(self, batch):
+        rejected = []
+        for number, type_name, record in batch:
+            try:
+                getattr(self, f'_add_{type_name}')(record)
+                self.counts[type_name] += 1
+            except RecordRejected as e:
+                rejected.append((number, str(e)))
+                if type_name == 'users' and record.get('id') is not None:
+                    # Records naming this user must not land on whoever has the id here
+                    self.user_ids[str(record['id'])] = None
+        return rejected
+
+    def discard(self):
+        """Drop the cached copies this batch may have changed in place"""
+        for filename in self.data:
+            self.store.invalidate(filename)
+
+    def save(self):
+        writes = [(self.data[filename], filename, sorted(keys), None) for filename, keys in self.changed.items()]
+        if writes:
+            self.store.save_many(writes)
+
+    def _load(self, filename):
+        if filename not in self.data:
+            self.data[filename] = self.store.load(filename)
+        return self.data[filename]
+
+    def _index(self, filename, name='key'):
+        # The store lock is held for the whole batch, so these stay current
+        if (filename, name) not in self._indexes:
+            self._indexes[filename, name] = self.store.index(filename, name)
+        return self._indexes[filename, name]
+
+    def _insert(self, filename, key, record):
+        # Indexed now so _resolve_user and save() find it without a scan
+        self._load(filename).append(record)
+        self._index(filename)[str(key)] = record
+        self.changed.setdefault(filename, set()).add(str(key))
+
+    def _resolve_user(self, user_id):
+        if user_id is None:
+            raise RecordRejected('user_id is required')
+        key = str(user_id)
+        if key in self.user_ids:
+            stored = self.user_ids[key]
+        else:
+            stored = self.known_ids.get(key, key)
+        if stored is None:
+            raise RecordRejected(f'user {user_id} was not imported')
+        user = self._index('users.json').get(str(stored))
+        if user is None:
+            raise RecordRejected(f'unknown user {user_id}')
+        return user['id']
+
+    def _add_users(self, record):
+        email, fullname, password = record.get('email'), record.get('fullname'), record.get('password')
+        if not isinstance(email, str) or '@' not in email:
+            raise RecordRejected('email is required')
+        if not isinstance(fullname, str) or not fullname.strip():
+            raise RecordRejected('fullname is required')
+        if not isinstance(password, str) or not password:
+            raise RecordRejected('password hash is required')
+        self._load('users.json')
+        if self._index('users.json', 'email').get(email) is not None:
+            raise RecordRejected(f'email {email} is already registered')
+
+        keys = self._index('users.json')
+        if self._next_user_id is None:
+            self._next_user_id = max((int(key) for key in keys if _numeric(key)), default=0) + 1
+        user_id = record.get('id')
+        if not isinstance(user_id, int) or user_id < 1 or str(user_id) in keys:
+            user_id = self._next_user_id
+        self._next_user_id = max(self._next_user_id, user_id + 1)
+
+        user = {**record, 'id': user_id, 'created_at': record.get('created_at') or self.now}
+        self._insert('users.json', user_id, user)
+        self._index('users.json', 'email')[email] = user
+        if record.get('id') is not None:
+            self.user_ids[str(record['id'])] = user_id
+
+    def _add_profiles(self, record):
+        user_id = self._resolve_user(record.get('user_id'))
+        interests = record.get('interests', [])
+        if not isinstance(interests, list):
+            raise RecordRejected('interests must be a list')
+        profile = {
+            'profile_picture': 'default-avatar.png', 'about': '', 'location': '',
+            'created_at': self.now, 'updated_at': self.now,
+            **record, 'user_id': user_id, 'interests': interests,
+        }
+        self._load('profile.json')
+        existing = self._index('profile.json').get(str(user_id))
+        if existing is None:
+            self._insert('profile.json', user_id, profile)
+        else:
+            # Keep the record's identity, as DataStore does when replaying changes
+            existing.clear()
+            existing.update(profile)
+            self.changed.setdefault('profile.json', set()).add(str(user_id))
+
+    def _add_skills(self, record):
+        user_id = str(self._resolve_user(record.get('user_id')))
+        skill_name = record.get('skill_name')
+        if not isinstance(skill_name, str) or not skill_name.strip():
+            raise RecordRejected('skill_name is required')
+        skills_data = self._load('skills.json')
+        user_skills = skills_data.setdefault('user_skills', {}).setdefault(user_id, [])
+        skill_id = record.get('skill_id')
+        if not skill_id or any(skill.get('skill_id') == skill_id for skill in user_skills):
+            skill_id = f"{skill_name.lower()}_{len(user_skills) + 1}"
+        skill = {
+            'description': '', 'qualification': 'Beginner', 'years_of_experience': 0,
+            'certifications': [], 'projects': [], 'created_at': self.now, 'updated_at': self.now,
+            **{key: value for key, value in record.items() if key != 'user_id'},
+            'skill_id': skill_id,
+        }
+        user_skills.append(skill)
+        self.changed.setdefault('skills.json', set()).add(user_id)
+
+    def _add_connections(self, record):
+        # Stored as the users' ids are, since views compare them with the session's id
+        sender = self._resolve_user(record.get('user_id'))
+        receiver = self._resolve_user(record.get('connected_user_id'))
+        status = record.get('status', 'pending')
+        if sender == receiver:
+            raise RecordRejected('a user cannot connect to themselves')
+        if status not in CONNECTION_STATUSES:
+            raise RecordRejected(f"status must be one of {', '.join(CONNECTION_STATUSES)}")
+
+        connections = self._load('connections.json')
+        keys = self._index('connections.json')
+        if self._pairs is None:
+            self._pairs = {pair_key(c['user_id'], c['connected_user_id']) for c in connections}
+            self._next_connection_id = max((int(key) for key in keys if _numeric(key)), default=0) + 1
+        if pair_key(sender, receiver) in self._pairs:
+            raise RecordRejected(f'users {sender} and {receiver} already have a connection')
+
+        connection_id = str(record.get('id', ''))
+        if not _numeric(connection_id) or connection_id in keys:
+            connection_id = str(self._next_connection_id)
+        self._next_connection_id = max(self._next_connection_id, int(connection_id) + 1)
+
+        connection = {**record, 'id': connection_id, 'user_id': sender, 'connected_user_id': receiver,
+                      'status': status, 'created_at': record.get('created_at') or self.now}
+        self._insert('connections.json', connection_id, connection)
+        self._pairs.add(pair_key(sender, receiver))
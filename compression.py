@@ -0,0 +1,81 @@
+import zlib
+
+from flask import request
+
+# Types worth compressing; images and fonts are compressed already, and
+# event streams must reach the client one event at a time
+COMPRESS_MIMETYPES = {
+    'application/json',
+    'application/x-ndjson',
+    'application/javascript',
+    'text/html',
+    'text/css',
+    'text/plain',
+    'text/csv',
+}
+
+# Bodies smaller than this fit in a packet or two anyway
+DEFAULT_MIN_SIZE = 1024
+
+DEFAULT_LEVEL = 6
+
+
+def _gzip_stream(chunks, level):
+    # wbits=31 writes the gzip header and trailer around the deflate data
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class Compressor:
+    """gzip compression of eligible responses, registered as an after_request hook.
+
+    A response is compressed when the client accepts gzip, its type is in
+    mimetypes, it is not encoded or passed through already (send_file), and
+    it is at least min_size bytes or is streamed. Buffered bodies are
+    compressed once in place; streamed ones chunk by chunk as they are
+    sent. Strong ETags are made weak, as the gzip bytes differ from the
+    identity ones; If-None-Match compares weakly anyway.
+    """
+
+    def __init__(self, min_size=DEFAULT_MIN_SIZE, level=DEFAULT_LEVEL, mimetypes=COMPRESS_MIMETYPES):
+        if not -1 <= level <= 9:
+            raise ValueError(f'Compression level must be -1 to 9, not {level}')
+        self.min_size = min_size
+        self.level = level
+        self.mimetypes = set(mimetypes)
+
+    def init_app(self, app):
+        app.after_request(self.compress)
+
+    def eligible(self, response):
+        return (response.status_code == 200
+                and response.mimetype in self.mimetypes
+                and not response.direct_passthrough
+                and 'Content-Encoding' not in response.headers
+                and 'no-transform' not in response.headers.get('Cache-Control', ''))
+
+    def compress(self, response):
+        if not self.eligible(response):
+            return response
+        response.vary.add('Accept-Encoding')
+        if 'gzip' not in request.accept_encodings:
+            return response
+
+        if response.is_streamed:
+            response.response = _gzip_stream(response.iter_encoded(), self.level)
+            response.headers.pop('Content-Length', None)
+        else:
+            body = response.get_data()
+            if len(body) < self.min_size:
+                return response
+            response.set_data(b''.join(_gzip_stream([body], self.level)))
+
+        response.content_encoding = 'gzip'
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
@@ -0,0 +1,157 @@
+def pair_key(user_id, other_id):
+    """Canonical key for an unordered pair of users"""
+    return tuple(sorted((str(user_id), str(other_id))))
+
+
+def _id_order(connection_id):
+    # Connection ids are decimal strings; order them numerically
+    return (len(connection_id), connection_id)
+
+
+class ConnectionGraph:
+    """Adjacency index over connections.json, kept current from DataStore saves.
+
+    Holds an id -> connection map, the connection id for each unordered user
+    pair, and per-user sets of connection ids split into pending inbound,
+    pending outbound and connected. The index is derived from the
+    connections collection and rebuilt whenever that file is re-read, so it
+    is persisted along with it. While the collection is not loaded and the
+    storage indexes connection endpoints (SQLite), lookups for one user
+    query just that user's connections instead.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._by_id = None
+        self._pairs = None
+        self._inbound = None    # user id -> ids of pending requests sent to them
+        self._outbound = None   # user id -> ids of pending requests they sent
+        self._connected = None  # user id -> ids of accepted connections
+        self._indexed = None    # connection id -> (sender, receiver, status) as indexed
+        self._max_id = 0
+        store.subscribe(self._on_save)
+
+    def _on_save(self, filename, data, changed, removed):
+        if filename != 'connections.json':
+            return
+        with self.store.lock:
+            if self._by_id is None:
+                return
+            if changed is None and removed is None:
+                self._by_id = None
+                return
+            for connection_id in map(str, removed or []):
+                self._unlink(connection_id)
+            for connection_id in map(str, changed or []):
+                self._unlink(connection_id)
+                connection = self.store.connection(connection_id)
+                if connection is not None:
+                    self._link(connection)
+
+    def _ensure(self):
+        # Loading first lets a reload from disk invalidate the index
+        connections = self.store.load('connections.json')
+        if self._by_id is None:
+            self._by_id, self._pairs, self._indexed = {}, {}, {}
+            self._inbound, self._outbound, self._connected = {}, {}, {}
+            self._max_id = 0
+            for connection in connections:
+                self._link(connection)
+
+    def _sets(self, status, sender, receiver):
+        if status == 'pending':
+            return [(self._outbound, sender), (self._inbound, receiver)]
+        if status == 'connected':
+            return [(self._connected, sender), (self._connected, receiver)]
+        return []
+
+    def _link(self, connection):
+        connection_id = str(connection['id'])
+        if connection_id in self._by_id:
+            # Duplicate ids in the file: the first one wins, as in DataStore
+            return
+        sender, receiver = str(connection['user_id']), str(connection['connected_user_id'])
+        self._by_id[connection_id] = connection
+        self._pairs.setdefault(pair_key(sender, receiver), connection_id)
+        self._indexed[connection_id] = (sender, receiver, connection['status'])
+        for adjacency, user_id in self._sets(connection['status'], sender, receiver):
+            adjacency.setdefault(user_id, set()).add(connection_id)
+        if connection_id.isdigit():
+            self._max_id = max(self._max_id, int(connection_id))
+
+    def _unlink(self, connection_id):
+        indexed = self._indexed.pop(connection_id, None)
+        if indexed is None:
+            return
+        sender, receiver, status = indexed
+        del self._by_id[connection_id]
+        if self._pairs.get(pair_key(sender, receiver)) == connection_id:
+            del self._pairs[pair_key(sender, receiver)]
+        for adjacency, user_id in self._sets(status, sender, receiver):
+            adjacency.get(user_id, set()).discard(connection_id)
+
+    def _stored(self, user_id):
+        """The user's connections by id order, read from storage, or None (see DataStore.find)"""
+        sent = self.store.find('connections.json', 'user_id', user_id)
+        if sent is None:
+            return None
+        connections = {}
+        for connection in sent + self.store.find('connections.json', 'connected_user_id', user_id):
+            # Duplicate ids in the file: the first one wins, as in _link
+            connections.setdefault(str(connection['id']), connection)
+        return [connections[i] for i in sorted(connections, key=_id_order)]
+
+    def between(self, user_id, other_id):
+        """The connection between two users in either direction, or None"""
+        with self.store.lock:
+            stored = self._stored(user_id)
+            if stored is not None:
+                pair = pair_key(user_id, other_id)
+                return next((c for c in stored
+                             if pair_key(c['user_id'], c['connected_user_id']) == pair), None)
+            self._ensure()
+            connection_id = self._pairs.get(pair_key(user_id, other_id))
+            return self._by_id[connection_id] if connection_id else None
+
+    def for_user(self, user_id):
+        """Return (pending, connected) connections of a user, oldest first.
+
+        pending holds both requests the user sent and requests sent to them.
+        """
+        user_id = str(user_id)
+        with self.store.lock:
+            stored = self._stored(user_id)
+            if stored is not None:
+                return ([c for c in stored if c['status'] == 'pending'],
+                        [c for c in stored if c['status'] == 'connected'])
+            self._ensure()
+            pending = self._inbound.get(user_id, set()) | self._outbound.get(user_id, set())
+            connected = self._connected.get(user_id, set())
+            return ([self._by_id[i] for i in sorted(pending, key=_id_order)],
+                    [self._by_id[i] for i in sorted(connected, key=_id_order)])
+
+    def requests_to(self, user_id):
+        """Pending requests sent to the user, oldest first"""
+        with self.store.lock:
+            stored = self._stored(user_id)
+            if stored is not None:
+                return [c for c in stored
+                        if c['status'] == 'pending' and str(c['connected_user_id']) == str(user_id)]
+            self._ensure()
+            inbound = self._inbound.get(str(user_id), set())
+            return [self._by_id[i] for i in sorted(inbound, key=_id_order)]
+
+    def pending_count(self, user_id):
+        """Number of pending requests the user sent or received"""
+        user_id = str(user_id)
+        with self.store.lock:
+            stored = self._stored(user_id)
+            if stored is not None:
+                return sum(c['status'] == 'pending' for c in stored)
+            self._ensure()
+            return len(self._inbound.get(user_id, set()) | self._outbound.get(user_id, set()))
+
+    def next_id(self):
+        with self.store.lock:
+            self._ensure()
+            return str(self._max_id + 1)
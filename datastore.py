@@ -0,0 +1,498 @@
+import json
+import os
+import threading
+
+from journal import record_key
+from records import RecordFile, records_path, write_records
+from storage import open_storage
+
+
+class WriteConflict(Exception):
+    """Another process saved a collection after this one read it"""
+
+
+def _first_by(records, key):
+    index = {}
+    for record in records:
+        index.setdefault(key(record), record)
+    return index
+
+
+def _group_by(records, key):
+    index = {}
+    for record in records:
+        index.setdefault(key(record), []).append(record)
+    return index
+
+
+# (filename, index name) -> builder taking the parsed collection
+# Every list collection also gets a 'key' index over its journal.KEY_FIELDS field
+INDEX_BUILDERS = {
+    ('users.json', 'email'): lambda users: _first_by(users, lambda u: u['email']),
+    ('profile.json', 'user_id'): lambda profiles: _group_by(profiles, lambda p: str(p['user_id'])),
+}
+
+
+class _Entry:
+    """A cached collection and what it was read from"""
+
+    __slots__ = ('signature', 'data', 'version', 'position')
+
+    def __init__(self, signature, data, version, position=0):
+        self.signature = signature
+        self.data = data
+        self.version = version    # the storage save counter the data reflects
+        self.position = position  # for Storage.read_since, e.g. a journal offset
+
+
+class DataStore:
+    """Process-wide in-memory copy of the collections in the data directory.
+
+    Each collection is read once and kept in memory. It is re-read only when
+    its storage signature changes (for JSON files, their mtime or size), so
+    edits made outside the app still show up. The loaded objects are shared
+    between requests: callers that mutate them must hand them back through
+    save().
+
+    Where the data lives is up to a storage.Storage picked by mode: 'json'
+    rewrites a file per save, 'journal' appends only the records named in
+    changed/removed to <file>.journal and folds it into a fresh snapshot in a
+    background thread, and 'sqlite' updates just those rows in
+    data/skillswap.db. When another process appends to a journal, only the
+    new lines are applied to the cached copy.
+
+    Several processes may share a data directory. Saves hold the storage
+    lock only while writing and bump a per-collection save counter. A save
+    whose data was read at an older counter raises WriteConflict instead of
+    overwriting the other process's changes.
+
+    A collection that is not cached yet can answer record() and version()
+    from its <file>.records file (see records.py and write_records()), as
+    long as that was written from the collection as it is stored now.
+    """
+
+    def __init__(self, data_dir, mode='json', fsync='always',
+                 journal_max_bytes=1024 * 1024, fsync_interval=1.0):
+        self.data_dir = data_dir
+        self.mode = mode
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self._storage = open_storage(data_dir, mode=mode, fsync=fsync,
+                                     journal_max_bytes=journal_max_bytes)
+        self._lock = threading.RLock()
+        self._cache = {}     # filename -> _Entry
+        self._indexes = {}   # filename -> {index name: dict}
+        self._wake = threading.Event()
+        self._closed = False
+        self._compactor = None
+        self._listeners = []
+        self._local = threading.local()
+        self._versions = {}  # filename -> number of saves and reloads seen
+        self._record_files = {}  # filename -> (stat of <file>.records, RecordFile)
+
+    @property
+    def lock(self):
+        """Reentrant lock held while collections are loaded, saved and indexed"""
+        return self._lock
+
+    def _read(self, filename):
+        """Read a collection from storage; call within its storage lock"""
+        data, position = self._storage.read(filename)
+        return _Entry(self._storage.signature(filename), data,
+                      self._storage.version(filename), position)
+
+    def pin(self):
+        """Until unpin(), this thread checks each file on disk only on its first load"""
+        self._local.validated = set()
+
+    def unpin(self):
+        self._local.validated = None
+
+    def load(self, filename):
+        validated = getattr(self._local, 'validated', None)
+        with self._lock:
+            cached = self._cache.get(filename)
+            if cached is not None and validated is not None and filename in validated:
+                return cached.data
+
+            if validated is not None:
+                validated.add(filename)
+            if cached is not None and cached.signature == self._storage.signature(filename):
+                return cached.data
+
+            with self._storage.locked([filename], exclusive=False):
+                signature = self._storage.signature(filename)
+                if cached is not None and cached.signature == signature:
+                    return cached.data
+                tail = self._read_tail(filename, cached, signature)
+                if tail is None:
+                    cached = self._cache[filename] = self._read(filename)
+                    self._indexes.pop(filename, None)
+
+            # Listeners may load other files, so they run without the storage lock
+            if tail is None:
+                self._notify(filename, cached.data, None, None)
+            else:
+                self._notify(filename, cached.data, *tail)
+            return cached.data
+
+    def _read_tail(self, filename, cached, signature):
+        """Apply changes another process appended to the cached copy.
+
+        Returns (changed, removed) keys, or None when the collection has to be
+        read again in full.
+        """
+        if cached is None:
+            return None
+        tail = self._storage.read_since(filename, cached.signature, signature, cached.position)
+        if tail is None:
+            return None
+        entries, position = tail
+        if any(change['op'] == 'replace' for changes in entries for change in changes):
+            return None
+
+        data, changed, removed = cached.data, set(), set()
+        for changes in entries:
+            for change in changes:
+                key = change['key']
+                if change['op'] == 'put':
+                    self._apply_put(filename, data, key, change['value'])
+                    changed.add(key)
+                    removed.discard(key)
+                else:
+                    self._apply_delete(filename, data, key)
+                    removed.add(key)
+                    changed.discard(key)
+
+        # Records were updated in place, so only the key index stays valid
+        keys = self._indexes.get(filename, {}).get('key')
+        self._indexes[filename] = {} if keys is None else {'key': keys}
+        cached.signature = signature
+        cached.position = position
+        cached.version = self._storage.version(filename)
+        return sorted(changed), sorted(removed)
+
+    def _apply_put(self, filename, data, key, value):
+        if filename == 'skills.json':
+            data.setdefault('user_skills', {})[key] = value
+            return
+        keys = self._key_index(filename, data)
+        record = keys.get(key)
+        if record is None:
+            data.append(value)
+            keys[key] = value
+        else:
+            # Keep the record's identity so other references see the change
+            record.clear()
+            record.update(value)
+
+    def _apply_delete(self, filename, data, key):
+        if filename == 'skills.json':
+            data.get('user_skills', {}).pop(key, None)
+            return
+        keys = self._key_index(filename, data)
+        record = keys.pop(key, None)
+        if record is None:
+            return
+        for i, other in enumerate(data):
+            if other is record:
+                del data[i]
+                break
+        # A later record with the same key becomes the first one
+        duplicate = next((r for r in data if record_key(filename, r) == key), None)
+        if duplicate is not None:
+            keys[key] = duplicate
+
+    def disk_version(self, filename):
+        """The storage save counter the cached copy of a collection reflects"""
+        with self._lock:
+            cached = self._cache.get(filename)
+            return None if cached is None else cached.version
+
+    def invalidate(self, filename):
+        """Drop the cached copy, e.g. after abandoning changes made to it"""
+        with self._lock:
+            if self._cache.pop(filename, None) is not None:
+                self._indexes.pop(filename, None)
+                self._notify(filename, None, None, None)
+
+    def save(self, data, filename, changed=None, removed=None):
+        """Persist a collection.
+
+        changed and removed optionally name the keys (see journal.KEY_FIELDS)
+        touched since the last save. In journal mode only those records are
+        written; without them the whole collection is.
+        """
+        self.save_many([(data, filename, changed, removed)])
+
+    def save_many(self, writes, versions=None, on_commit=None):
+        """Persist several collections as one step.
+
+        writes is a list of (data, filename, changed, removed) as for save().
+        All files are locked and checked before any is written: if one was
+        saved by another process since it was read, at the counter given in
+        versions or else the one of the cached copy, WriteConflict is raised
+        and nothing is written. Hinted saves of an object that is no longer
+        the cached copy conflict too, as their records were read from it.
+
+        on_commit is called after the writes while the files are still
+        locked, for side effects that must agree with them across processes.
+        """
+        versions = versions or {}
+        with self._lock:
+            with self._storage.locked([write[1] for write in writes], exclusive=True):
+                next_versions = {}
+                for data, filename, changed, removed in writes:
+                    cached = self._cache.get(filename)
+                    current = self._storage.version(filename)
+                    expected = versions.get(filename, cached.version if cached else current)
+                    hinted = changed is not None or removed is not None
+                    if current != expected or (hinted and cached is not None and cached.data is not data):
+                        raise WriteConflict(filename)
+                    next_versions[filename] = current + 1
+
+                for data, filename, changed, removed in writes:
+                    self._write(data, filename, changed, removed, next_versions[filename])
+                if on_commit is not None:
+                    on_commit()
+
+            for data, filename, changed, removed in writes:
+                self._notify(filename, data, changed, removed)
+
+    def _write(self, data, filename, changed, removed, version):
+        hinted = changed is not None or removed is not None
+        cached = self._cache.get(filename)
+        if not hinted or removed or cached is None or cached.data is not data:
+            self._indexes.pop(filename, None)
+        else:
+            # Records are mutated in place, so only the key index stays valid
+            keys = self._indexes.get(filename, {}).get('key')
+            self._indexes[filename] = {} if keys is None else {'key': keys}
+
+        if hinted:
+            # Resolving the changed records also adds new ones to the key index
+            changes = [self._put(data, filename, str(key)) for key in changed or []]
+            changes += [{'op': 'delete', 'key': str(key)} for key in removed or []]
+        else:
+            changes = [{'op': 'replace', 'value': data}]
+
+        position = self._storage.write(filename, data, changes, version)
+        self._cache[filename] = _Entry(self._storage.signature(filename), data, version, position)
+
+        if self._storage.background and self._compactor is None:
+            self._compactor = threading.Thread(
+                target=self._compact_loop, name='datastore-compactor', daemon=True
+            )
+            self._compactor.start()
+        if self._storage.needs_compaction(filename):
+            self._wake.set()
+
+    def subscribe(self, listener):
+        """Call listener(filename, data, changed, removed) after every save or reload.
+
+        changed and removed are the keys given to save(); both are None when
+        the whole collection was replaced or re-read from disk.
+        """
+        self._listeners.append(listener)
+
+    def version(self, filename):
+        """Counter that increases whenever a collection is saved or re-read.
+
+        Only stats the file, so it is cheap enough to check before serving
+        a cached response.
+        """
+        with self._lock:
+            if filename in self._cache or self._record_file(filename) is None:
+                self.load(filename)
+            return self._versions.get(filename, 0)
+
+    def stored_tag(self, filename):
+        """(save counter, storage signature) of the collection as stored.
+
+        Unlike version() it is the same in every process sharing the data
+        directory, and it never loads the collection.
+        """
+        with self._lock:
+            return self._storage.version(filename), self._storage.signature(filename)
+
+    def _notify(self, filename, data, changed, removed):
+        self._versions[filename] = self._versions.get(filename, 0) + 1
+        for listener in self._listeners:
+            listener(filename, data, changed, removed)
+
+    def _put(self, data, filename, key):
+        if filename == 'skills.json':
+            record = data.get('user_skills', {}).get(key)
+        else:
+            keys = self._key_index(filename, data)
+            record = keys.get(key)
+            if record is None:
+                # Newly appended records are not in the key index yet
+                record = next((r for r in reversed(data) if record_key(filename, r) == key), None)
+                if record is not None:
+                    keys[key] = record
+        if record is None:
+            return {'op': 'delete', 'key': key}
+        return {'op': 'put', 'key': key, 'value': record}
+
+    def _compact_loop(self):
+        while not self._closed:
+            self._wake.wait(self.fsync_interval)
+            self._wake.clear()
+            with self._lock:
+                if self.fsync == 'interval':
+                    self._storage.sync()
+                filenames = [f for f in self._cache if self._storage.needs_compaction(f)]
+            for filename in filenames:
+                self.compact(filename)
+
+    def compact(self, filename):
+        """Fold a collection's journal into a fresh snapshot"""
+        with self._lock:
+            with self._storage.locked([filename], exclusive=True):
+                self._storage.compact(filename)
+                cached = self._cache.get(filename)
+                if cached is not None and cached.version == self._storage.version(filename):
+                    # Same contents, new files: spare the next load a full re-read
+                    cached.signature = self._storage.signature(filename)
+                    cached.position = 0
+
+    def io_totals(self):
+        """(bytes read, bytes written) per collection since the store was opened"""
+        with self._lock:
+            return dict(self._storage.bytes_read), dict(self._storage.bytes_written)
+
+    def close(self):
+        """Stop the compactor and close the storage"""
+        self._closed = True
+        self._wake.set()
+        if self._compactor is not None:
+            self._compactor.join()
+            self._compactor = None
+        with self._lock:
+            for _, records in self._record_files.values():
+                records.close()
+            self._record_files.clear()
+            self._storage.close()
+
+    def _key_index(self, filename, data):
+        indexes = self._indexes.setdefault(filename, {})
+        if 'key' not in indexes:
+            indexes['key'] = _first_by(data, lambda r: record_key(filename, r))
+        return indexes['key']
+
+    def index(self, filename, name):
+        with self._lock:
+            data = self.load(filename)
+            if name == 'key':
+                return self._key_index(filename, data)
+            indexes = self._indexes.setdefault(filename, {})
+            if name not in indexes:
+                indexes[name] = INDEX_BUILDERS[(filename, name)](data)
+            return indexes[name]
+
+    # Point lookups
+
+    def user(self, user_id):
+        return self.index('users.json', 'key').get(str(user_id))
+
+    def user_by_email(self, email):
+        with self._lock:
+            found = self.find('users.json', 'email', email)
+            if found is not None:
+                return found[0] if found else None
+            return self.index('users.json', 'email').get(email)
+
+    def profiles(self, user_id):
+        """All profile records stored for a user, in file order"""
+        return self.index('profile.json', 'user_id').get(str(user_id), [])
+
+    def profile(self, user_id):
+        return self.index('profile.json', 'key').get(str(user_id))
+
+    def connection(self, connection_id):
+        return self.index('connections.json', 'key').get(str(connection_id))
+
+    def upload(self, name):
+        return self.index('uploads.json', 'key').get(name)
+
+    def user_skills(self, user_id):
+        return self.load('skills.json').get('user_skills', {}).get(str(user_id), [])
+
+    def record(self, filename, key, default=None):
+        """Look up one record by key (journal.KEY_FIELDS; the user id for skills.json).
+
+        When the collection is not cached and its record file is current, or
+        the storage can read single records (SQLite), only that record is
+        read and decoded, and the result is a copy: treat it as read-only
+        and load() the collection to change it.
+        """
+        key = str(key)
+        with self._lock:
+            if filename not in self._cache:
+                records = self._record_file(filename)
+                if records is not None:
+                    return records.get(key, default)
+                read = self._storage.read_record(filename, key)
+                if read is not None:
+                    return read[1] if read[0] else default
+            if filename == 'skills.json':
+                return self.load(filename).get('user_skills', {}).get(key, default)
+            return self.index(filename, 'key').get(key, default)
+
+    def find(self, filename, field, value):
+        """Records whose field equals value, in file order, read from storage.
+
+        Only answered while the collection is not cached and the storage has
+        the field indexed (SQLite: users.email and connection endpoints);
+        otherwise None, and the caller uses the cached collection. Results
+        are copies: treat them as read-only.
+        """
+        with self._lock:
+            if filename in self._cache:
+                return None
+            return self._storage.find_records(filename, field, value)
+
+    # Record files
+
+    def _source(self, signature):
+        # As stored in the record file's JSON header
+        return json.loads(json.dumps({'mode': self.mode, 'signature': signature}))
+
+    def _record_file(self, filename):
+        """The collection's RecordFile if there is one matching the stored collection"""
+        path = records_path(self.data_dir, filename)
+        try:
+            st = os.stat(path)
+            stat = (st.st_ino, st.st_mtime_ns, st.st_size)
+        except OSError:
+            stat = None
+        opened = self._record_files.get(filename)
+        if opened is None or opened[0] != stat:
+            if opened is not None:
+                opened[1].close()
+                # The new file may hold other data than the one answered from so far
+                self._versions[filename] = self._versions.get(filename, 0) + 1
+            self._record_files.pop(filename, None)
+            if stat is None:
+                return None
+            try:
+                opened = self._record_files[filename] = (stat, RecordFile(path))
+            except (OSError, ValueError):
+                return None
+        records = opened[1]
+        if records.source != self._source(self._storage.signature(filename)):
+            return None
+        return records
+
+    def write_records(self, filename):
+        """Write <file>.records from the collection as stored now; returns the record count.
+
+        The file stays in use until the collection is next saved (by any
+        process) and is ignored from then on, until it is written again.
+        """
+        with self._lock:
+            with self._storage.locked([filename], exclusive=False):
+                data = self.load(filename)
+                source = self._source(self._cache[filename].signature)
+                return write_records(records_path(self.data_dir, filename), filename, data, source)
@@ -0,0 +1,179 @@
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+log = logging.getLogger(__name__)
+
+# Seconds between keep-alive comments on an idle stream
+HEARTBEAT_SECONDS = 25
+
+# Undelivered events kept per subscriber; older ones are dropped first
+SUBSCRIBER_BACKLOG = 100
+
+# Seconds between checks for connections saved by other processes
+POLL_SECONDS = 2
+
+
+class Subscription:
+    """One open event stream. Holds only a small deque and an Event while idle."""
+
+    def __init__(self, hub, user_id):
+        self.hub = hub
+        self.user_id = user_id
+        self._messages = deque(maxlen=SUBSCRIBER_BACKLOG)
+        self._ready = threading.Event()
+
+    def push(self, message):
+        self._messages.append(message)
+        self._ready.set()
+
+    def get(self, timeout=HEARTBEAT_SECONDS):
+        """Wait for events; returns [] if none arrived within timeout"""
+        self._ready.wait(timeout)
+        self._ready.clear()
+        messages = []
+        while self._messages:
+            messages.append(self._messages.popleft())
+        return messages
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.hub.unsubscribe(self)
+
+
+class EventHub:
+    """In-process fan-out of per-user events to open Server-Sent Event streams.
+
+    Publishing takes the lock only long enough to copy the user's subscriber
+    set, so cost is proportional to that user's open streams, not to the
+    number of idle subscribers.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}  # user id -> set of Subscription
+
+    def subscribe(self, user_id):
+        subscription = Subscription(self, str(user_id))
+        with self._lock:
+            self._subscribers.setdefault(subscription.user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def subscribed(self, user_id):
+        with self._lock:
+            return str(user_id) in self._subscribers
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def publish(self, user_id, event, data):
+        with self._lock:
+            subscribers = list(self._subscribers.get(str(user_id), ()))
+        for subscription in subscribers:
+            subscription.push((event, data))
+
+
+def format_sse(event, data):
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+class ConnectionWatcher:
+    """Turns connection changes into events for this process's subscribers.
+
+    For every user with an open stream here it remembers the pending count
+    and the ids of pending requests sent to them, and check() publishes the
+    differences: a 'pending_count' event when the count changed and a
+    'connection_request' event per new request. Saves made in this process
+    are checked right away through notify_connection_change(). A thread
+    started by start() polls the connections' version every `interval`
+    seconds while anyone is subscribed, which re-reads the collection after
+    another worker process saved it, so their changes reach these streams
+    too, at most `interval` seconds late.
+    """
+
+    def __init__(self, hub, graph, store, interval=POLL_SECONDS):
+        self.hub = hub
+        self.graph = graph
+        self.store = store
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._seen = {}  # user id -> (pending count, ids of pending requests to them)
+        self._version = None
+        self._thread = None
+
+    def start(self):
+        if self._thread is None and self.interval:
+            self._thread = threading.Thread(target=self._loop, name='connection-watcher', daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            if not self.hub.subscriber_count():
+                continue
+            try:
+                version = self.store.version('connections.json')
+                if version != self._version:
+                    self._version = version
+                    self.check()
+            except Exception:
+                log.exception('Error checking connections for events')
+
+    def _state(self, user_id):
+        """((pending count, request ids), pending requests to the user)"""
+        requests = self.graph.requests_to(user_id)
+        return (self.graph.pending_count(user_id), frozenset(str(c['id']) for c in requests)), requests
+
+    def track(self, user_id):
+        """Start following a user whose stream opened; returns their pending count"""
+        user_id = str(user_id)
+        with self._lock:
+            if user_id not in self._seen:
+                self._seen[user_id] = self._state(user_id)[0]
+            return self._seen[user_id][0]
+
+    def check(self, user_ids=None):
+        """Publish what changed for the given users, or for everyone followed"""
+        with self._lock:
+            if user_ids is None:
+                user_ids = list(self._seen)
+            for user_id in map(str, user_ids):
+                if user_id not in self._seen:
+                    continue
+                if not self.hub.subscribed(user_id):
+                    del self._seen[user_id]
+                    continue
+                count, seen_requests = self._seen[user_id]
+                self._seen[user_id], requests = self._state(user_id)
+                if self._seen[user_id][0] != count:
+                    self.hub.publish(user_id, 'pending_count', {'count': self._seen[user_id][0]})
+                for connection in requests:
+                    if str(connection['id']) not in seen_requests:
+                        self._publish_request(user_id, connection)
+
+    def _publish_request(self, user_id, connection):
+        sender = self.store.user(connection['user_id'])
+        self.hub.publish(user_id, 'connection_request', {
+            'id': connection['id'],
+            'user_id': connection['user_id'],
+            'username': sender['fullname'] if sender else '',
+            'created_at': connection['created_at']
+        })
+
+
+def notify_connection_change(watcher, connection):
+    """Push fresh pending counts, and any new request, to both users of a connection"""
+    watcher.check((connection['user_id'], connection['connected_user_id']))
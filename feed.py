@@ -0,0 +1,174 @@
+import heapq
+from bisect import bisect_left, insort
+
+PAGE_SIZE = 20
+
+
+def _years(skill):
+    try:
+        return float(skill.get('years_of_experience') or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class DashboardFeed:
+    """Ranked 'Discover Skills' cards for the dashboard, kept current from DataStore saves.
+
+    Every skill of every user with a profile is held once in a list sorted by
+    (-years_of_experience, user order, skill position), plus one such list per
+    skill name. A viewer's feed merges the lists for their interests first,
+    then takes the remaining skills from the global list. Interests are only
+    applied when reading, a change to one user's skills re-inserts just that
+    user's entries, and a page resumes from its cursor by bisection.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._entries = None       # sorted (-years, user seq, position, user id, skill name)
+        self._by_name = None       # skill name -> sorted entries
+        self._user_entries = None  # user id -> that user's entries
+        self._user_seq = None      # user id -> order of first appearance
+        store.subscribe(self._on_save)
+
+    def _on_save(self, filename, data, changed, removed):
+        if filename not in ('users.json', 'profile.json', 'skills.json'):
+            return
+        with self.store.lock:
+            if self._entries is None:
+                return
+            if changed is None and removed is None:
+                self._entries = None
+                return
+            for user_id in map(str, list(changed or []) + list(removed or [])):
+                # Profile edits only matter when they create the user's first profile
+                if filename != 'profile.json' or user_id not in self._user_entries:
+                    self._index_user(user_id)
+
+    def _build(self):
+        self._entries, self._by_name = [], {}
+        self._user_entries, self._user_seq = {}, {}
+        entries = []
+        for profile in self.store.load('profile.json'):
+            user_id = str(profile['user_id'])
+            if user_id not in self._user_seq:
+                self._user_seq[user_id] = len(self._user_seq)
+                entries.extend(self._make_entries(user_id))
+
+        entries.sort()
+        self._entries = entries
+        for entry in entries:
+            self._by_name.setdefault(entry[4], []).append(entry)
+            self._user_entries.setdefault(entry[3], []).append(entry)
+
+    def _make_entries(self, user_id):
+        if self.store.user(user_id) is None or self.store.profile(user_id) is None:
+            return []
+        seq = self._user_seq.setdefault(user_id, len(self._user_seq))
+        return [(-_years(skill), seq, position, user_id, skill['skill_name'])
+                for position, skill in enumerate(self.store.user_skills(user_id))]
+
+    def _index_user(self, user_id):
+        for entry in self._user_entries.pop(user_id, []):
+            self._discard(self._entries, entry)
+            self._discard(self._by_name[entry[4]], entry)
+            if not self._by_name[entry[4]]:
+                del self._by_name[entry[4]]
+
+        entries = self._make_entries(user_id)
+        for entry in entries:
+            insort(self._entries, entry)
+            insort(self._by_name.setdefault(entry[4], []), entry)
+        if entries:
+            self._user_entries[user_id] = entries
+
+    @staticmethod
+    def _discard(entries, entry):
+        i = bisect_left(entries, entry)
+        if i < len(entries) and entries[i] == entry:
+            del entries[i]
+
+    def _stream(self, user_id, interests, cursor):
+        """Yield (matches_interest, entry) in feed order, starting after cursor"""
+        phase, after = cursor if cursor else ('m', None)
+        interests = set(interests)
+
+        def tail(entries):
+            start = bisect_left(entries, after) if after else 0
+            return (entries[i] for i in range(start, len(entries)))
+
+        if phase == 'm':
+            lists = [tail(self._by_name[name]) for name in interests if name in self._by_name]
+            for entry in heapq.merge(*lists):
+                if entry[3] != user_id:
+                    yield True, entry
+            after = None
+
+        for entry in tail(self._entries):
+            if entry[3] != user_id and entry[4] not in interests:
+                yield False, entry
+
+    def _card(self, matches_interest, entry):
+        user_id, position = entry[3], entry[2]
+        skill = self.store.user_skills(user_id)[position]
+        profile = self.store.profile(user_id)
+        return {
+            'user_id': user_id,
+            'user_name': self.store.user(user_id)['fullname'],
+            'profile_picture': profile.get('profile_picture', 'default-avatar.png'),
+            'skill_name': skill['skill_name'],
+            'qualification': skill['qualification'],
+            'years_of_experience': skill['years_of_experience'],
+            'description': skill['description'],
+            'matches_interest': matches_interest
+        }
+
+    def page(self, user_id, interests, cursor=None, limit=PAGE_SIZE):
+        """Return (cards, next cursor or None) for one page of a user's feed"""
+        with self.store.lock:
+            if self._entries is None:
+                self._build()
+            cards, last = [], None
+            for matches_interest, entry in self._stream(str(user_id), interests, decode_cursor(cursor)):
+                if len(cards) == limit:
+                    return cards, encode_cursor(last)
+                cards.append(self._card(matches_interest, entry))
+                last = ('m' if matches_interest else 'o', entry)
+            return cards, None
+
+    def featured(self, user_id, interests, k=4):
+        """The k best-ranked other users, each with their first three skill names"""
+        with self.store.lock:
+            if self._entries is None:
+                self._build()
+            featured = {}
+            for _, entry in self._stream(str(user_id), interests, None):
+                other_id = entry[3]
+                if other_id not in featured:
+                    profile = self.store.profile(other_id)
+                    featured[other_id] = {
+                        'id': other_id,
+                        'name': self.store.user(other_id)['fullname'],
+                        'profile_picture': profile.get('profile_picture', 'default-avatar.png'),
+                        'skills': [skill['skill_name'] for skill in self.store.user_skills(other_id)[:3]]
+                    }
+                    if len(featured) == k:
+                        break
+            return list(featured.values())
+
+
+def encode_cursor(last):
+    phase, entry = last
+    neg_years, seq, position = entry[:3]
+    return f'{phase}:{neg_years}:{seq}:{position}'
+
+
+def decode_cursor(cursor):
+    """Parse a cursor into (phase, sort key to resume after); None if invalid"""
+    try:
+        phase, neg_years, seq, position = cursor.split(':')
+        if phase not in ('m', 'o'):
+            return None
+        # Entries sharing (years, seq) but with a later position sort at or above this key
+        return phase, (float(neg_years), int(seq), int(position) + 1)
+    except (AttributeError, ValueError):
+        return None
@@ -0,0 +1,165 @@
+import json
+import os
+
+# Field that identifies a record in each list-shaped collection. skills.json
+# is a mapping, so its changes are keyed by the user id under 'user_skills'.
+KEY_FIELDS = {
+    'users.json': 'id',
+    'profile.json': 'user_id',
+    'connections.json': 'id',
+    'user_interests.json': 'user_id',
+    'user_skills.json': 'user_id',
+    'uploads.json': 'name',
+}
+
+
+def record_key(filename, record):
+    return str(record[KEY_FIELDS[filename]])
+
+
+def atomic_write(path, text):
+    """Write text to path via a temp file, fsync and rename"""
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def apply_changes(filename, data, changes):
+    """Apply journal change records to a collection and return it.
+
+    'put' replaces the first record with the given key, or appends it,
+    'delete' removes it and 'replace' swaps in a whole new collection.
+    Replaying the same changes twice gives the same result.
+    """
+    positions = None
+    for change in changes:
+        if change['op'] == 'replace':
+            data = change['value']
+            positions = None
+            continue
+
+        if filename == 'skills.json':
+            user_skills = data.setdefault('user_skills', {})
+            if change['op'] == 'put':
+                user_skills[change['key']] = change['value']
+            else:
+                user_skills.pop(change['key'], None)
+            continue
+
+        if positions is None:
+            positions = {}
+            for i, record in enumerate(data):
+                positions.setdefault(record_key(filename, record), i)
+
+        position = positions.get(change['key'])
+        if change['op'] == 'put':
+            if position is None:
+                positions[change['key']] = len(data)
+                data.append(change['value'])
+            else:
+                data[position] = change['value']
+        elif position is not None:
+            del data[position]
+            positions = None
+    return data
+
+
+class Journal:
+    """Append-only log of change records that follow a collection's snapshot.
+
+    Each save appends one JSON line holding all of its changes. While the
+    compactor writes a new snapshot the log is moved aside to a
+    '.compacting' file, which is replayed too until the snapshot is in place.
+    The file is opened per append so that every process follows a rotation.
+    """
+
+    def __init__(self, snapshot_path):
+        self.path = f'{snapshot_path}.journal'
+        self.rotated_path = f'{self.path}.compacting'
+        self.unsynced = False
+
+    @staticmethod
+    def _stat(path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def signature(self):
+        return (self._stat(self.rotated_path), self._stat(self.path))
+
+    def size(self):
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    @staticmethod
+    def _parse(text):
+        """Return (change lists, bytes consumed) for the complete lines in text"""
+        entries, consumed = [], 0
+        for line in text.splitlines(keepends=True):
+            if not line.endswith('\n'):
+                # A crash or a concurrent append can leave a partial last line
+                break
+            try:
+                entries.append(json.loads(line)['changes'])
+            except ValueError:
+                break
+            consumed += len(line.encode())
+        return entries, consumed
+
+    def read_rotated(self):
+        try:
+            with open(self.rotated_path, 'r') as f:
+                return self._parse(f.read())[0]
+        except OSError:
+            return []
+
+    def read(self, offset=0):
+        """Return (change lists, new offset) for the log from byte offset on"""
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                entries, consumed = self._parse(f.read().decode())
+        except OSError:
+            return [], 0
+        return entries, offset + consumed
+
+    def append(self, changes, fsync=True):
+        with open(self.path, 'a') as f:
+            f.write(json.dumps({'changes': changes}) + '\n')
+            f.flush()
+            if fsync:
+                os.fsync(f.fileno())
+            else:
+                self.unsynced = True
+
+    def sync(self):
+        if self.unsynced and os.path.exists(self.path):
+            with open(self.path, 'a') as f:
+                os.fsync(f.fileno())
+        self.unsynced = False
+
+    def rotate(self):
+        """Move the current log aside so a snapshot can absorb it"""
+        self.sync()
+        if not os.path.exists(self.path):
+            return
+        if os.path.exists(self.rotated_path):
+            # An earlier compaction did not finish; keep its records in front
+            with open(self.path, 'r') as src, open(self.rotated_path, 'a') as dst:
+                dst.write(src.read())
+                dst.flush()
+                os.fsync(dst.fileno())
+            os.remove(self.path)
+        else:
+            os.replace(self.path, self.rotated_path)
+
+    def drop_rotated(self):
+        if os.path.exists(self.rotated_path):
+            os.remove(self.rotated_path)
@@ -0,0 +1,113 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+
+LOG_FORMATS = ('json', 'text')
+
+# Attributes every LogRecord has; anything else came in through extra={...}
+_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message and any extra fields"""
+
+    def format(self, record):
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines with the extra fields appended as key=value"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    def formatMessage(self, record):
+        # Runs before the traceback is appended, keeping the fields on the first line
+        line = super().formatMessage(record)
+        extra = ' '.join(f'{key}={value}' for key, value in vars(record).items()
+                         if key not in _RECORD_FIELDS and not key.startswith('_'))
+        return f'{line} {extra}' if extra else line
+
+
+class SamplingFilter(logging.Filter):
+    """Pass 1 in `rate` DEBUG records of each call site; other levels always pass.
+
+    Kept records carry sampled=rate so readers can scale counts back up.
+    """
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = max(1, rate)
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.rate == 1:
+            return True
+        key = (record.pathname, record.lineno)
+        with self._lock:
+            count = self._counts.get(key, 0)
+            self._counts[key] = count + 1
+        if count % self.rate:
+            return False
+        record.sampled = self.rate
+        return True
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    # QueueHandler.prepare() formats the message in the calling thread;
+    # leave that to the listener and only render tracebacks, which cannot
+    # wait for the stack to unwind
+    def prepare(self, record):
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def configure_logging(level='INFO', fmt='json', debug_sample_rate=100, stream=None):
+    """Route every logger through a queue to one background writer thread.
+
+    Request threads only filter and enqueue records; formatting and writing
+    to `stream` (stderr by default) happen on the listener thread. Returns
+    the QueueListener, which is stopped at exit so queued records are written.
+    """
+    if fmt not in LOG_FORMATS:
+        raise ValueError(f'Unknown log format: {fmt}')
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter() if fmt == 'json' else TextFormatter())
+
+    handler = _DeferredQueueHandler(queue.SimpleQueue())
+    handler.addFilter(SamplingFilter(debug_sample_rate))
+    listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=True)
+
+    root = logging.getLogger()
+    for old in list(root.handlers):
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+
+    listener.start()
+
+    def stop():
+        # The caller may have stopped it already
+        if listener._thread is not None:
+            listener.stop()
+    atexit.register(stop)
+    return listener
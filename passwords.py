@@ -0,0 +1,111 @@
+import base64
+import hashlib
+import hmac
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+SCHEMES = ('pbkdf2', 'scrypt')
+
+# Work factor when none is configured: PBKDF2-SHA256 iterations (the OWASP
+# recommendation) or the scrypt N parameter, with r=8 and p=1
+DEFAULT_COST = {'pbkdf2': 600000, 'scrypt': 2 ** 14}
+SCRYPT_R = 8
+SCRYPT_P = 1
+
+# Hashes written before salted KDFs: sha256(password + LEGACY_SALT) in hex
+LEGACY_SALT = 'skillswap_salt'
+
+
+class HasherBusy(Exception):
+    """Too many password hashes are already waiting for the pool"""
+
+
+def _encode(raw):
+    return base64.b64encode(raw).decode()
+
+
+def _derive(scheme, cost, salt, password):
+    if scheme == 'pbkdf2':
+        return hashlib.pbkdf2_hmac('sha256', password.encode(), salt, cost)
+    # scrypt needs 128 * N * r bytes; leave headroom over the 32 MB default cap
+    return hashlib.scrypt(password.encode(), salt=salt, n=cost, r=SCRYPT_R, p=SCRYPT_P,
+                          maxmem=256 * cost * SCRYPT_R)
+
+
+def parse_hash(stored):
+    """Return (scheme, cost, salt, digest) for a stored hash; scheme 'sha256' for legacy ones"""
+    parts = stored.split('$')
+    if len(parts) == 1:
+        return 'sha256', 0, LEGACY_SALT.encode(), stored
+    scheme, cost, salt, digest = parts
+    return scheme, int(cost), base64.b64decode(salt), digest
+
+
+class PasswordHasher:
+    """Salted PBKDF2 or scrypt password hashing on a bounded thread pool.
+
+    Hashes are stored as '<scheme>$<cost>$<salt>$<digest>' (base64 salt and
+    digest), so the scheme and cost can change without invalidating old
+    hashes; needs_upgrade() tells when a hash should be redone. At most
+    `workers` hashes run at once and at most `max_pending` may wait, beyond
+    which hash() and verify() raise HasherBusy instead of tying up more
+    request threads.
+    """
+
+    def __init__(self, scheme='pbkdf2', cost=None, workers=2, max_pending=64):
+        if scheme not in SCHEMES:
+            raise ValueError(f'Unknown password hashing scheme: {scheme}')
+        self.scheme = scheme
+        self.cost = cost or DEFAULT_COST[scheme]
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hasher')
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy()
+        try:
+            future = self._pool.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result()
+
+    def _hash(self, password):
+        salt = os.urandom(16)
+        digest = _derive(self.scheme, self.cost, salt, password)
+        return f'{self.scheme}${self.cost}${_encode(salt)}${_encode(digest)}'
+
+    def hash(self, password):
+        return self._run(self._hash, password)
+
+    @staticmethod
+    def _verify(stored, password):
+        try:
+            scheme, cost, salt, digest = parse_hash(stored)
+        except ValueError:
+            return False
+        if scheme == 'sha256':
+            expected = hashlib.sha256((password + LEGACY_SALT).encode()).hexdigest()
+            return hmac.compare_digest(expected, digest)
+        if scheme not in SCHEMES:
+            return False
+        return hmac.compare_digest(_encode(_derive(scheme, cost, salt, password)), digest)
+
+    def verify(self, stored, password):
+        """Check a password against a stored hash of any known scheme"""
+        if not stored or password is None:
+            return False
+        return self._run(self._verify, stored, password)
+
+    def needs_upgrade(self, stored):
+        """True if the hash is legacy SHA-256 or uses another scheme or cost than configured"""
+        try:
+            scheme, cost, _, _ = parse_hash(stored)
+        except ValueError:
+            return True
+        return (scheme, cost) != (self.scheme, self.cost)
+
+    def close(self):
+        self._pool.shutdown()
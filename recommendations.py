@@ -0,0 +1,285 @@
+import heapq
+import logging
+import math
+import threading
+import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+log = logging.getLogger(__name__)
+
+SOURCES = ('users.json', 'profile.json', 'skills.json')
+
+# Profiles read per store lock acquisition while collecting features
+FEATURE_CHUNK = 1000
+
+# Similarity rows computed per block, so a block of scores against every
+# user stays around 16 MB of float32, as do the rarer terms' products
+BLOCK_CELLS = 4 * 1024 * 1024
+
+# Most common terms, multiplied as dense columns; rarer ones go through
+# their postings
+DENSE_COLUMNS = 256
+
+
+def user_features(store):
+    """Return (user ids, term lists) for every user with a profile.
+
+    A user's terms are their skill names and their interests, casefolded
+    and kept apart as ('skill', name) and ('interest', name), i.e. the
+    columns of a user x skill and a user x interest matrix side by side.
+    The store lock is taken per FEATURE_CHUNK profiles, so requests are
+    not held up for the whole scan.
+    """
+    with store.lock:
+        # The profiles as of now; later additions wait for the next refresh
+        profiles = list(store.load('profile.json'))
+    ids, rows, seen = [], [], set()
+    for start in range(0, len(profiles), FEATURE_CHUNK):
+        with store.lock:
+            for profile in profiles[start:start + FEATURE_CHUNK]:
+                user_id = str(profile['user_id'])
+                if user_id in seen or store.user(user_id) is None:
+                    continue
+                seen.add(user_id)
+                terms = {('skill', str(skill.get('skill_name', '')).strip().casefold())
+                         for skill in store.user_skills(user_id)}
+                terms |= {('interest', str(interest).strip().casefold())
+                          for interest in profile.get('interests') or ()}
+                ids.append(user_id)
+                rows.append([term for term in terms if term[1]])
+    return ids, rows
+
+
+def weigh(rows):
+    """CSR arrays (indptr, indices, data) and column count for the term rows.
+
+    Terms are weighted by smoothed inverse document frequency and each row
+    is scaled to unit length, so a dot product of two rows is their cosine
+    similarity. Terms only one user has cannot make two users similar: they
+    count towards the row's length but get no column.
+    """
+    frequency = {}
+    for terms in rows:
+        for term in terms:
+            frequency[term] = frequency.get(term, 0) + 1
+    idf = {term: math.log((1 + len(rows)) / (1 + count)) + 1 for term, count in frequency.items()}
+    columns = {}
+    for term in sorted(term for term, count in frequency.items() if count > 1):
+        columns[term] = len(columns)
+
+    indptr, indices, data = [0], [], []
+    for terms in rows:
+        norm = math.sqrt(sum(idf[term] ** 2 for term in terms)) or 1.0
+        for term in sorted(terms):
+            if term in columns:
+                indices.append(columns[term])
+                data.append(idf[term] / norm)
+        indptr.append(len(indices))
+    return indptr, indices, data, len(columns)
+
+
+def top_k_python(indptr, indices, data, k):
+    """[(row, score)] of the k most similar other rows for each row, best first"""
+    postings = {}
+    for row in range(len(indptr) - 1):
+        for i in range(indptr[row], indptr[row + 1]):
+            postings.setdefault(indices[i], []).append((row, data[i]))
+    result = []
+    for row in range(len(indptr) - 1):
+        scores = {}
+        for i in range(indptr[row], indptr[row + 1]):
+            weight = data[i]
+            for other, other_weight in postings[indices[i]]:
+                scores[other] = scores.get(other, 0.0) + weight * other_weight
+        scores.pop(row, None)
+        result.append(heapq.nsmallest(k, ((other, score) for other, score in scores.items()),
+                                      key=lambda item: (-item[1], item[0])))
+    return result
+
+
+def top_k_numpy(indptr, indices, data, columns, k):
+    """Same as top_k_python, up to the order of equal scores, with NumPy.
+
+    The rows stay sparse. The DENSE_COLUMNS most common terms, which make
+    up most of the products, are multiplied as a dense rows x DENSE_COLUMNS
+    matrix; the long tail of rarer terms adds its products through the
+    term postings. Memory thus follows users x DENSE_COLUMNS and the block
+    size, not users x terms. Users with the same terms have the same row,
+    so scores are taken between distinct rows only and each row's best rows
+    are then handed out to the users behind them. Only users with at least
+    one shared term take part; the others have no neighbours.
+    """
+    users = len(indptr) - 1
+    result = [[] for _ in range(users)]
+
+    # Distinct non-empty rows and the users behind each
+    distinct, members = {}, []
+    for row in range(users):
+        start, stop = indptr[row], indptr[row + 1]
+        if start == stop:
+            continue
+        group = distinct.setdefault((tuple(indices[start:stop]), tuple(data[start:stop])), len(members))
+        if group == len(members):
+            members.append([])
+        members[group].append(row)
+    if sum(map(len, members)) < 2:
+        return result
+
+    rows = len(members)
+    lengths = numpy.array([len(key[0]) for key in distinct], dtype=numpy.intp)
+    row_of = numpy.repeat(numpy.arange(rows), lengths)
+    row_cols = numpy.fromiter((c for key in distinct for c in key[0]), dtype=numpy.intp, count=len(row_of))
+    row_data = numpy.fromiter((w for key in distinct for w in key[1]), dtype=numpy.float32, count=len(row_of))
+
+    frequency = numpy.bincount(row_cols, minlength=columns)
+    dense_columns = numpy.argsort(-frequency, kind='stable')[:DENSE_COLUMNS]
+    dense_of = numpy.full(columns, -1, dtype=numpy.intp)
+    dense_of[dense_columns] = numpy.arange(len(dense_columns))
+    in_dense = dense_of[row_cols] >= 0
+    dense = numpy.zeros((rows, len(dense_columns)), dtype=numpy.float32)
+    dense[row_of[in_dense], dense_of[row_cols[in_dense]]] = row_data[in_dense]
+    transposed = numpy.ascontiguousarray(dense.T)
+
+    tail = _Postings(row_of[~in_dense], row_cols[~in_dense], row_data[~in_dense], rows, columns)
+
+    # A user's own row is among the best k + 1, with the users sharing it
+    count = min(k + 1, rows)
+    best = [None] * rows
+    start = 0
+    while start < rows:
+        stop = tail.block_end(start, min(rows, start + max(1, BLOCK_CELLS // rows)))
+        scores = dense[start:stop] @ transposed
+        tail.add_scores(scores, start, stop)
+        for offset, (top, top_scores) in enumerate(_best_columns(scores, count)):
+            best[start + offset] = [(members[g], score) for g, score in zip(top, top_scores) if score > 0]
+        start = stop
+
+    for g, group_rows in enumerate(members):
+        ranked = [(other, score) for others, score in best[g] for other in others[:k + 1]]
+        for row in group_rows:
+            result[row] = [(other, score) for other, score in ranked if other != row][:k]
+    return result
+
+
+class _Postings:
+    """Sparse nonzeros (row order) with their per-term postings, for the rarer terms"""
+
+    def __init__(self, row_of, cols, data, rows, columns):
+        self.row_of, self.cols, self.data = row_of, cols, data
+        self.row_ptr = numpy.searchsorted(row_of, numpy.arange(rows + 1))
+        order = numpy.argsort(cols, kind='stable')
+        self.col_rows, self.col_data = row_of[order], data[order]
+        self.col_ptr = numpy.searchsorted(cols[order], numpy.arange(columns + 1))
+        self.lengths = numpy.diff(self.col_ptr)
+        # Number of products the rows before each row take part in
+        self.products = numpy.concatenate(([0], numpy.cumsum(self.lengths[cols])))[self.row_ptr]
+
+    def block_end(self, start, stop):
+        """Lower stop so the rows' products stay within BLOCK_CELLS"""
+        limit = numpy.searchsorted(self.products, self.products[start] + BLOCK_CELLS, side='right') - 1
+        return max(start + 1, min(stop, int(limit)))
+
+    def add_scores(self, scores, start, stop):
+        first, last = self.row_ptr[start], self.row_ptr[stop]
+        if first == last:
+            return
+        cols = self.cols[first:last]
+        lengths = self.lengths[cols]
+        ends = numpy.cumsum(lengths)
+        # Index into the postings of each product's other row
+        gather = numpy.arange(ends[-1]) - numpy.repeat(ends - lengths - self.col_ptr[cols], lengths)
+        rows = scores.shape[1]
+        cells = numpy.repeat((self.row_of[first:last] - start) * rows, lengths) + self.col_rows[gather]
+        weights = numpy.repeat(self.data[first:last], lengths) * self.col_data[gather]
+        scores += numpy.bincount(cells, weights=weights, minlength=scores.size).reshape(scores.shape)
+
+
+def _best_columns(scores, count):
+    """Yield (column indices, scores) of the count highest scores in each row, best first"""
+    # The count-th highest of the per-chunk maxima is at most the row's
+    # count-th highest score, and only the few scores above it need sorting
+    chunks = min(scores.shape[1], max(256, count))
+    width = scores.shape[1] // chunks
+    maxima = scores[:, :chunks * width].reshape(len(scores), chunks, width).max(axis=2)
+    bound = numpy.partition(maxima, -count, axis=1)[:, -count]
+    rows, cols = numpy.nonzero(scores >= bound[:, None])
+    values = scores[rows, cols]
+    order = numpy.lexsort((cols, -values, rows))
+    rows, cols, values = rows[order], cols[order], values[order]
+    starts = numpy.searchsorted(rows, numpy.arange(len(scores) + 1))
+    for row in range(len(scores)):
+        stop = min(starts[row] + count, starts[row + 1])
+        yield cols[starts[row]:stop].tolist(), values[starts[row]:stop].tolist()
+
+
+class Recommender:
+    """Top-k most similar users by cosine similarity of skills and interests.
+
+    Every user's neighbours are computed together in the background, with
+    NumPy when it is installed, and served from a dict afterwards. The
+    computation reruns every `interval` seconds (0 for only once) if
+    skills.json, profile.json or users.json were saved or re-read since the
+    last one; until the first run finishes neighbours() returns None.
+    """
+
+    def __init__(self, store, k=20, interval=900, use_numpy=None):
+        self.store = store
+        self.k = k
+        self.interval = interval
+        self.use_numpy = numpy is not None if use_numpy is None else use_numpy
+        self._neighbours = None  # user id -> [(other user id, similarity)]
+        self._versions = None    # SOURCES versions the neighbours were computed from
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Compute now and then on schedule in a daemon thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name='recommender', daemon=True)
+            self._thread.start()
+
+    def _loop(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception:
+                log.exception('Error computing recommendations')
+            if not self.interval:
+                return
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def refresh(self, force=False):
+        """Recompute if the source collections changed; returns whether it did"""
+        versions = tuple(self.store.version(filename) for filename in SOURCES)
+        if versions == self._versions and not force:
+            return False
+        started = time.perf_counter()
+        ids, rows = user_features(self.store)
+        indptr, indices, data, columns = weigh(rows)
+        if self.use_numpy:
+            top = top_k_numpy(indptr, indices, data, columns, self.k)
+        else:
+            top = top_k_python(indptr, indices, data, self.k)
+        self._neighbours = {ids[row]: [(ids[other], score) for other, score in neighbours]
+                            for row, neighbours in enumerate(top) if neighbours}
+        self._versions = versions
+        log.info('Computed recommendations', extra={
+            'users': len(ids), 'columns': columns, 'numpy': self.use_numpy,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 1)})
+        return True
+
+    def wake(self):
+        """Check for changes now instead of at the end of the interval"""
+        self._wake.set()
+
+    def neighbours(self, user_id):
+        """[(other user id, similarity)] best first, or None if not computed yet"""
+        neighbours = self._neighbours
+        if neighbours is None:
+            return None
+        return neighbours.get(str(user_id), [])
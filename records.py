@@ -0,0 +1,158 @@
+import array
+import bisect
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+
+from journal import record_key
+
+# <file>.records layout, all integers little-endian:
+#   MAGIC, then PREAMBLE: offset of the first record, offset of the index,
+#   number of distinct keys; a JSON header (collection, source); the records,
+#   each a u32 length and the JSON of [key, record]; the index: a u64 hash of
+#   each distinct key in ascending order, then the u64 offsets of their
+#   records in the same order.
+MAGIC = b'SSREC\x00\x01\n'
+PREAMBLE = struct.Struct('<QQQ')
+LENGTH = struct.Struct('<I')
+
+
+def records_path(data_dir, filename):
+    return os.path.join(data_dir, f'{filename}.records')
+
+
+def key_hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little')
+
+
+def _u64_array(values):
+    values = array.array('Q', values)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+def _read_u64(data):
+    values = array.array('Q')
+    values.frombytes(data)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+def collection_items(filename, data):
+    """(key, record) pairs of a collection in file order; skills.json gives (user id, skill list)"""
+    if filename == 'skills.json':
+        return data.get('user_skills', {}).items()
+    return ((record_key(filename, record), record) for record in data)
+
+
+def write_records(path, filename, data, source):
+    """Write a collection as a record file; returns the number of records.
+
+    source identifies the stored collection the records were read from
+    (see DataStore.write_records); readers compare it before trusting the
+    file. Duplicate keys are all written, but only the first is indexed, as
+    in DataStore's key index. The file is replaced atomically.
+    """
+    header = json.dumps({'collection': filename, 'source': source}).encode()
+    start = len(MAGIC) + PREAMBLE.size + len(header)
+    entries, seen, written = [], set(), 0
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(b'\0' * start)
+        offset = start
+        for key, record in collection_items(filename, data):
+            payload = json.dumps([key, record], separators=(',', ':')).encode()
+            if key not in seen:
+                seen.add(key)
+                entries.append((key_hash(key), offset))
+            f.write(LENGTH.pack(len(payload)))
+            f.write(payload)
+            offset += LENGTH.size + len(payload)
+            written += 1
+        entries.sort()
+        f.write(_u64_array(digest for digest, _ in entries).tobytes())
+        f.write(_u64_array(offset for _, offset in entries).tobytes())
+        f.seek(0)
+        f.write(MAGIC + PREAMBLE.pack(start, offset, len(entries)) + header)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return written
+
+
+class RecordFile:
+    """Read-only view of a record file through mmap.
+
+    get() binary-searches the index and decodes just the one record, and
+    items() decodes one record at a time, so neither needs the collection
+    in memory; the OS pages in only the parts of the file that are read.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if self._map[:len(MAGIC)] != MAGIC:
+                raise ValueError(f'{path} is not a record file')
+            self._start, self._index, self._count = PREAMBLE.unpack_from(self._map, len(MAGIC))
+            header = json.loads(self._map[len(MAGIC) + PREAMBLE.size:self._start])
+        except Exception:
+            self._map.close()
+            raise
+        self.collection = header['collection']
+        self.source = header['source']
+        hashes_end = self._index + 8 * self._count
+        if sys.byteorder == 'little':
+            # Searched in place; bisect compares the mapped integers directly
+            self._view = memoryview(self._map)
+            self._hashes = self._view[self._index:hashes_end].cast('Q')
+            self._offsets = self._view[hashes_end:hashes_end + 8 * self._count].cast('Q')
+        else:
+            self._view = None
+            self._hashes = _read_u64(self._map[self._index:hashes_end])
+            self._offsets = _read_u64(self._map[hashes_end:hashes_end + 8 * self._count])
+
+    def __len__(self):
+        """Number of distinct keys"""
+        return self._count
+
+    def get(self, key, default=None):
+        key = str(key)
+        wanted = key_hash(key)
+        position = bisect.bisect_left(self._hashes, wanted)
+        # Keys sharing a hash are adjacent; the stored key tells them apart
+        while position < self._count and self._hashes[position] == wanted:
+            offset = self._offsets[position]
+            (length,) = LENGTH.unpack_from(self._map, offset)
+            stored_key, record = json.loads(self._map[offset + LENGTH.size:offset + LENGTH.size + length])
+            if stored_key == key:
+                return record
+            position += 1
+        return default
+
+    def items(self):
+        """Yield (key, record) for every record in file order, duplicates included"""
+        offset = self._start
+        while offset < self._index:
+            (length,) = LENGTH.unpack_from(self._map, offset)
+            yield tuple(json.loads(self._map[offset + LENGTH.size:offset + LENGTH.size + length]))
+            offset += LENGTH.size + length
+
+    def close(self):
+        # The mmap cannot close while views of it exist
+        if self._view is not None:
+            self._hashes.release()
+            self._offsets.release()
+            self._view.release()
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
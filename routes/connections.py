@@ -1,47 +1,33 @@
 from flask import Blueprint, jsonify, request, current_app
-import json
-import os
 from datetime import datetime
 from auth import login_required
+from events import notify_connection_change
 
 connections_bp = Blueprint('connections', __name__)
 
 def load_connections():
-    """Load connections from JSON file"""
-    connections_file = os.path.join(current_app.root_path, 'data', 'connections.json')
-    if os.path.exists(connections_file):
-        with open(connections_file, 'r') as f:
-            return json.load(f)
-    return []
-
-def save_connections(connections):
-    """Save connections to JSON file"""
-    connections_file = os.path.join(current_app.root_path, 'data', 'connections.json')
-    with open(connections_file, 'w') as f:
-        json.dump(connections, f, indent=4)
+    """Load connections from the app's data store"""
+    return current_app.extensions['datastore'].load('connections.json')
+
+def save_connections(connections, changed=None, removed=None):
+    """Save connections, naming the connection ids that changed"""
+    current_app.extensions['datastore'].save(connections, 'connections.json', changed=changed, removed=removed)
+
+def connection_graph():
+    return current_app.extensions['connection_graph']
+
+def notify(connection):
+    """Push the new pending counts to both users' event streams"""
+    notify_connection_change(current_app.extensions['connection_watcher'], connection)
 
 @connections_bp.route('/api/connections', methods=['GET'])
 @login_required
 def get_connections():
     """Get all connections for the current user"""
-    connections = load_connections()
     current_user_id = request.user.id
 
-    # Filter connections for current user
-    pending_connections = []
-    connected_users = []
-
-    for conn in connections:
-        if conn['user_id'] == current_user_id:
-            if conn['status'] == 'pending':
-                pending_connections.append(conn)
-            elif conn['status'] == 'connected':
-                connected_users.append(conn)
-        elif conn['connected_user_id'] == current_user_id:
-            if conn['status'] == 'pending':
-                pending_connections.append(conn)
-            elif conn['status'] == 'connected':
-                connected_users.append(conn)
+    # Look up the current user's connections in the graph
+    pending_connections, connected_users = connection_graph().for_user(current_user_id)
 
     return jsonify({
         'pending_connections': pending_connections,
@@ -56,7 +42,7 @@ def accept_connection(connection_id):
     current_user_id = request.user.id
 
     # Find the connection
-    connection = next((conn for conn in connections if conn['id'] == connection_id), None)
+    connection = current_app.extensions['datastore'].connection(connection_id)
     
     if not connection:
         return jsonify({'success': False, 'message': 'Connection not found'}), 404
@@ -70,7 +56,8 @@ def accept_connection(connection_id):
     connection['accepted_at'] = datetime.now().isoformat()
 
     # Save updated connections
-    save_connections(connections)
+    save_connections(connections, changed=[connection['id']])
+    notify(connection)
 
     return jsonify({'success': True, 'message': 'Connection accepted'})
 
@@ -82,7 +69,7 @@ def reject_connection(connection_id):
     current_user_id = request.user.id
 
     # Find the connection
-    connection = next((conn for conn in connections if conn['id'] == connection_id), None)
+    connection = current_app.extensions['datastore'].connection(connection_id)
     
     if not connection:
         return jsonify({'success': False, 'message': 'Connection not found'}), 404
@@ -92,8 +79,9 @@ def reject_connection(connection_id):
         return jsonify({'success': False, 'message': 'Unauthorized'}), 403
 
     # Remove the connection
-    connections = [conn for conn in connections if conn['id'] != connection_id]
-    save_connections(connections)
+    connections.remove(connection)
+    save_connections(connections, removed=[connection['id']])
+    notify(connection)
 
     return jsonify({'success': True, 'message': 'Connection rejected'})
 
@@ -111,19 +99,14 @@ def request_connection():
     current_user_id = request.user.id
 
     # Check if connection already exists
-    existing_connection = next(
-        (conn for conn in connections 
-         if (conn['user_id'] == current_user_id and conn['connected_user_id'] == target_user_id) or
-         (conn['user_id'] == target_user_id and conn['connected_user_id'] == current_user_id)),
-        None
-    )
+    existing_connection = connection_graph().between(current_user_id, target_user_id)
 
     if existing_connection:
         return jsonify({'success': False, 'message': 'Connection already exists'}), 400
 
     # Create new connection request
     new_connection = {
-        'id': str(len(connections) + 1),
+        'id': connection_graph().next_id(),
         'user_id': current_user_id,
         'connected_user_id': target_user_id,
         'status': 'pending',
@@ -131,6 +114,7 @@ def request_connection():
     }
 
     connections.append(new_connection)
-    save_connections(connections)
+    save_connections(connections, changed=[new_connection['id']])
+    notify(new_connection)
 
     return jsonify({'success': True, 'message': 'Connection request sent'}) 
\ No newline at end of file
@@ -0,0 +1,198 @@
+"""Time the data layer and the busiest routes on synthetic data sets.
+
+Usage: python scripts/bench_app.py [--users 1000 10000] [--repeat 30] [--mode json]
+                                   [--output bench_results.json] [--data-dir DIR]
+
+For each size a data set is written by generate_dataset.py into a temp
+directory (or DIR is used as is) and a fresh process imports the app on it,
+so every size starts cold. Timed, in milliseconds:
+- load_json: parsing each collection after it was dropped from the cache (cold)
+  and returning the cached copy (warm)
+- save_json: a hinted save of one profile, and a full save of user_interests.json
+- dashboard, api_search, get_connections: GET requests through the test client
+- request_connection: POST requests to users not yet connected
+- inject_profile: the template context processor on its own
+
+Results are written as JSON (meta with commit, mode and size; per benchmark
+count, min, median, p95, mean) so runs can be compared over time.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from generate_dataset import generate
+
+COLLECTIONS = ['users.json', 'profile.json', 'skills.json', 'connections.json', 'user_interests.json']
+SEARCH_QUERIES = ['python', 'an', 'woodworking', 'zzz']
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        'count': len(samples),
+        'min_ms': samples[0] * 1000,
+        'median_ms': statistics.median(samples) * 1000,
+        'p95_ms': samples[max(0, int(len(samples) * 0.95) - 1)] * 1000,
+        'mean_ms': statistics.fmean(samples) * 1000,
+    }
+
+
+def timed(fn, repeat, setup=None):
+    samples = []
+    for i in range(repeat):
+        if setup:
+            setup(i)
+        start = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def run_benchmarks(repeat):
+    """Import the app on SKILLSWAP_DATA_DIR and time everything; returns {name: summary}"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app as appmod
+    app, store = appmod.app, appmod.store
+    users = store.load('users.json')
+    hub = 1  # connection targets are skewed towards low ids
+    rng = random.Random(1)
+    results = {}
+
+    for filename in COLLECTIONS:
+        results[f'load_json[{filename}] cold'] = timed(
+            lambda _: appmod.load_json(filename), repeat, setup=lambda _: store.invalidate(filename))
+        results[f'load_json[{filename}] warm'] = timed(lambda _: appmod.load_json(filename), repeat)
+
+    profiles = appmod.load_json('profile.json')
+
+    def save_profile(i):
+        user_id = rng.randint(1, len(users))
+        store.profile(user_id)['updated_at'] = str(i)
+        appmod.save_json(profiles, 'profile.json', changed=[user_id])
+    results['save_json[profile.json] hinted'] = timed(save_profile, repeat)
+    interests = appmod.load_json('user_interests.json')
+    results['save_json[user_interests.json] full'] = timed(
+        lambda _: appmod.save_json(interests, 'user_interests.json'), repeat)
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = hub
+
+    def get(url):
+        def request(_):
+            response = client.get(url)
+            assert response.status_code == 200, (url, response.status_code)
+        return request
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        results['dashboard'] = timed(get('/dashboard'), repeat)
+        for query in SEARCH_QUERIES:
+            results[f'api_search[q={query}]'] = timed(get(f'/api/search?q={query}'), repeat)
+        results['get_connections'] = timed(get('/api/connections'), repeat)
+
+        targets = iter(rng.sample(range(2, len(users) + 1), min(repeat * 3, len(users) - 1)))
+
+        def request_connection(_):
+            for target in targets:
+                if not appmod.connection_graph.between(hub, target):
+                    break
+            response = client.post('/api/connections/request', json={'user_id': target})
+            assert response.status_code == 200, response.get_json()
+        results['request_connection'] = timed(request_connection, repeat)
+
+    def inject_profile(_):
+        with app.test_request_context():
+            appmod.session['user_id'] = hub
+            appmod.inject_profile()
+    results['inject_profile'] = timed(inject_profile, repeat)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_size(users, args):
+    """Generate a data set and run the benchmarks on it in a new process"""
+    data_dir = tempfile.mkdtemp(prefix=f'skillswap-bench-{users}-')
+    try:
+        generate(data_dir, users, seed=args.seed)
+        result_path = os.path.join(data_dir, 'result.json')
+        env = dict(os.environ, SKILLSWAP_DATA_DIR=data_dir, SKILLSWAP_STORAGE_MODE=args.mode)
+        if args.mode != 'json':
+            subprocess.run([sys.executable, os.path.join(ROOT, 'scripts', 'migrate_storage.py'),
+                            '--data-dir', data_dir, '--from', 'json', '--to', args.mode],
+                           check=True, stdout=subprocess.DEVNULL)
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--data-dir', data_dir,
+                        '--repeat', str(args.repeat), '--result', result_path],
+                       check=True, env=env, cwd=data_dir)
+        with open(result_path) as f:
+            return json.load(f)
+    finally:
+        shutil.rmtree(data_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--repeat', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--mode', default=os.environ.get('SKILLSWAP_STORAGE_MODE', 'json'))
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--data-dir', help='benchmark this existing data directory in-process')
+    parser.add_argument('--result', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.data_dir:
+        os.environ['SKILLSWAP_DATA_DIR'] = args.data_dir
+        results = run_benchmarks(args.repeat)
+        if args.result:
+            with open(args.result, 'w') as f:
+                json.dump(results, f)
+            return
+        runs = [{'data_dir': args.data_dir, 'results': results}]
+    else:
+        runs = [{'users': users, 'results': bench_size(users, args)} for users in args.users]
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'mode': os.environ.get('SKILLSWAP_STORAGE_MODE', 'json') if args.data_dir else args.mode,
+            'repeat': args.repeat,
+            'seed': args.seed,
+        },
+        'runs': runs,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    for run in runs:
+        print(f"\n{run.get('users', run.get('data_dir'))} users")
+        print(f"{'benchmark':>42} {'median ms':>10} {'p95 ms':>10}")
+        for name, summary in run['results'].items():
+            print(f"{name:>42} {summary['median_ms']:>10.3f} {summary['p95_ms']:>10.3f}")
+    print(f'\nWrote {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Benchmark gzip compression of API responses: bytes saved and CPU per request.
+
+Usage: python scripts/bench_compression.py [--users 2000] [--requests 50] [--levels 1 6 9]
+
+A synthetic data set from generate_dataset.py is written to a temp data
+directory and the app is driven through its test client. For each endpoint
+and level: response size, compression ratio, CPU time per request
+(time.process_time) and the extra CPU over an uncompressed response.
+"""
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from generate_dataset import generate
+
+ENDPOINTS = ['/api/search?q=python', '/api/search?q=an', '/api/connections', '/dashboard']
+
+
+def measure(client, url, encoding, requests):
+    headers = {'Accept-Encoding': encoding}
+    with contextlib.redirect_stdout(io.StringIO()):
+        response = client.get(url, headers=headers)
+        start = time.process_time()
+        for _ in range(requests):
+            client.get(url, headers=headers)
+        cpu = (time.process_time() - start) / requests
+    return len(response.data), cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--levels', type=int, nargs='+', default=[1, 6, 9])
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix='skillswap-bench-gzip-')
+    try:
+        generate(data_dir, args.users)
+        os.environ['SKILLSWAP_DATA_DIR'] = data_dir
+        with contextlib.redirect_stdout(io.StringIO()):
+            import app as appmod
+        client = appmod.app.test_client()
+        with client.session_transaction() as sess:
+            # User 1 has the most connections
+            sess['user_id'] = 1
+
+        print(f"{'endpoint':>22} {'level':>6} {'bytes':>9} {'ratio':>6} {'cpu ms':>8} {'extra ms':>9}")
+        for url in ENDPOINTS:
+            size, base_cpu = measure(client, url, 'identity', args.requests)
+            print(f"{url:>22} {'-':>6} {size:>9} {1:>6.2f} {base_cpu * 1000:>8.2f} {0:>9.2f}")
+            for level in args.levels:
+                appmod.compressor.level = level
+                gz_size, cpu = measure(client, url, 'gzip', args.requests)
+                print(f"{url:>22} {level:>6} {gz_size:>9} {size / gz_size:>6.2f} "
+                      f"{cpu * 1000:>8.2f} {(cpu - base_cpu) * 1000:>9.2f}")
+    finally:
+        shutil.rmtree(data_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Benchmark password checks at several hashing costs.
+
+Usage: python scripts/bench_login.py [--settings pbkdf2:100000 pbkdf2:600000 scrypt:16384]
+                                     [--logins 64] [--clients 16] [--workers 2]
+
+Each setting runs `logins` verifications from `clients` concurrent threads,
+as request threads would during a burst of sign-ins, through a
+PasswordHasher pool of `workers` threads. Reported: logins per second,
+login latency, and the p95 latency of a small unrelated task timed
+alongside, which shows whether the burst starves other requests.
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from passwords import PasswordHasher, HasherBusy
+
+
+def other_request():
+    # Stand-in for a cheap request: some dict and string work under the GIL
+    return sum(len(str(i)) for i in range(2000))
+
+
+def bench(scheme, cost, logins, clients, workers):
+    hasher = PasswordHasher(scheme, cost, workers=workers, max_pending=logins)
+    stored = hasher.hash('correct horse battery staple')
+
+    probe_times, done = [], threading.Event()
+
+    def probe():
+        while not done.is_set():
+            start = time.perf_counter()
+            other_request()
+            probe_times.append(time.perf_counter() - start)
+            time.sleep(0.001)
+
+    def login(_):
+        start = time.perf_counter()
+        try:
+            assert hasher.verify(stored, 'correct horse battery staple')
+        except HasherBusy:
+            return None
+        return time.perf_counter() - start
+
+    prober = threading.Thread(target=probe)
+    prober.start()
+    began = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        latencies = list(executor.map(login, range(logins)))
+    elapsed = time.perf_counter() - began
+    done.set()
+    prober.join()
+    hasher.close()
+
+    served = sorted(t for t in latencies if t is not None)
+    probe_times.sort()
+    return {
+        'throughput': len(served) / elapsed,
+        'p50': statistics.median(served),
+        'p95': served[int(len(served) * 0.95) - 1],
+        'busy': latencies.count(None),
+        'probe_p95': probe_times[int(len(probe_times) * 0.95) - 1] if probe_times else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--settings', nargs='+',
+                        default=['pbkdf2:100000', 'pbkdf2:310000', 'pbkdf2:600000', 'scrypt:16384', 'scrypt:32768'],
+                        help='scheme:cost pairs')
+    parser.add_argument('--logins', type=int, default=64)
+    parser.add_argument('--clients', type=int, default=16, help='concurrent request threads')
+    parser.add_argument('--workers', type=int, default=2, help='hashing pool size')
+    args = parser.parse_args()
+
+    print(f"{'setting':>16} {'logins/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'busy':>5} {'other p95 ms':>13}")
+    for setting in args.settings:
+        scheme, cost = setting.split(':')
+        result = bench(scheme, int(cost), args.logins, args.clients, args.workers)
+        print(f"{setting:>16} {result['throughput']:>9.1f} {result['p50'] * 1000:>8.1f} "
+              f"{result['p95'] * 1000:>8.1f} {result['busy']:>5} {result['probe_p95'] * 1000:>13.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Time a full recomputation of the featured-user recommendations.
+
+Usage: python scripts/bench_recommendations.py [--users 100000] [--k 20] [--python-limit 20000]
+                                               [--data-dir DIR]
+
+A synthetic data set from generate_dataset.py is written to a temp data
+directory (or DIR is read) and the steps of Recommender.refresh() are timed
+on it: reading features out of the DataStore, IDF weighting into CSR arrays
+and the top-k neighbour search, with NumPy when it is installed and in pure
+Python for data sets of up to --python-limit users. The search is quadratic
+in the number of users sharing terms, so the pure Python one is only run on
+smaller sizes. Also timed: serving one user's neighbours after a refresh.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from generate_dataset import generate
+from datastore import DataStore
+from recommendations import Recommender, numpy, top_k_numpy, top_k_python, user_features, weigh
+
+
+def timed(label, fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    print(f'{label:>28} {time.perf_counter() - start:>10.3f} s')
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--k', type=int, default=20)
+    parser.add_argument('--python-limit', type=int, default=20000,
+                        help='largest data set to run the pure Python search on')
+    parser.add_argument('--data-dir', help='existing data directory to read instead')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    temp_dir = None
+    data_dir = args.data_dir
+    if not data_dir:
+        temp_dir = data_dir = tempfile.mkdtemp(prefix='skillswap-recommend-')
+        print(f'Generating {args.users} users in {data_dir}')
+        generate(data_dir, args.users, seed=args.seed)
+    try:
+        store = DataStore(data_dir)
+        for filename in ('users.json', 'profile.json', 'skills.json'):
+            timed(f'load {filename}', store.load, filename)
+        ids, rows = timed('user_features', user_features, store)
+        indptr, indices, data, columns = timed('weigh', weigh, rows)
+        print(f'{len(ids)} users, {columns} shared terms, {len(indices)} nonzeros')
+
+        if numpy is not None:
+            timed(f'top_k_numpy (k={args.k})', top_k_numpy, indptr, indices, data, columns, args.k)
+        else:
+            print('NumPy is not installed; skipping top_k_numpy')
+        if len(ids) <= args.python_limit:
+            timed(f'top_k_python (k={args.k})', top_k_python, indptr, indices, data, args.k)
+        else:
+            print(f'Skipping top_k_python above {args.python_limit} users')
+
+        recommender = Recommender(store, k=args.k)
+        if numpy is not None or len(ids) <= args.python_limit:
+            timed('Recommender.refresh', recommender.refresh)
+            start = time.perf_counter()
+            for user_id in ids[:10000]:
+                recommender.neighbours(user_id)
+            per_lookup = (time.perf_counter() - start) / min(len(ids), 10000)
+            print(f"{'neighbours() per user':>28} {per_lookup * 1e6:>10.3f} us")
+    finally:
+        if temp_dir:
+            shutil.rmtree(temp_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""Compare point lookups and scans from record files with json.load of the whole file.
+
+Usage: python scripts/bench_records.py [--users 100000] [--lookups 10000] [--data-dir DIR]
+
+A synthetic data set from generate_dataset.py is written to a temp data
+directory (or DIR is used) and converted with DataStore.write_records().
+Each measurement then runs in a fresh process, for profile.json and
+skills.json:
+- json: json.load() of the file and a dict by key, as DataStore builds
+- records: RecordFile.get() through mmap
+- json scan / records scan: reading every record once
+Reported are the time to the first record (for scans, to the last), the
+per-lookup latency of --lookups random keys after it (p50 and p99), and
+how much the process's resident memory grew. Pages of the record file that
+were read count as resident too, but the OS can drop them again.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from datastore import DataStore
+from generate_dataset import generate
+from records import RecordFile, collection_items, records_path
+
+COLLECTIONS = ['profile.json', 'skills.json']
+METHODS = ['json', 'records', 'json scan', 'records scan']
+
+
+def rss_mb():
+    """Current resident memory; the peak where /proc is not available"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize() / (1024 * 1024)
+    except OSError:
+        # ru_maxrss is in KB on Linux and in bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def open_method(method, path, filename):
+    """Return a lookup function after doing what the first lookup needs"""
+    if method == 'json':
+        with open(path) as f:
+            data = json.load(f)
+        keys = {}
+        for key, record in collection_items(filename, data):
+            keys.setdefault(key, record)
+        return keys.get
+    records = RecordFile(records_path(os.path.dirname(path), filename))
+    return records.get
+
+
+def scan(method, path, filename):
+    """Return (records read, highest resident memory seen while reading)"""
+    count, peak = 0, 0
+    if method == 'json scan':
+        with open(path) as f:
+            items = collection_items(filename, json.load(f))
+            for _ in items:
+                count += 1
+                if count % 1000 == 1:
+                    peak = max(peak, rss_mb())
+    else:
+        with RecordFile(records_path(os.path.dirname(path), filename)) as records:
+            for _ in records.items():
+                count += 1
+                if count % 1000 == 1:
+                    peak = max(peak, rss_mb())
+    return count, peak
+
+
+def child(method, path, filename, keys):
+    baseline = rss_mb()
+    start = time.perf_counter()
+    if method.endswith('scan'):
+        count, peak = scan(method, path, filename)
+        first = time.perf_counter() - start
+        latencies = []
+    else:
+        lookup = open_method(method, path, filename)
+        count = int(lookup(keys[0]) is not None)
+        first = time.perf_counter() - start
+        latencies = []
+        for key in keys[1:]:
+            start = time.perf_counter()
+            lookup(key)
+            latencies.append(time.perf_counter() - start)
+        # The lookup keeps whatever it loaded alive until here
+        peak = rss_mb()
+    result = {'first_ms': first * 1000, 'rss_mb': peak - baseline, 'count': count}
+    if latencies:
+        latencies.sort()
+        result['p50_us'] = statistics.median(latencies) * 1e6
+        result['p99_us'] = latencies[int(len(latencies) * 0.99)] * 1e6
+    print(json.dumps(result))
+
+
+def run(method, path, filename, keys):
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', method, path, filename],
+        input=json.dumps(keys), capture_output=True, text=True, check=True).stdout
+    return json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--lookups', type=int, default=10000)
+    parser.add_argument('--data-dir', help='existing data directory to use instead')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--child', nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        method, path, filename = args.child
+        child(method, path, filename, json.load(sys.stdin))
+        return
+
+    temp_dir = None
+    data_dir = args.data_dir
+    if not data_dir:
+        temp_dir = data_dir = tempfile.mkdtemp(prefix='skillswap-records-')
+        print(f'Generating {args.users} users in {data_dir}')
+        generate(data_dir, args.users, seed=args.seed)
+    try:
+        store = DataStore(data_dir)
+        rng = random.Random(args.seed)
+        for filename in COLLECTIONS:
+            count = store.write_records(filename)
+            keys = [key for key, _ in collection_items(filename, store.load(filename))]
+            keys = [rng.choice(keys) for _ in range(args.lookups + 1)]
+            path = os.path.join(data_dir, filename)
+            print(f'\n{filename}: {count} records, {os.path.getsize(path) / 1e6:.1f} MB JSON, '
+                  f'{os.path.getsize(records_path(data_dir, filename)) / 1e6:.1f} MB records')
+            print(f"{'method':>14} {'first (ms)':>11} {'p50 (us)':>9} {'p99 (us)':>9} {'RSS +MB':>9}")
+            for method in METHODS:
+                result = run(method, path, filename, keys)
+                p50 = f"{result['p50_us']:.2f}" if 'p50_us' in result else '-'
+                p99 = f"{result['p99_us']:.2f}" if 'p99_us' in result else '-'
+                print(f"{method:>14} {result['first_ms']:>11.1f} {p50:>9} {p99:>9} {result['rss_mb']:>9.1f}")
+        store.close()
+    finally:
+        if temp_dir:
+            shutil.rmtree(temp_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Benchmark /api/search matching: linear scan vs. the trigram index.
+
+Usage: python scripts/bench_search.py [--sizes 10000 100000 1000000]
+
+Sizes are total skill counts; skills are grouped five per user like
+skills.json, so the index holds one document per user.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search_index import TrigramIndex, skills_text
+
+SKILL_NAMES = ['Python', 'JavaScript', 'Guitar', 'Piano', 'Cooking', 'Photography', 'Spanish',
+               'French', 'Drawing', 'Yoga', 'Machine Learning', 'Public Speaking', 'Chess',
+               'Video Editing', 'Gardening', 'Knitting', 'Rust', 'Data Analysis', 'Singing', 'Baking']
+WORDS = ['beginner', 'advanced', 'teaching', 'projects', 'weekend', 'lessons', 'experience',
+         'professional', 'hobby', 'online', 'workshops', 'mentoring', 'practice', 'theory',
+         'portfolio', 'courses', 'community', 'volunteer', 'freelance', 'studio']
+QUERIES = ['py', 'guitar', 'machine learn', 'mentoring', 'studio lessons', 'zzz', 'photo', 'ing']
+SKILLS_PER_USER = 5
+
+
+def make_skills(total, rng):
+    user_skills = {}
+    for i in range(total):
+        user_skills.setdefault(str(i // SKILLS_PER_USER), []).append({
+            'skill_name': rng.choice(SKILL_NAMES),
+            'description': ' '.join(rng.choice(WORDS) for _ in range(6)),
+        })
+    return user_skills
+
+
+def linear_search(user_skills, query):
+    # Mirrors the scan api_search did before the index
+    return [skill for skills in user_skills.values() for skill in skills
+            if query in skill['skill_name'].lower() or query in skill['description'].lower()]
+
+
+def indexed_search(index, user_skills, query):
+    return [skill for user_id in index.search(query) for skill in user_skills[user_id]
+            if query in skill['skill_name'].lower() or query in skill['description'].lower()]
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    print(f"{'skills':>9} {'build s':>8} {'query':>15} {'hits':>7} {'scan ms':>9} {'index ms':>9}")
+    for size in args.sizes:
+        user_skills = make_skills(size, rng)
+
+        start = time.perf_counter()
+        index = TrigramIndex()
+        for user_id, skills in user_skills.items():
+            index.add(user_id, skills_text(skills))
+        build = time.perf_counter() - start
+
+        for query in QUERIES:
+            hits = indexed_search(index, user_skills, query)
+            assert len(hits) == len(linear_search(user_skills, query))
+            scan_ms = timed(lambda: linear_search(user_skills, query), args.repeat)
+            index_ms = timed(lambda: indexed_search(index, user_skills, query), args.repeat)
+            print(f'{size:>9} {build:>8.2f} {query!r:>15} {len(hits):>7} {scan_ms:>9.2f} {index_ms:>9.2f}')
+
+
+if __name__ == '__main__':
+    main()
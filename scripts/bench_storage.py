@@ -0,0 +1,105 @@
+"""Benchmark the storage modes: cold load, single-record saves and reloads.
+
+Usage: python scripts/bench_storage.py [--users 1000 10000 100000] [--saves 200]
+
+For each size a synthetic data set (users, profiles with interests, five
+skills per user, connections) is written in every mode. Reported per mode:
+- load: a fresh DataStore reading every collection
+- save: median and p95 of a hinted save changing one profile
+- reload: loading profile.json after another process saved one profile
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datastore import DataStore
+from storage import SQLITE_TABLES
+
+MODES = ['json', 'journal', 'sqlite']
+INTERESTS = ['Python', 'Guitar', 'Cooking', 'Photography', 'Spanish', 'Yoga', 'Chess', 'Baking']
+
+
+def make_dataset(users, rng):
+    data = {
+        'users.json': [], 'profile.json': [], 'connections.json': [],
+        'user_interests.json': [], 'user_skills.json': [], 'skills.json': {'user_skills': {}},
+        'uploads.json': [],
+    }
+    for i in range(1, users + 1):
+        data['users.json'].append({'id': i, 'fullname': f'User {i}', 'email': f'user{i}@example.com',
+                                   'password': 'x' * 64, 'about': ''})
+        data['profile.json'].append({'user_id': i, 'location': 'Somewhere', 'interests': rng.sample(INTERESTS, 3),
+                                     'education': [], 'work_experience': [], 'updated_at': ''})
+        data['skills.json']['user_skills'][str(i)] = [
+            {'skill_id': f'{i}_{n}', 'skill_name': rng.choice(INTERESTS), 'description': 'Lessons and practice',
+             'qualification': 'Intermediate', 'years_of_experience': n} for n in range(5)]
+    for i in range(1, users + 1):
+        data['connections.json'].append({'id': str(i), 'user_id': str(i), 'connected_user_id': str(rng.randint(1, users)),
+                                         'status': rng.choice(['pending', 'connected']), 'created_at': ''})
+    return data
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def bench_mode(mode, data, saves, rng):
+    data_dir = tempfile.mkdtemp(prefix=f'skillswap-bench-{mode}-')
+    try:
+        writer = DataStore(data_dir, mode=mode, fsync='never', journal_max_bytes=1 << 30)
+        for filename in SQLITE_TABLES:
+            writer.save(data[filename], filename)
+        writer.close()
+
+        store = DataStore(data_dir, mode=mode, fsync='never', journal_max_bytes=1 << 30)
+        load = timed(lambda: [store.load(filename) for filename in SQLITE_TABLES])
+
+        profiles = store.load('profile.json')
+        save_times = []
+        for _ in range(saves):
+            user_id = rng.randint(1, len(profiles))
+            store.profile(user_id)['updated_at'] = str(time.time())
+            save_times.append(timed(lambda: store.save(profiles, 'profile.json', changed=[user_id])))
+
+        # A second store stands in for another worker process
+        other = DataStore(data_dir, mode=mode, fsync='never', journal_max_bytes=1 << 30)
+        other_profiles = other.load('profile.json')
+        other.profile(1)['updated_at'] = 'now'
+        other.save(other_profiles, 'profile.json', changed=[1])
+        other.close()
+        reload = timed(lambda: store.load('profile.json'))
+        store.close()
+
+        save_times.sort()
+        return load, statistics.median(save_times), save_times[int(len(save_times) * 0.95)], reload
+    finally:
+        shutil.rmtree(data_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--saves', type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    print(f"{'users':>8} {'mode':>8} {'load ms':>10} {'save p50 ms':>12} {'save p95 ms':>12} {'reload ms':>10}")
+    for users in args.users:
+        data = make_dataset(users, rng)
+        for mode in MODES:
+            load, p50, p95, reload = bench_mode(mode, data, args.saves, rng)
+            print(f'{users:>8} {mode:>8} {load * 1000:>10.1f} {p50 * 1000:>12.3f} '
+                  f'{p95 * 1000:>12.3f} {reload * 1000:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
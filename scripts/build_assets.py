@@ -0,0 +1,36 @@
+"""Build fingerprinted, precompressed copies of the static assets.
+
+Usage: python scripts/build_assets.py [--static static] [--output static/dist]
+
+Every file under static/css, static/js and static/images is copied to
+<name>.<hash>.<ext> with .gz (and .br when the brotli package is installed)
+variants of the text files, and the name mapping is written to
+manifest.json. The app only reads the manifest, so run this as a deploy
+step (and after changing static files); until then assets are served
+under their plain names.
+"""
+import argparse
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from assets import build_manifest, brotli
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--static', default=os.path.join(ROOT, 'static'))
+    parser.add_argument('--output', default=os.path.join(ROOT, 'static', 'dist'))
+    args = parser.parse_args()
+
+    manifest = build_manifest(args.static, args.output)
+    for name, fingerprinted in sorted(manifest.items()):
+        print(f'{name} -> {fingerprinted}')
+    if brotli is None:
+        print('brotli is not installed; only gzip variants were written')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""Export or import users, profiles, skills and connections as NDJSON.
+
+Usage: python scripts/bulk_data.py export [--data-dir data] [--types users,profiles,skills,connections]
+                                          [--output FILE]
+       python scripts/bulk_data.py import [--data-dir data] [--input FILE] [--batch-size 5000] [--check]
+
+Each line is {"type": ..., "data": {...}}, one per user, profile, skill or
+connection, in that order; `import` reads the same format. The storage
+mode is taken from SKILLSWAP_STORAGE_MODE. Exports are written as they are
+serialized and imports committed a batch at a time, one write per
+collection per batch, so both can run while the app is serving: the app
+picks the imported records up on its next read. Output and input default
+to stdout and stdin. The import report (counts, rejected lines, records
+per second) is printed as JSON; the export's throughput goes to stderr.
+With --check, every stored connection must name its users by their ids
+exactly as users.json stores them (an id of 1, not "1"), as the views
+compare them with the logged-in user's id.
+Exports contain password hashes, so keep them private.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bulk import BulkImporter, EXPORT_TYPES, IMPORT_BATCH, export_ndjson
+from datastore import DataStore
+
+
+def export(store, args):
+    types = args.types.split(',')
+    unknown = [t for t in types if t not in EXPORT_TYPES]
+    if unknown:
+        sys.exit(f"Unknown types: {', '.join(unknown)}")
+    output = open(args.output, 'w') if args.output else sys.stdout
+    started = time.perf_counter()
+    records = 0
+    try:
+        for chunk in export_ndjson(store, types):
+            output.write(chunk)
+            records += chunk.count('\n')
+    finally:
+        if args.output:
+            output.close()
+    seconds = time.perf_counter() - started
+    print(f'Exported {records} records in {seconds:.2f}s ({records / max(seconds, 1e-9):.0f} records/s)',
+          file=sys.stderr)
+
+
+def check(store):
+    """Return a description of each connection endpoint that is not a stored user id"""
+    problems = []
+    for connection in store.load('connections.json'):
+        for field in ('user_id', 'connected_user_id'):
+            user_id = connection.get(field)
+            user = store.user(user_id)
+            if user is None:
+                problems.append(f"connection {connection.get('id')}: unknown {field} {user_id!r}")
+            elif user['id'] != user_id:
+                problems.append(f"connection {connection.get('id')}: {field} is {user_id!r}, "
+                                f"the user's id is {user['id']!r}")
+    return problems
+
+
+def import_(store, args):
+    source = open(args.input, 'rb') if args.input else sys.stdin.buffer
+    try:
+        report = BulkImporter(store, batch_size=args.batch_size).run(source)
+    finally:
+        if args.input:
+            source.close()
+    print(json.dumps(report, indent=2))
+    problems = check(store) if args.check else []
+    for problem in problems[:10]:
+        print(problem, file=sys.stderr)
+    if report['rejected'] or problems:
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', choices=['export', 'import'])
+    parser.add_argument('--data-dir', default=os.environ.get('SKILLSWAP_DATA_DIR', 'data'))
+    parser.add_argument('--types', default=','.join(EXPORT_TYPES), help='comma-separated, for export')
+    parser.add_argument('--output', help='export to this file instead of stdout')
+    parser.add_argument('--input', help='import from this file instead of stdin')
+    parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH, help='records per import commit')
+    parser.add_argument('--check', action='store_true', help='after importing, check the connections reference stored user ids')
+    args = parser.parse_args()
+
+    store = DataStore(args.data_dir, mode=os.environ.get('SKILLSWAP_STORAGE_MODE', 'json'))
+    try:
+        if args.command == 'export':
+            export(store, args)
+        else:
+            import_(store, args)
+    finally:
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
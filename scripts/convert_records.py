@@ -0,0 +1,68 @@
+"""Write <file>.records files for the collections, for lookups without a full parse.
+
+Usage: python scripts/convert_records.py [--data-dir data] [--collections profile.json skills.json ...]
+                                         [--check]
+
+A record file holds a collection's records length-prefixed, one after the
+other, with a sorted index of key hashes and offsets at the end (see
+records.py). While the app has not loaded a collection, /api/profile/<id>
+and /api/skills/<id> read single records from it through mmap instead of
+parsing the whole JSON file. Each file notes the storage signature it was
+written from (SKILLSWAP_STORAGE_MODE picks the storage) and is ignored once
+the collection is saved, so run this again after imports or on a schedule
+for read-mostly data. With --check every record is read back through the
+index and compared with the collection.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datastore import DataStore
+from journal import KEY_FIELDS
+from records import RecordFile, collection_items, records_path
+
+COLLECTIONS = list(KEY_FIELDS) + ['skills.json']
+
+
+def check(store, filename):
+    """Return the keys whose record differs between the record file and the collection"""
+    expected = {}
+    for key, record in collection_items(filename, store.load(filename)):
+        expected.setdefault(key, record)
+    with RecordFile(records_path(store.data_dir, filename)) as records:
+        if len(records) != len(expected):
+            return ['(count)']
+        return [key for key, record in expected.items() if records.get(key) != record]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--data-dir', default=os.environ.get('SKILLSWAP_DATA_DIR', 'data'))
+    parser.add_argument('--collections', nargs='+', choices=COLLECTIONS, default=COLLECTIONS)
+    parser.add_argument('--check', action='store_true', help='read every record back and compare')
+    args = parser.parse_args()
+
+    store = DataStore(args.data_dir, mode=os.environ.get('SKILLSWAP_STORAGE_MODE', 'json'))
+    failed = []
+    try:
+        for filename in args.collections:
+            start = time.perf_counter()
+            count = store.write_records(filename)
+            size = os.path.getsize(records_path(args.data_dir, filename))
+            print(f'{filename}: {count} records, {size / 1e6:.1f} MB in {time.perf_counter() - start:.2f}s')
+            if args.check:
+                mismatched = check(store, filename)
+                if mismatched:
+                    failed.append(filename)
+                    print(f"  read-back differs for keys {', '.join(mismatched[:10])}")
+    finally:
+        store.close()
+    if failed:
+        sys.exit(f"Record files differ from {', '.join(failed)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""Write a synthetic SkillSwap data set as data/*.json files.
+
+Usage: python scripts/generate_dataset.py --users 10000 [--data-dir data] [--seed 42]
+                                          [--connections 3] [--force]
+
+Each user gets a profile, one to six skills (with certifications and
+projects), interests and the user_skills.json name list. Skill names follow
+a Zipf distribution, so a few skills are very common and most are rare, and
+connection targets are skewed towards low user ids, giving a few users many
+connections. Every account's password is 'password'. Records are written as
+they are generated, so 1M users need little memory. The files are in the
+json storage mode; scripts/migrate_storage.py converts them.
+"""
+import argparse
+import bisect
+import itertools
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from passwords import PasswordHasher
+
+SKILL_NAMES = ['Python', 'JavaScript', 'Guitar', 'Cooking', 'Photography', 'Spanish', 'Yoga',
+               'Piano', 'Drawing', 'Machine Learning', 'French', 'Public Speaking', 'Chess',
+               'Video Editing', 'Gardening', 'Baking', 'Data Analysis', 'Singing', 'Knitting',
+               'Rust', 'Calligraphy', 'Woodworking', 'Pottery', 'Japanese', 'Sign Language',
+               'Carpentry', 'Origami', 'Beekeeping', 'Astronomy', 'Welding']
+WORDS = ['beginner', 'advanced', 'teaching', 'projects', 'weekend', 'lessons', 'experience',
+         'professional', 'hobby', 'online', 'workshops', 'mentoring', 'practice', 'theory',
+         'portfolio', 'courses', 'community', 'volunteer', 'freelance', 'studio']
+FIRST_NAMES = ['Alice', 'Bob', 'Carmen', 'Dmitri', 'Emeka', 'Fatima', 'Giulia', 'Hiro', 'Ines',
+               'Jonas', 'Kavya', 'Liam', 'Mei', 'Nour', 'Oscar', 'Priya', 'Quinn', 'Rosa']
+LAST_NAMES = ['Smith', 'Garcia', 'Nakamura', 'Okafor', 'Silva', 'Novak', 'Haddad', 'Larsen',
+              'Kim', 'Rossi', 'Patel', 'Murphy', 'Costa', 'Weber', 'Singh', 'Dubois']
+CITIES = ['Berlin', 'Lisbon', 'Austin', 'Lagos', 'Osaka', 'Toronto', 'Pune', 'Lyon', 'Remote']
+QUALIFICATIONS = ['Beginner', 'Intermediate', 'Advanced', 'Expert']
+COLLECTIONS = ['users.json', 'profile.json', 'skills.json', 'connections.json',
+               'user_interests.json', 'user_skills.json', 'uploads.json']
+CREATED_AT = '2024-01-01T00:00:00'
+
+
+def zipf_picker(values, rng, s=1.1):
+    """Function returning values[k] with probability proportional to 1 / (k + 1) ** s"""
+    cumulative = list(itertools.accumulate(1 / (k + 1) ** s for k in range(len(values))))
+    return lambda: values[bisect.bisect(cumulative, rng.random() * cumulative[-1])]
+
+
+def sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words))
+
+
+def generate_user(user_id, rng, pick_skill, password):
+    name = f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+    skill_names = list(dict.fromkeys(pick_skill() for _ in range(rng.randint(1, 6))))
+    interests = list(dict.fromkeys(pick_skill() for _ in range(rng.randint(0, 4))))
+    user = {'id': user_id, 'fullname': name, 'email': f'user{user_id}@example.com',
+            'password': password, 'about': '', 'created_at': CREATED_AT}
+    profile = {'user_id': user_id, 'profile_picture': 'default-avatar.png', 'about': sentence(rng, 12),
+               'location': rng.choice(CITIES), 'interests': interests, 'education': [],
+               'work_experience': [], 'created_at': CREATED_AT, 'updated_at': CREATED_AT}
+    skills = [{
+        'skill_id': f'{skill_name.lower()}_{n + 1}',
+        'skill_name': skill_name,
+        'description': sentence(rng, 10),
+        'qualification': rng.choice(QUALIFICATIONS),
+        'years_of_experience': rng.randint(0, 20),
+        'certifications': [f'{skill_name} Certificate'] if rng.random() < 0.3 else [],
+        'projects': [sentence(rng, 3)] if rng.random() < 0.5 else [],
+        'created_at': CREATED_AT,
+        'updated_at': CREATED_AT,
+    } for n, skill_name in enumerate(skill_names)]
+    return user, profile, skills, interests
+
+
+class _ListWriter:
+    """Writes a JSON array one element at a time"""
+
+    def __init__(self, path, opening='['):
+        self.file = open(path, 'w')
+        self.first = True
+        self.file.write(opening)
+
+    def add(self, text):
+        self.file.write(text if self.first else ',\n' + text)
+        self.first = False
+
+    def close(self, closing=']'):
+        self.file.write(closing)
+        self.file.close()
+
+
+def generate(data_dir, users, seed=42, connections=3):
+    """Write every collection for `users` users to data_dir; returns record counts"""
+    rng = random.Random(seed)
+    pick_skill = zipf_picker(SKILL_NAMES, rng)
+    password = PasswordHasher().hash('password')
+    os.makedirs(data_dir, exist_ok=True)
+
+    writers = {filename: _ListWriter(os.path.join(data_dir, filename))
+               for filename in COLLECTIONS if filename != 'skills.json'}
+    # skills.json is {"user_skills": {user_id: [skills]}}
+    skills_file = _ListWriter(os.path.join(data_dir, 'skills.json'), '{"user_skills": {')
+    counts = dict.fromkeys(COLLECTIONS, 0)
+    connection_id = 0
+
+    for user_id in range(1, users + 1):
+        user, profile, skills, interests = generate_user(user_id, rng, pick_skill, password)
+        writers['users.json'].add(json.dumps(user))
+        writers['profile.json'].add(json.dumps(profile))
+        skills_file.add(f'"{user_id}": {json.dumps(skills)}')
+        writers['user_skills.json'].add(json.dumps({'user_id': user_id, 'skills': [s['skill_name'] for s in skills]}))
+        counts['users.json'] += 1
+        counts['profile.json'] += 1
+        counts['skills.json'] += len(skills)
+        counts['user_skills.json'] += 1
+        if interests:
+            writers['user_interests.json'].add(json.dumps({'user_id': user_id, 'interests': interests}))
+            counts['user_interests.json'] += 1
+
+        # Cubing a uniform number skews targets towards the first users
+        targets = {1 + int(users * rng.random() ** 3) for _ in range(rng.randint(0, 2 * connections))}
+        for target in sorted(targets - {user_id}):
+            connection_id += 1
+            writers['connections.json'].add(json.dumps({
+                'id': str(connection_id), 'user_id': user_id, 'connected_user_id': target,
+                'status': 'connected' if rng.random() < 0.7 else 'pending', 'created_at': CREATED_AT,
+            }))
+            counts['connections.json'] += 1
+
+    for writer in writers.values():
+        writer.close()
+    skills_file.close('}}')
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, required=True)
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--connections', type=int, default=3, help='average connections started per user')
+    parser.add_argument('--force', action='store_true', help='overwrite existing data files')
+    args = parser.parse_args()
+
+    existing = [f for f in COLLECTIONS if os.path.exists(os.path.join(args.data_dir, f))]
+    if existing and not args.force:
+        sys.exit(f'{args.data_dir} already holds {", ".join(existing)}; use --force to overwrite')
+    counts = generate(args.data_dir, args.users, args.seed, args.connections)
+    for filename, count in counts.items():
+        print(f'{filename:>20} {count:>10} records')
+
+
+if __name__ == '__main__':
+    main()
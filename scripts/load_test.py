@@ -0,0 +1,292 @@
+"""Drive a local app server with concurrent mixed traffic and check latency budgets.
+
+Usage: python scripts/load_test.py [--users 2000] [--processes 2] [--threads 8]
+                                   [--duration 30] [--warmup 3] [--think 200]
+                                   [--mix dashboard=35,search=25,connections=10,connect=10,profile=15,login=5]
+                                   [--budgets scripts/load_budgets.json] [--output load_results.json]
+                                   [--data-dir DIR] [--url http://127.0.0.1:5000]
+                                   [--server-cmd "gunicorn -w 4 -b 127.0.0.1:{port} app:app"]
+
+Unless --url points at a running server, a data set is generated with
+generate_dataset.py (or DIR is used, and modified) and the app is started
+on a free localhost port, by default with the threaded Flask server. Every
+thread is a virtual user: it logs in as its own account, then picks
+routes from the weighted mix, pausing an exponentially distributed think
+time (mean --think ms) between requests. Requests in the first --warmup
+seconds are not counted. Only the standard library is used, so it runs
+offline.
+
+Reported per route: requests, throughput, errors (5xx or connection
+failures) and p50/p95/p99 latency. The budgets file maps routes (or '*'
+for all of them) to limits such as {"p99_ms": 500, "error_rate": 0.01};
+any limit exceeded makes the exit status 1.
+"""
+import argparse
+import http.cookiejar
+import json
+import multiprocessing
+import os
+import random
+import shlex
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from generate_dataset import generate, SKILL_NAMES
+
+DEFAULT_MIX = 'dashboard=35,search=25,connections=10,connect=10,profile=15,login=5'
+DEFAULT_BUDGETS = os.path.join(ROOT, 'scripts', 'load_budgets.json')
+PASSWORD = 'password'
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # Time the request itself, not the page it redirects to
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def build_request(route, base_url, user_id, users, rng):
+    """(method, url, body, content type) for one request of a route"""
+    if route == 'login':
+        body = urllib.parse.urlencode({'email': f'user{user_id}@example.com', 'password': PASSWORD})
+        return 'POST', f'{base_url}/login', body.encode(), 'application/x-www-form-urlencoded'
+    if route == 'dashboard':
+        return 'GET', f'{base_url}/dashboard', None, None
+    if route == 'search':
+        name = rng.choice(SKILL_NAMES).lower()
+        query = urllib.parse.quote(name[:rng.randint(2, len(name))])
+        return 'GET', f'{base_url}/api/search?q={query}', None, None
+    if route == 'connections':
+        return 'GET', f'{base_url}/api/connections', None, None
+    if route == 'connect':
+        body = json.dumps({'user_id': rng.randint(1, users)})
+        return 'POST', f'{base_url}/api/connections/request', body.encode(), 'application/json'
+    if route == 'profile':
+        body = urllib.parse.urlencode({'about': f'Updated at {time.time()}', 'location': 'Somewhere'})
+        return 'POST', f'{base_url}/api/profile/update', body.encode(), 'application/x-www-form-urlencoded'
+    raise ValueError(f'Unknown route: {route}')
+
+
+def send(opener, method, url, body, content_type):
+    request = urllib.request.Request(url, data=body, method=method)
+    if content_type:
+        request.add_header('Content-Type', content_type)
+    try:
+        with opener.open(request, timeout=60) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        # 3xx (redirects are not followed) and 4xx answers are still answers
+        e.read()
+        return e.code
+    except OSError:
+        return 0
+
+
+def virtual_user(base_url, user_id, users, mix, deadline, warmup_until, think, seed, records):
+    rng = random.Random(seed)
+    opener = urllib.request.build_opener(
+        urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect())
+    routes, weights = zip(*mix.items())
+    route = 'login'
+    while time.monotonic() < deadline:
+        request = build_request(route, base_url, user_id, users, rng)
+        started = time.monotonic()
+        status = send(opener, *request)
+        if started >= warmup_until:
+            records.append((route, time.monotonic() - started, status))
+        if think:
+            time.sleep(rng.expovariate(1000 / think))
+        route = rng.choices(routes, weights)[0]
+
+
+def worker(base_url, user_ids, users, mix, duration, warmup, think, seed, results):
+    """One process: a thread per virtual user; puts its (route, seconds, status) records on results"""
+    records = []
+    now = time.monotonic()
+    threads = [threading.Thread(target=virtual_user, args=(
+        base_url, user_id, users, mix, now + warmup + duration, now + warmup, think, seed + user_id, records))
+        for user_id in user_ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put(records)
+
+
+def percentile(sorted_values, fraction):
+    # Nearest-rank
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def summarize(records, duration):
+    by_route = {}
+    for route, seconds, status in records:
+        by_route.setdefault(route, []).append((seconds, status))
+    by_route['*'] = [(seconds, status) for _, seconds, status in records]
+
+    summary = {}
+    for route, samples in sorted(by_route.items()):
+        latencies = sorted(seconds for seconds, _ in samples)
+        errors = sum(1 for _, status in samples if status == 0 or status >= 500)
+        summary[route] = {
+            'requests': len(samples),
+            'throughput': len(samples) / duration,
+            'errors': errors,
+            'error_rate': errors / len(samples),
+            'p50_ms': percentile(latencies, 0.50) * 1000,
+            'p95_ms': percentile(latencies, 0.95) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+        }
+    return summary
+
+
+def check_budgets(summary, budgets):
+    """List of 'route metric value > limit' for every budget exceeded"""
+    failures = []
+    for route, limits in budgets.items():
+        targets = summary if route == '*' else {route: summary.get(route)}
+        for name, stats in targets.items():
+            if stats is None:
+                continue
+            for metric, limit in limits.items():
+                if stats[metric] > limit:
+                    failures.append(f'{name} {metric} {stats[metric]:.3f} > {limit}')
+    return failures
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(args, data_dir):
+    port = free_port()
+    if args.server_cmd:
+        command = shlex.split(args.server_cmd.format(port=port))
+    else:
+        command = [sys.executable, '-m', 'flask', '--app', 'app', 'run', '--host', '127.0.0.1',
+                   '--port', str(port), '--no-reload', '--no-debugger', '--with-threads']
+    log = open(os.path.join(data_dir, 'server.log'), 'w')
+    env = dict(os.environ, SKILLSWAP_DATA_DIR=data_dir)
+    server = subprocess.Popen(command, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            sys.exit(f'Server exited with status {server.returncode}; see {log.name}')
+        try:
+            urllib.request.urlopen(f'{base_url}/login', timeout=1).read()
+            return server, base_url
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    sys.exit('Server did not start within 60s')
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        route, weight = part.split('=')
+        mix[route.strip()] = float(weight)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=2000, help='size of the generated data set')
+    parser.add_argument('--processes', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8, help='virtual users per process')
+    parser.add_argument('--duration', type=float, default=30, help='measured seconds')
+    parser.add_argument('--warmup', type=float, default=3, help='unmeasured seconds before that')
+    parser.add_argument('--think', type=float, default=200, help='mean think time in ms (0 for none)')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='route=weight pairs')
+    parser.add_argument('--budgets', default=DEFAULT_BUDGETS, help="JSON file of latency budgets, '' for none")
+    parser.add_argument('--output', default='load_results.json')
+    parser.add_argument('--data-dir', help='existing data directory to run against (it is modified)')
+    parser.add_argument('--url', help='test an already running server instead of starting one')
+    parser.add_argument('--server-cmd', help='command starting the server; {port} is replaced')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    for route in mix:
+        build_request(route, '', 1, 1, random.Random())  # reject unknown routes early
+    virtual_users = args.processes * args.threads
+
+    server, temp_dir = None, None
+    data_dir = args.data_dir
+    users = args.users
+    if not args.url and not data_dir:
+        temp_dir = data_dir = tempfile.mkdtemp(prefix='skillswap-load-')
+        print(f'Generating {args.users} users in {data_dir}')
+        generate(data_dir, args.users, seed=args.seed)
+    if data_dir:
+        with open(os.path.join(data_dir, 'users.json')) as f:
+            users = len(json.load(f))
+    if users < virtual_users:
+        sys.exit(f'{virtual_users} virtual users need at least as many accounts, not {users}')
+
+    try:
+        if args.url:
+            base_url = args.url.rstrip('/')
+        else:
+            server, base_url = start_server(args, data_dir)
+        print(f'{virtual_users} virtual users against {base_url} for {args.warmup:g}+{args.duration:g}s')
+
+        results = multiprocessing.Queue()
+        processes = []
+        for n in range(args.processes):
+            user_ids = range(1 + n * args.threads, 1 + (n + 1) * args.threads)
+            process = multiprocessing.Process(target=worker, args=(
+                base_url, user_ids, users, mix, args.duration, args.warmup, args.think, args.seed, results))
+            process.start()
+            processes.append(process)
+        records = [record for _ in processes for record in results.get()]
+        for process in processes:
+            process.join()
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+        if temp_dir:
+            shutil.rmtree(temp_dir)
+
+    if not records:
+        sys.exit('No requests completed')
+    summary = summarize(records, args.duration)
+    print(f"{'route':>12} {'requests':>9} {'req/s':>8} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for route, stats in summary.items():
+        print(f"{route:>12} {stats['requests']:>9} {stats['throughput']:>8.1f} {stats['errors']:>7} "
+              f"{stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f}")
+
+    budgets = {}
+    if args.budgets:
+        with open(args.budgets) as f:
+            budgets = json.load(f)
+    failures = check_budgets(summary, budgets)
+    with open(args.output, 'w') as f:
+        json.dump({'settings': vars(args), 'summary': summary, 'budget_failures': failures}, f, indent=2)
+
+    if failures:
+        print('\nBudgets exceeded:')
+        for failure in failures:
+            print(f'  {failure}')
+        sys.exit(1)
+    print(f'\nAll budgets met; wrote {args.output}')
+
+
+if __name__ == '__main__':
+    main()
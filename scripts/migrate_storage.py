@@ -0,0 +1,67 @@
+"""Copy every collection from one storage mode to another.
+
+Usage: python scripts/migrate_storage.py [--data-dir data] [--from json] [--to sqlite] [--force]
+
+The usual use is a one-shot import of data/*.json (plus any journals) into
+data/skillswap.db before starting the app with SKILLSWAP_STORAGE_MODE=sqlite.
+Stop the app first. The target is read back and compared with the source
+afterwards. Without --force, a target that already holds data is left alone.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datastore import DataStore
+from storage import SQLITE_TABLES, STORAGE_MODES
+
+COLLECTIONS = list(SQLITE_TABLES)
+
+
+def normalized(filename, data):
+    # An empty skills.json may be {} or {'user_skills': {}}
+    if filename == 'skills.json':
+        return data.get('user_skills', {})
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--data-dir', default=os.environ.get('SKILLSWAP_DATA_DIR', 'data'))
+    parser.add_argument('--from', dest='source', choices=STORAGE_MODES, default='json')
+    parser.add_argument('--to', dest='target', choices=STORAGE_MODES, default='sqlite')
+    parser.add_argument('--force', action='store_true', help='overwrite a target that has data')
+    args = parser.parse_args()
+
+    if args.source == args.target or {args.source, args.target} == {'json', 'journal'}:
+        # json and journal share the snapshot files; compacting is the migration
+        parser.error('json and journal modes share their files; pick sqlite on one side')
+
+    source = DataStore(args.data_dir, mode=args.source)
+    target = DataStore(args.data_dir, mode=args.target, fsync='never')
+
+    if not args.force:
+        filled = [f for f in COLLECTIONS if normalized(f, target.load(f))]
+        if filled:
+            sys.exit(f"{args.target} storage already has {', '.join(filled)}; use --force to overwrite")
+
+    for filename in COLLECTIONS:
+        data = source.load(filename)
+        target.save(data, filename)
+        count = len(normalized(filename, data))
+        print(f'{filename}: {count} records')
+    target.close()
+
+    check = DataStore(args.data_dir, mode=args.target)
+    mismatched = [f for f in COLLECTIONS
+                  if normalized(f, check.load(f)) != normalized(f, source.load(f))]
+    check.close()
+    source.close()
+    if mismatched:
+        sys.exit(f"Read-back differs for {', '.join(mismatched)}")
+    print(f'Migrated {args.data_dir} from {args.source} to {args.target}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+"""Stress the DataStore with several worker processes sharing one data directory.
+
+Usage: python scripts/stress_storage.py [--processes 4] [--ops 50] [--mode json|journal|sqlite]
+                                        [--timeout 600]
+
+Each process imports the app with its own in-memory store, like a gunicorn
+worker, and drives it through the Flask test client. All workers register
+at once, then add skills and interests both to their own account and to
+one shared account, so saves to the same records race. Afterwards the data
+is read back from disk and every acknowledged update must be there exactly
+once. Exits with status 1 if any update was lost, or if a worker process
+dies or the workers have not all finished within --timeout seconds.
+"""
+import argparse
+import multiprocessing
+import os
+import queue
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SHARED_EMAIL = 'shared@example.com'
+PASSWORD = 'stress-password'
+
+
+def register(client, fullname, email):
+    while True:
+        response = client.post('/register', data={
+            'fullname': fullname, 'email': email,
+            'password': PASSWORD, 'confirm_password': PASSWORD
+        })
+        # 503 means the view gave up after repeated conflicts; ask again
+        if response.status_code != 503:
+            return
+        time.sleep(0.01)
+
+
+def login(client, email):
+    client.post('/login', data={'email': email, 'password': PASSWORD})
+
+
+def post_until_done(client, url, payload, stats):
+    while True:
+        response = client.post(url, json=payload)
+        if response.status_code != 503:
+            assert response.get_json()['success'], response.get_json()
+            return
+        stats['rejected'] += 1
+        time.sleep(0.01)
+
+
+def setup(data_dir):
+    os.chdir(ROOT)
+    from app import app
+    register(app.test_client(), 'Shared', SHARED_EMAIL)
+
+
+def worker(data_dir, worker_id, ops, start, results):
+    os.chdir(ROOT)
+    from app import app, store
+
+    start.wait()
+    own, shared = app.test_client(), app.test_client()
+    email = f'worker{worker_id}@example.com'
+    register(own, f'Worker {worker_id}', email)
+    login(own, email)
+    login(shared, SHARED_EMAIL)
+
+    stats = {'rejected': 0}
+    acked = {'own_skills': [], 'shared_skills': [], 'shared_interests': []}
+    for i in range(ops):
+        name = f'w{worker_id}-{i}'
+        post_until_done(own, '/api/skills/add', {'skill_name': name}, stats)
+        acked['own_skills'].append(name)
+        if i % 2:
+            post_until_done(shared, '/api/profile/interests/add', {'interest': name}, stats)
+            acked['shared_interests'].append(name)
+        else:
+            post_until_done(shared, '/api/skills/add', {'skill_name': name}, stats)
+            acked['shared_skills'].append(name)
+    store.close()
+    results.put((worker_id, email, acked, stats))
+
+
+def verify(data_dir, mode, outcomes):
+    from datastore import DataStore
+
+    store = DataStore(data_dir, mode=mode)
+    errors = []
+
+    users = store.load('users.json')
+    ids = [str(user['id']) for user in users]
+    if len(ids) != len(set(ids)):
+        errors.append(f'duplicate user ids: {sorted(ids)}')
+    for user in users:
+        if len(store.profiles(user['id'])) != 1:
+            errors.append(f"user {user['id']} has {len(store.profiles(user['id']))} profiles")
+
+    def check(label, expected, found):
+        missing = set(expected) - set(found)
+        duplicated = {name for name in found if found.count(name) > 1}
+        if missing:
+            errors.append(f'{label}: lost {len(missing)} updates, e.g. {sorted(missing)[:5]}')
+        if duplicated:
+            errors.append(f'{label}: applied twice: {sorted(duplicated)[:5]}')
+
+    shared = store.user_by_email(SHARED_EMAIL)
+    shared_skills = [s['skill_name'] for s in store.user_skills(shared['id'])]
+    shared_interests = store.profile(shared['id'])['interests']
+    for worker_id, email, acked, _ in outcomes:
+        user = store.user_by_email(email)
+        if user is None:
+            errors.append(f'{email} was acknowledged but is missing')
+            continue
+        check(f'worker {worker_id} skills', acked['own_skills'],
+              [s['skill_name'] for s in store.user_skills(user['id'])])
+    check('shared skills', [n for o in outcomes for n in o[2]['shared_skills']], shared_skills)
+    check('shared interests', [n for o in outcomes for n in o[2]['shared_interests']], shared_interests)
+    store.close()
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--ops', type=int, default=50, help='rounds of updates per process')
+    parser.add_argument('--mode', choices=['json', 'journal', 'sqlite'], default='json')
+    parser.add_argument('--timeout', type=float, default=600, help='seconds to wait for the workers')
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix='skillswap-stress-')
+    os.environ['SKILLSWAP_DATA_DIR'] = data_dir
+    os.environ['SKILLSWAP_STORAGE_MODE'] = args.mode
+    os.environ.setdefault('SKILLSWAP_FSYNC', 'never')
+    # Small journals make compactions race with appends too
+    os.environ.setdefault('SKILLSWAP_JOURNAL_MAX_BYTES', '20000')
+
+    ctx = multiprocessing.get_context('spawn')
+    process = ctx.Process(target=setup, args=(data_dir,))
+    process.start()
+    process.join()
+
+    start, results = ctx.Event(), ctx.Queue()
+    workers = [ctx.Process(target=worker, args=(data_dir, i, args.ops, start, results))
+               for i in range(args.processes)]
+    for process in workers:
+        process.start()
+    began = time.perf_counter()
+    start.set()
+    outcomes, failure = [], None
+    while len(outcomes) < len(workers) and failure is None:
+        try:
+            outcomes.append(results.get(timeout=1))
+        except queue.Empty:
+            # A worker that dies (e.g. at import) never reports a result
+            crashed = [process for process in workers if process.exitcode not in (None, 0)]
+            if crashed:
+                failure = ', '.join(f'worker {i} exited with {p.exitcode}'
+                                    for i, p in enumerate(workers) if p in crashed)
+            elif time.perf_counter() - began > args.timeout:
+                failure = f'{len(workers) - len(outcomes)} workers did not finish within {args.timeout:g}s'
+    for process in workers:
+        if failure:
+            process.terminate()
+        process.join()
+    elapsed = time.perf_counter() - began
+    if failure is None and any(process.exitcode for process in workers):
+        failure = ', '.join(f'worker {i} exited with {p.exitcode}' for i, p in enumerate(workers) if p.exitcode)
+    if failure:
+        print(f'FAIL {failure} ({data_dir})')
+        sys.exit(1)
+
+    updates = sum(len(v) for o in outcomes for v in o[2].values())
+    rejected = sum(o[3]['rejected'] for o in outcomes)
+    print(f'{args.processes} processes, {updates} acknowledged updates in {elapsed:.1f}s '
+          f'({args.mode} mode, {rejected} requests gave up after retries)')
+
+    errors = verify(data_dir, args.mode, outcomes)
+    for error in errors:
+        print(f'FAIL {error}')
+    if errors:
+        sys.exit(1)
+    print(f'OK: no lost updates ({data_dir})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+from contextlib import nullcontext
+
+# Joins the fields of a document so that no trigram or match spans two fields
+FIELD_SEPARATOR = '\x00'
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex:
+    """Inverted index from trigrams to documents, answering `query in text`.
+
+    Queries of three or more characters only verify the documents that
+    contain the query's rarest trigrams. Shorter queries fall back to a scan
+    of the stored lowercase texts. Results keep the order in which documents
+    were first added.
+    """
+
+    def __init__(self):
+        self._texts = {}     # doc id -> lowercase text
+        self._order = {}     # doc id -> insertion sequence number
+        self._postings = {}  # trigram -> set of doc ids
+        self._next_seq = 0
+
+    def __len__(self):
+        return len(self._texts)
+
+    def add(self, doc_id, text):
+        text = text.lower()
+        old_text = self._texts.get(doc_id)
+        if old_text == text:
+            return
+        if old_text is not None:
+            self._unpost(doc_id, trigrams(old_text) - trigrams(text))
+            new_grams = trigrams(text) - trigrams(old_text)
+        else:
+            self._order[doc_id] = self._next_seq
+            self._next_seq += 1
+            new_grams = trigrams(text)
+
+        self._texts[doc_id] = text
+        for gram in new_grams:
+            self._postings.setdefault(gram, set()).add(doc_id)
+
+    def remove(self, doc_id):
+        text = self._texts.pop(doc_id, None)
+        if text is None:
+            return
+        del self._order[doc_id]
+        self._unpost(doc_id, trigrams(text))
+
+    def _unpost(self, doc_id, grams):
+        for gram in grams:
+            docs = self._postings.get(gram)
+            if docs is not None:
+                docs.discard(doc_id)
+                if not docs:
+                    del self._postings[gram]
+
+    def search(self, query, lock=None):
+        """Ids of the documents whose text contains query, in insertion order.
+
+        With a lock, it is held only while postings and texts are copied,
+        not while they are intersected and checked.
+        """
+        lock = lock or nullcontext()
+        query = query.lower()
+        with lock:
+            if len(query) < 3:
+                texts = list(self._texts.items())
+            else:
+                postings = []
+                for gram in trigrams(query):
+                    docs = self._postings.get(gram)
+                    if not docs:
+                        return []
+                    postings.append(docs)
+                postings.sort(key=len)
+                # Intersecting the two rarest trigrams prunes nearly as well
+                # as all of them; the substring check below removes the rest
+                postings = [set(docs) for docs in postings[:2]]
+        if len(query) < 3:
+            return [doc_id for doc_id, text in texts if query in text]
+
+        candidates = postings[0] & postings[1] if len(postings) > 1 else postings[0]
+        with lock:
+            # Documents removed since the copy are skipped
+            texts = [(self._order[doc_id], doc_id, self._texts[doc_id])
+                     for doc_id in candidates if doc_id in self._texts]
+        matches = sorted((order, doc_id) for order, doc_id, text in texts if query in text)
+        return [doc_id for _, doc_id in matches]
+
+
+def user_text(user, profile):
+    location = (profile or {}).get('location') or user.get('location') or ''
+    return user['fullname'] + FIELD_SEPARATOR + location
+
+
+def skills_text(skills):
+    return FIELD_SEPARATOR.join(
+        skill['skill_name'] + FIELD_SEPARATOR + skill['description'] for skill in skills
+    )
+
+
+class SearchIndex:
+    """Trigram indexes over users (fullname, location) and their skills
+    (skill_name, description), kept current from DataStore saves.
+
+    Both indexes are keyed by user id. Skill hits name the users that have at
+    least one matching skill; the caller picks the matching skills out of
+    that user's list.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._users = None
+        self._skills = None
+        store.subscribe(self._on_save)
+
+    def _on_save(self, filename, data, changed, removed):
+        if filename not in ('users.json', 'profile.json', 'skills.json'):
+            return
+        with self.store.lock:
+            if self._users is None:
+                return
+            if changed is None and removed is None:
+                # Whole collection replaced; rebuild on the next search
+                self._users = self._skills = None
+                return
+
+            for user_id in map(str, list(changed or []) + list(removed or [])):
+                if filename == 'skills.json':
+                    skills = data.get('user_skills', {}).get(user_id)
+                    if skills is None:
+                        self._skills.remove(user_id)
+                    else:
+                        self._skills.add(user_id, skills_text(skills))
+                else:
+                    user = self.store.user(user_id)
+                    if user is None:
+                        self._users.remove(user_id)
+                    else:
+                        self._users.add(user_id, user_text(user, self.store.profile(user_id)))
+
+    def _build(self):
+        users = TrigramIndex()
+        for user in self.store.load('users.json'):
+            users.add(str(user['id']), user_text(user, self.store.profile(user['id'])))
+
+        skills = TrigramIndex()
+        for user_id, user_skills in self.store.load('skills.json').get('user_skills', {}).items():
+            skills.add(str(user_id), skills_text(user_skills))
+
+        self._users, self._skills = users, skills
+
+    def search(self, query):
+        """Return (user ids matching by name/location, user ids with a matching skill)"""
+        with self.store.lock:
+            # Loading first lets a reload from disk invalidate the indexes
+            for filename in ('users.json', 'profile.json', 'skills.json'):
+                self.store.load(filename)
+            if self._users is None:
+                self._build()
+            users, skills = self._users, self._skills
+        # The lock is only retaken to copy postings, so searches do not
+        # hold up other readers and saves while matching
+        return users.search(query, self.store.lock), skills.search(query, self.store.lock)
@@ -0,0 +1,174 @@
+from collections import Counter
+
+STATS_FILES = ('users.json', 'skills.json', 'connections.json')
+
+# Series are counted per hour ('2024-05-01T13' of an ISO timestamp) and
+# summed into coarser buckets when read
+BUCKETS = {'hour': 13, 'day': 10, 'month': 7}
+
+SERIES = ('signups', 'connection_requests', 'connections_accepted')
+
+
+def _hour(timestamp):
+    return timestamp[:BUCKETS['hour']] if isinstance(timestamp, str) and len(timestamp) >= 13 else None
+
+
+class SiteStats:
+    """Site-wide counts for the admin dashboard, kept current from DataStore saves.
+
+    Holds what each user, skill list and connection contributed when last
+    seen, so a save of a few records only adjusts the totals by the
+    difference: users, skills, connections by status, skill popularity and
+    hourly series of signups, connection requests and acceptances (by the
+    created_at/accepted_at of current records). A collection that is
+    replaced or re-read is counted again from scratch on the next read.
+    """
+
+    def __init__(self, store, top_n=10):
+        self.store = store
+        self.top_n = top_n
+        self._users = None        # user id -> signup hour
+        self._skills = None       # user id -> Counter of skill names
+        self._connections = None  # connection id -> (status, request hour, accept hour)
+        self._popularity = Counter()  # skill name as written -> listings
+        self._status = Counter()
+        self._series = {name: Counter() for name in SERIES}
+        store.subscribe(self._on_save)
+
+    def _on_save(self, filename, data, changed, removed):
+        if filename not in STATS_FILES:
+            return
+        with self.store.lock:
+            if self._part(filename) is None:
+                return
+            if changed is None and removed is None:
+                self._reset(filename)
+                return
+            for key in map(str, list(removed or []) + list(changed or [])):
+                self._forget(filename, key)
+            for key in map(str, changed or []):
+                self._count(filename, key, self._lookup(filename, data, key))
+
+    def _part(self, filename):
+        return {'users.json': self._users, 'skills.json': self._skills,
+                'connections.json': self._connections}[filename]
+
+    def _reset(self, filename):
+        if filename == 'users.json':
+            self._users = None
+            self._series['signups'].clear()
+        elif filename == 'skills.json':
+            self._skills = None
+            self._popularity.clear()
+        else:
+            self._connections = None
+            self._status.clear()
+            self._series['connection_requests'].clear()
+            self._series['connections_accepted'].clear()
+
+    def _lookup(self, filename, data, key):
+        if filename == 'users.json':
+            return self.store.user(key)
+        if filename == 'skills.json':
+            return data.get('user_skills', {}).get(key)
+        return self.store.connection(key)
+
+    def _forget(self, filename, key):
+        if filename == 'users.json':
+            if key in self._users:
+                hour = self._users.pop(key)
+                if hour:
+                    self._series['signups'][hour] -= 1
+        elif filename == 'skills.json':
+            self._popularity.subtract(self._skills.pop(key, Counter()))
+        elif key in self._connections:
+            status, requested, accepted = self._connections.pop(key)
+            self._status[status] -= 1
+            if requested:
+                self._series['connection_requests'][requested] -= 1
+            if accepted:
+                self._series['connections_accepted'][accepted] -= 1
+
+    def _count(self, filename, key, record):
+        if record is None:
+            return
+        if filename == 'users.json':
+            if key in self._users:
+                # Duplicate ids in the file: the first one counts, as in DataStore
+                return
+            hour = self._users[key] = _hour(record.get('created_at'))
+            if hour:
+                self._series['signups'][hour] += 1
+        elif filename == 'skills.json':
+            skills = Counter()
+            for skill in record:
+                name = str(skill.get('skill_name', '')).strip()
+                if name:
+                    skills[name] += 1
+            self._skills[key] = skills
+            self._popularity.update(skills)
+        else:
+            if key in self._connections:
+                return
+            status = record.get('status')
+            requested = _hour(record.get('created_at'))
+            accepted = _hour(record.get('accepted_at')) if status == 'connected' else None
+            self._connections[key] = (status, requested, accepted)
+            self._status[status] += 1
+            if requested:
+                self._series['connection_requests'][requested] += 1
+            if accepted:
+                self._series['connections_accepted'][accepted] += 1
+
+    def _ensure(self):
+        # Loading first lets a reload from disk reset the counts
+        for filename in STATS_FILES:
+            data = self.store.load(filename)
+            if self._part(filename) is not None:
+                continue
+            if filename == 'users.json':
+                self._users = {}
+                records = ((str(user['id']), user) for user in data)
+            elif filename == 'skills.json':
+                self._skills = {}
+                records = data.get('user_skills', {}).items()
+            else:
+                self._connections = {}
+                records = ((str(connection['id']), connection) for connection in data)
+            for key, record in records:
+                self._count(filename, key, record)
+
+    def summary(self):
+        """Totals and the top_n most listed skills as [(name, count)]"""
+        with self.store.lock:
+            self._ensure()
+            # 'python' and 'Python' are one skill, shown as its commonest spelling
+            totals, spellings = Counter(), {}
+            for name, count in self._popularity.items():
+                if count > 0:
+                    totals[name.casefold()] += count
+                    spellings.setdefault(name.casefold(), []).append((-count, name))
+            ranked = sorted(totals.items(), key=lambda item: (-item[1], item[0]))[:self.top_n]
+            top = [(min(spellings[key])[1], count) for key, count in ranked]
+            return {
+                'users': len(self._users),
+                'skills': sum(totals.values()),
+                'pending_connections': self._status['pending'],
+                'connected_connections': self._status['connected'],
+                'top_skills': top,
+            }
+
+    def series(self, bucket='day'):
+        """{series name: [(bucket, count)]} in time order, e.g. ('2024-05-01', 3) per day"""
+        if bucket not in BUCKETS:
+            raise ValueError(f'Unknown bucket: {bucket}')
+        width = BUCKETS[bucket]
+        with self.store.lock:
+            self._ensure()
+            result = {}
+            for name, hours in self._series.items():
+                totals = Counter()
+                for hour, count in hours.items():
+                    totals[hour[:width]] += count
+                result[name] = sorted((key, count) for key, count in totals.items() if count)
+            return result
@@ -0,0 +1,119 @@
+import heapq
+from collections import Counter
+
+
+def _id_order(user_id):
+    # User ids are decimal strings; order them numerically
+    return (len(user_id), user_id)
+
+
+def skill_names(skills):
+    """Names in a user's skills.json list, as matched: stripped, empty ones left out"""
+    return frozenset(name for name in (str(skill.get('skill_name', '')).strip() for skill in skills) if name)
+
+
+class SkillIndex:
+    """Inverted index from skill name to the users listing it in skills.json.
+
+    Kept current from DataStore saves like ConnectionGraph: each user's
+    skill set as indexed, and for every skill the set of user ids holding
+    it. Matches for a user then only look at users sharing at least one
+    skill instead of comparing against every user. Rebuilt whenever the
+    collection is replaced or re-read.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._skills = None   # user id -> frozenset of skill names as indexed
+        self._holders = None  # skill name -> set of user ids
+        store.subscribe(self._on_save)
+
+    def _on_save(self, filename, data, changed, removed):
+        if filename != 'skills.json':
+            return
+        with self.store.lock:
+            if self._skills is None:
+                return
+            if changed is None and removed is None:
+                self._skills = None
+                return
+            user_skills = data.get('user_skills', {})
+            for user_id in map(str, list(removed or []) + list(changed or [])):
+                self._unlink(user_id)
+            for user_id in map(str, changed or []):
+                if user_id in user_skills:
+                    self._link(user_id, user_skills[user_id])
+
+    def _ensure(self):
+        # Loading first lets a reload from disk invalidate the index
+        data = self.store.load('skills.json')
+        if self._skills is None:
+            self._skills, self._holders = {}, {}
+            for user_id, skills in data.get('user_skills', {}).items():
+                self._link(user_id, skills)
+
+    def _link(self, user_id, skills):
+        skills = skill_names(skills)
+        self._skills[user_id] = skills
+        for skill in skills:
+            self._holders.setdefault(skill, set()).add(user_id)
+
+    def _unlink(self, user_id):
+        for skill in self._skills.pop(user_id, ()):
+            holders = self._holders[skill]
+            holders.discard(user_id)
+            if not holders:
+                del self._holders[skill]
+
+    def skills(self, user_id):
+        with self.store.lock:
+            self._ensure()
+            return self._skills.get(str(user_id), frozenset())
+
+    def holders(self, skill):
+        """Number of users listing a skill"""
+        with self.store.lock:
+            self._ensure()
+            return len(self._holders.get(skill, ()))
+
+    def matches(self, user_id, limit=20, offset=0):
+        """Return (total, page) of other users sharing a skill with user_id.
+
+        page is [(other user id, sorted shared skills)] for ranks offset to
+        offset + limit. Users are ranked by the number of shared skills,
+        then by Jaccard similarity of the two skill sets (at equal overlap,
+        fewer other skills ranks higher), then by id. Only users present in
+        users.json are counted.
+        """
+        user_id = str(user_id)
+        with self.store.lock:
+            self._ensure()
+            users = self.store.index('users.json', 'key')
+            mine = self._skills.get(user_id, frozenset())
+            overlap = Counter()
+            for skill in mine:
+                overlap.update(self._holders[skill])
+            overlap.pop(user_id, None)
+
+            # Overlap is at most len(mine), so group by it and only order
+            # the groups the requested page reaches into
+            by_overlap = {}
+            for other_id, shared in overlap.items():
+                if other_id in users:
+                    by_overlap.setdefault(shared, []).append(other_id)
+            total = sum(len(group) for group in by_overlap.values())
+
+            page, skip, wanted = [], offset, limit
+            for shared in sorted(by_overlap, reverse=True):
+                group = by_overlap[shared]
+                if skip >= len(group):
+                    skip -= len(group)
+                    continue
+                ranked = heapq.nsmallest(skip + wanted, group, key=lambda other_id: (
+                    len(self._skills[other_id]), _id_order(other_id)))
+                page.extend(ranked[skip:])
+                wanted -= len(ranked) - skip
+                skip = 0
+                if wanted <= 0:
+                    break
+            return total, [(other_id, sorted(mine & self._skills[other_id])) for other_id in page]
@@ -0,0 +1,465 @@
+import json
+import os
+import sqlite3
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, run a single worker
+    fcntl = None
+
+from journal import Journal, apply_changes, atomic_write, record_key
+
+STORAGE_MODES = ('json', 'journal', 'sqlite')
+
+# 'always' fsyncs every journal append, 'interval' leaves it to the
+# background thread once per fsync_interval, 'never' leaves it to the OS
+FSYNC_POLICIES = ('always', 'interval', 'never')
+
+
+def empty_collection(filename):
+    """Value used when a collection file is missing or unreadable"""
+    return {} if filename == 'skills.json' else []
+
+
+class Storage:
+    """Where a DataStore keeps its collections.
+
+    A collection is named by its JSON filename and read and written whole or
+    as journal.KEY_FIELDS-keyed changes ({'op': 'put' | 'delete' | 'replace'}).
+    Each collection also has a save counter that lets DataStore detect saves
+    made by other processes. DataStore calls these methods with its lock held;
+    version(), read() and write() only within locked().
+    """
+
+    # Whether DataStore should run a background thread for compact()/sync()
+    background = False
+
+    def __init__(self):
+        # Bytes read and written per collection since start, for /admin/metrics
+        self.bytes_read = {}
+        self.bytes_written = {}
+
+    @staticmethod
+    def _count(totals, filename, size):
+        totals[filename] = totals.get(filename, 0) + size
+
+    def signature(self, filename):
+        """Cheap value that changes whenever the stored collection does"""
+        raise NotImplementedError
+
+    def locked(self, filenames, exclusive):
+        """Context manager holding a lock on the collections across processes"""
+        raise NotImplementedError
+
+    def version(self, filename):
+        """Number of saves of a collection"""
+        raise NotImplementedError
+
+    def read(self, filename):
+        """Return (data, position); position is passed back to read_since()"""
+        raise NotImplementedError
+
+    def read_since(self, filename, old_signature, new_signature, position):
+        """Return (change lists, position) written since a read, or None to re-read"""
+        return None
+
+    def write(self, filename, data, changes, version):
+        """Store changes to a collection, now at data; returns the new position"""
+        raise NotImplementedError
+
+    def read_record(self, filename, key):
+        """Return (found, record) for one key without reading the collection, or None if unsupported"""
+        return None
+
+    def find_records(self, filename, field, value):
+        """Return the records whose field equals value, in file order, without reading
+        the collection, or None if unsupported for that field"""
+        return None
+
+    def needs_compaction(self, filename):
+        return False
+
+    def compact(self, filename):
+        pass
+
+    def sync(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class JsonStorage(Storage):
+    """One JSON file per collection in the data directory.
+
+    With journal=True a save appends only its changes to <file>.journal and
+    the collection is the snapshot file plus its journal; compact() folds the
+    journal into a new snapshot. Otherwise every save rewrites the file via a
+    temp file, fsync and rename. Saves lock <file>.lock with fcntl and count
+    themselves in <file>.version.
+    """
+
+    def __init__(self, data_dir, journal=False, fsync='always', journal_max_bytes=1024 * 1024):
+        super().__init__()
+        self.data_dir = data_dir
+        self.journaled = journal
+        self.background = journal
+        self.fsync = fsync
+        self.journal_max_bytes = journal_max_bytes
+        self._journals = {}    # filename -> Journal
+        self._lock_files = {}  # filename -> open fd of <file>.lock
+        self._held = set()
+
+    def path(self, filename):
+        return os.path.join(self.data_dir, filename)
+
+    def _journal(self, filename):
+        if filename not in self._journals:
+            self._journals[filename] = Journal(self.path(filename))
+        return self._journals[filename]
+
+    def signature(self, filename):
+        try:
+            st = os.stat(self.path(filename))
+            # The inode changes on every atomic rename, even within one mtime tick
+            signature = (st.st_ino, st.st_mtime_ns, st.st_size)
+        except OSError:
+            signature = None
+        if self.journaled:
+            return (signature,) + self._journal(filename).signature()
+        return signature
+
+    @contextmanager
+    def locked(self, filenames, exclusive):
+        """Hold the fcntl locks of several collections, taken in name order.
+
+        Nested calls for a file this process already holds are no-ops.
+        """
+        acquired = []
+        try:
+            for filename in sorted(set(filenames)):
+                if filename in self._held:
+                    continue
+                if fcntl is not None:
+                    if filename not in self._lock_files:
+                        self._lock_files[filename] = os.open(
+                            f'{self.path(filename)}.lock', os.O_RDWR | os.O_CREAT, 0o644)
+                    fcntl.flock(self._lock_files[filename],
+                                fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+                self._held.add(filename)
+                acquired.append(filename)
+            yield
+        finally:
+            for filename in reversed(acquired):
+                self._held.discard(filename)
+                if fcntl is not None:
+                    fcntl.flock(self._lock_files[filename], fcntl.LOCK_UN)
+
+    def version(self, filename):
+        try:
+            with open(f'{self.path(filename)}.version', 'r') as f:
+                return int(f.read() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def read(self, filename):
+        try:
+            with open(self.path(filename), 'r') as f:
+                text = f.read()
+            self._count(self.bytes_read, filename, len(text))
+            data = json.loads(text)
+        except (OSError, ValueError):
+            data = empty_collection(filename)
+
+        offset = 0
+        if self.journaled:
+            journal = self._journal(filename)
+            entries, offset = journal.read()
+            self._count(self.bytes_read, filename, offset)
+            for changes in journal.read_rotated() + entries:
+                data = apply_changes(filename, data, changes)
+        return data, offset
+
+    def read_since(self, filename, old_signature, new_signature, position):
+        if not self.journaled:
+            return None
+        old_journal, new_journal = old_signature[2], new_signature[2]
+        # A replaced snapshot or a rotated journal means a compaction ran
+        if (old_signature[:2] != new_signature[:2] or new_journal is None or
+                (old_journal is not None and old_journal[0] != new_journal[0])):
+            return None
+        entries, offset = self._journal(filename).read(position)
+        self._count(self.bytes_read, filename, offset - position)
+        return entries, offset
+
+    def write(self, filename, data, changes, version):
+        offset = 0
+        if self.journaled:
+            journal = self._journal(filename)
+            before = journal.size()
+            journal.append(changes, fsync=self.fsync == 'always')
+            offset = journal.size()
+            self._count(self.bytes_written, filename, offset - before)
+        else:
+            text = json.dumps(data, indent=4)
+            atomic_write(self.path(filename), text)
+            self._count(self.bytes_written, filename, len(text))
+        # Only read under the lock, so a plain overwrite is enough
+        with open(f'{self.path(filename)}.version', 'w') as f:
+            f.write(str(version))
+        return offset
+
+    def needs_compaction(self, filename):
+        return self.journaled and self._journal(filename).size() > self.journal_max_bytes
+
+    def compact(self, filename):
+        """Write a fresh snapshot of a collection and drop its journal.
+
+        The snapshot is built from the files, not a cached copy, which may
+        hold changes a request has not saved yet.
+        """
+        with self.locked([filename], exclusive=True):
+            data, _ = self.read(filename)
+            journal = self._journal(filename)
+            journal.rotate()
+            atomic_write(self.path(filename), json.dumps(data, indent=4))
+            journal.drop_rotated()
+
+    def sync(self):
+        for journal in self._journals.values():
+            journal.sync()
+
+    def close(self):
+        self.sync()
+        for fd in self._lock_files.values():
+            os.close(fd)
+        self._lock_files.clear()
+
+
+# Saves kept in the SQLite change log for other processes to catch up from
+CHANGE_LOG_VERSIONS = 1000
+
+# SQLite table for each collection and the record fields kept in indexed
+# columns next to the JSON body, for find_records(). Every table also
+# indexes the record's key from journal.KEY_FIELDS (the user id for
+# profiles, user skill rows and skills.json, which has one row per user).
+SQLITE_TABLES = {
+    'users.json': ('users', ('email',)),
+    'profile.json': ('profiles', ()),
+    'connections.json': ('connections', ('user_id', 'connected_user_id')),
+    'user_interests.json': ('user_interests', ()),
+    'user_skills.json': ('user_skill_records', ()),
+    'skills.json': ('skills', ()),
+    'uploads.json': ('uploads', ()),
+}
+
+
+class SqliteStorage(Storage):
+    """All collections in one SQLite database, data/skillswap.db.
+
+    Each record is a row holding its JSON body, its indexed key and the
+    indexed fields from SQLITE_TABLES; rows keep file order through their
+    rowid. read() still returns the whole collection for DataStore's cache,
+    but read_record() fetches one row by key and find_records() the rows
+    with a users.email or connection endpoint, so DataStore can answer those
+    lookups without loading the collection. Hinted saves update or delete
+    just the changed rows, found by key. The
+    save counters live in a collections table. A change log of the keys
+    each save touched lets other processes re-read just those rows. The
+    database runs in WAL mode, so readers in other processes are not
+    blocked by a save, and a save holds the write lock (BEGIN IMMEDIATE)
+    only while its rows are written.
+    """
+
+    def __init__(self, data_dir, fsync='always', filename='skillswap.db'):
+        super().__init__()
+        self.path = os.path.join(data_dir, filename)
+        # Statements are cached per connection, so each SQL string below is
+        # prepared once; DataStore serializes access to the connection
+        self._db = sqlite3.connect(self.path, timeout=30, isolation_level=None,
+                                   check_same_thread=False, cached_statements=256)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        # NORMAL survives an app crash in WAL mode but may lose the last
+        # commits on power loss, like the 'never' fsync policy of journals
+        self._db.execute(f"PRAGMA synchronous={'FULL' if fsync == 'always' else 'NORMAL'}")
+        self._depth = 0
+        self._create_schema()
+
+    def _create_schema(self):
+        with self.locked(SQLITE_TABLES, exclusive=True):
+            self._db.execute('CREATE TABLE IF NOT EXISTS collections '
+                             '(name TEXT PRIMARY KEY, version INTEGER NOT NULL)')
+            self._db.execute('CREATE TABLE IF NOT EXISTS changes '
+                             '(name TEXT NOT NULL, version INTEGER NOT NULL, key TEXT)')
+            self._db.execute('CREATE INDEX IF NOT EXISTS changes_version ON changes (name, version)')
+            for table, columns in SQLITE_TABLES.values():
+                extra = ''.join(f', {column} TEXT' for column in columns)
+                self._db.execute(f'CREATE TABLE IF NOT EXISTS {table} (seq INTEGER PRIMARY KEY, '
+                                 f'key TEXT NOT NULL, body TEXT NOT NULL{extra})')
+                existing = {row[1] for row in self._db.execute(f'PRAGMA table_info({table})')}
+                for column in columns:
+                    if column not in existing:
+                        # A database written before the column was added
+                        self._db.execute(f'ALTER TABLE {table} ADD COLUMN {column} TEXT')
+                        self._db.execute(f"UPDATE {table} SET {column} = json_extract(body, '$.{column}')")
+                for column in ('key',) + columns:
+                    self._db.execute(f'CREATE INDEX IF NOT EXISTS {table}_{column} ON {table} ({column})')
+
+    @staticmethod
+    def _table(filename):
+        if filename not in SQLITE_TABLES:
+            raise KeyError(f'No SQLite table for {filename}')
+        return SQLITE_TABLES[filename]
+
+    def signature(self, filename):
+        # Reads the committed counter outside any transaction
+        return self.version(filename)
+
+    @contextmanager
+    def locked(self, filenames, exclusive):
+        """One transaction; exclusive ones take the database write lock up front"""
+        if self._depth:
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+            return
+
+        self._db.execute('BEGIN IMMEDIATE' if exclusive else 'BEGIN')
+        self._depth = 1
+        try:
+            yield
+        except BaseException:
+            self._db.execute('ROLLBACK')
+            raise
+        else:
+            self._db.execute('COMMIT')
+        finally:
+            self._depth = 0
+
+    def version(self, filename):
+        row = self._db.execute('SELECT version FROM collections WHERE name = ?', (filename,)).fetchone()
+        return row[0] if row else 0
+
+    def read(self, filename):
+        table, _ = self._table(filename)
+        records, size = [], 0
+        for key, body in self._db.execute(f'SELECT key, body FROM {table} ORDER BY seq'):
+            records.append((key, json.loads(body)))
+            size += len(body)
+        self._count(self.bytes_read, filename, size)
+        if filename == 'skills.json':
+            return ({'user_skills': dict(records)} if records else {}), 0
+        return [value for _, value in records], 0
+
+    def read_record(self, filename, key):
+        table, _ = self._table(filename)
+        row = self._db.execute(f'SELECT body FROM {table} WHERE key = ? ORDER BY seq LIMIT 1', (key,)).fetchone()
+        if row is None:
+            return False, None
+        self._count(self.bytes_read, filename, len(row[0]))
+        return True, json.loads(row[0])
+
+    def find_records(self, filename, field, value):
+        table, columns = self._table(filename)
+        if field not in columns:
+            return None
+        records = []
+        # Columns hold the fields as text, as _row() writes them
+        for body, in self._db.execute(f'SELECT body FROM {table} WHERE {field} = ? ORDER BY seq',
+                                      (str(value),)):
+            self._count(self.bytes_read, filename, len(body))
+            records.append(json.loads(body))
+        return records
+
+    def read_since(self, filename, old_signature, new_signature, position):
+        # Signatures are save counters; a NULL key marks a whole replacement
+        if new_signature - old_signature > CHANGE_LOG_VERSIONS:
+            return None
+        table, _ = self._table(filename)
+        keys = [key for key, in self._db.execute(
+            'SELECT DISTINCT key FROM changes WHERE name = ? AND version > ?', (filename, old_signature))]
+        if None in keys:
+            return None
+        changes = []
+        for key in keys:
+            row = self._db.execute(
+                f'SELECT body FROM {table} WHERE seq = (SELECT MIN(seq) FROM {table} WHERE key = ?)',
+                (key,)).fetchone()
+            if row is None:
+                changes.append({'op': 'delete', 'key': key})
+            else:
+                self._count(self.bytes_read, filename, len(row[0]))
+                changes.append({'op': 'put', 'key': key, 'value': json.loads(row[0])})
+        return [changes], position
+
+    def _row(self, filename, key, value):
+        _, columns = self._table(filename)
+        body = json.dumps(value)
+        self._count(self.bytes_written, filename, len(body))
+        fields = [None if value.get(column) is None else str(value[column]) for column in columns]
+        return [body] + fields + [key]
+
+    def _put(self, filename, key, value):
+        table, columns = self._table(filename)
+        assignments = ''.join(f', {column} = ?' for column in columns)
+        # Like journal.apply_changes, a put replaces the first record with the key
+        updated = self._db.execute(
+            f'UPDATE {table} SET body = ?{assignments} '
+            f'WHERE seq = (SELECT MIN(seq) FROM {table} WHERE key = ?)',
+            self._row(filename, key, value))
+        if updated.rowcount == 0:
+            self._insert(filename, [(key, value)])
+
+    def _insert(self, filename, records):
+        table, columns = self._table(filename)
+        names = ''.join(f', {column}' for column in columns)
+        marks = ', ?' * len(columns)
+        self._db.executemany(
+            f'INSERT INTO {table} (body{names}, key) VALUES (?{marks}, ?)',
+            (self._row(filename, key, value) for key, value in records))
+
+    def _delete(self, filename, key):
+        table, _ = self._table(filename)
+        self._db.execute(f'DELETE FROM {table} WHERE seq = (SELECT MIN(seq) FROM {table} WHERE key = ?)',
+                         (key,))
+
+    def _replace(self, filename, data):
+        table, _ = self._table(filename)
+        self._db.execute(f'DELETE FROM {table}')
+        if filename == 'skills.json':
+            self._insert(filename, list(data.get('user_skills', {}).items()))
+        else:
+            self._insert(filename, [(record_key(filename, r), r) for r in data])
+
+    def write(self, filename, data, changes, version):
+        for change in changes:
+            if change['op'] == 'replace':
+                self._replace(filename, change['value'])
+            elif change['op'] == 'put':
+                self._put(filename, change['key'], change['value'])
+            else:
+                self._delete(filename, change['key'])
+        self._db.executemany('INSERT INTO changes (name, version, key) VALUES (?, ?, ?)',
+                             ((filename, version, change.get('key')) for change in changes))
+        self._db.execute('DELETE FROM changes WHERE name = ? AND version <= ?',
+                         (filename, version - CHANGE_LOG_VERSIONS))
+        self._db.execute('INSERT OR REPLACE INTO collections (name, version) VALUES (?, ?)',
+                         (filename, version))
+        return 0
+
+    def close(self):
+        self._db.close()
+
+
+def open_storage(data_dir, mode='json', fsync='always', journal_max_bytes=1024 * 1024):
+    if mode not in STORAGE_MODES:
+        raise ValueError(f'Unknown storage mode: {mode}')
+    if fsync not in FSYNC_POLICIES:
+        raise ValueError(f'Unknown fsync policy: {fsync}')
+    if mode == 'sqlite':
+        return SqliteStorage(data_dir, fsync=fsync)
+    return JsonStorage(data_dir, journal=mode == 'journal', fsync=fsync,
+                       journal_max_bytes=journal_max_bytes)
@@ -0,0 +1,86 @@
+class UnitOfWork:
+    """Per-request view of the DataStore.
+
+    Each collection is loaded at most once, saves only mark it dirty, and
+    flush() writes every dirty collection once with the union of the record
+    keys named by its saves. Callbacks registered with after_flush run once
+    the data is stored, e.g. to notify other users; those registered with
+    on_commit run while the store still holds its locks, for file changes
+    that have to match the stored records.
+
+    flush() saves all dirty collections together and only if no other
+    process saved them since this request read them; otherwise the store
+    raises WriteConflict, and rollback() lets the caller start over.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._loaded = {}
+        self._read_versions = {}  # filename -> disk version the request read
+        self._dirty = {}  # filename -> [data, changed keys, removed keys, whole file]
+        self._after_flush = []
+        self._on_commit = []
+        self.loads = 0
+        self.flushes = 0
+
+    def load(self, filename):
+        if filename not in self._loaded:
+            with self.store.lock:
+                self._loaded[filename] = self.store.load(filename)
+                self._read_versions[filename] = self.store.disk_version(filename)
+            self.loads += 1
+        return self._loaded[filename]
+
+    def save(self, data, filename, changed=None, removed=None):
+        self._loaded[filename] = data
+        entry = self._dirty.setdefault(filename, [data, [], [], False])
+        entry[0] = data
+        if changed is None and removed is None:
+            entry[3] = True
+        entry[1].extend(str(key) for key in changed or [])
+        entry[2].extend(str(key) for key in removed or [])
+
+    def after_flush(self, callback):
+        self._after_flush.append(callback)
+
+    def on_commit(self, callback):
+        self._on_commit.append(callback)
+
+    def _commit(self):
+        callbacks, self._on_commit = self._on_commit, []
+        for callback in callbacks:
+            callback()
+
+    def flush(self):
+        writes = []
+        for filename, (data, changed, removed, whole) in self._dirty.items():
+            if whole:
+                writes.append((data, filename, None, None))
+            else:
+                # A key removed and then re-added within the request is a change
+                removed = [key for key in removed if key not in changed]
+                writes.append((data, filename, changed, removed))
+        if writes:
+            versions = {filename: self._read_versions[filename]
+                        for filename in self._dirty if filename in self._read_versions}
+            self.store.save_many(writes, versions, on_commit=self._commit)
+            self.flushes += len(writes)
+        self._dirty.clear()
+
+        callbacks, self._after_flush = self._after_flush, []
+        for callback in callbacks:
+            callback()
+
+    def rollback(self):
+        """Forget everything read and saved so far.
+
+        Collections with unsaved changes were mutated in the shared cache, so
+        the store drops them and the next load reads them from disk.
+        """
+        for filename in self._dirty:
+            self.store.invalidate(filename)
+        self._loaded.clear()
+        self._read_versions.clear()
+        self._dirty.clear()
+        self._after_flush.clear()
+        self._on_commit.clear()
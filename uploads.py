@@ -0,0 +1,115 @@
+import hashlib
+import os
+import re
+import tempfile
+
+from flask import Request, current_app
+from werkzeug.exceptions import UnsupportedMediaType
+
+# Leading bytes of each accepted image type -> stored extension
+MAGIC_NUMBERS = [
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+]
+
+# Enough to tell every type above apart, including RIFF....WEBP
+SNIFF_BYTES = 12
+
+# Names of stored uploads: hex SHA-256 of the content plus the sniffed extension
+CONTENT_NAME = re.compile(r'[0-9a-f]{64}\.(png|jpg|gif|webp)')
+
+
+class UploadRejected(UnsupportedMediaType):
+    description = 'Only PNG, JPEG, GIF and WebP images can be uploaded.'
+
+
+def sniff_type(head):
+    """Extension for the image type a file starts with, or None"""
+    for magic, ext in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return ext
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+def is_content_name(name):
+    return CONTENT_NAME.fullmatch(name) is not None
+
+
+class HashedUpload:
+    """File object the multipart parser streams an upload into.
+
+    Chunks go straight to a temp file in the upload folder while being
+    hashed, so the upload is never held in memory. The type is sniffed from
+    the first bytes, and anything that is not an image stops the parser
+    there with UploadRejected. Once the request has recorded the upload,
+    commit() moves it to <sha256>.<ext>; identical uploads share one file.
+    """
+
+    def __init__(self, directory):
+        fd, self.temp_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        self._file = os.fdopen(fd, 'w+b')
+        self._sha256 = hashlib.sha256()
+        self._head = b''
+        self.ext = None
+        self.size = 0
+
+    def write(self, data):
+        if self.ext is None:
+            self._head += data[:SNIFF_BYTES]
+            if len(self._head) >= SNIFF_BYTES:
+                self._sniff()
+        self._sha256.update(data)
+        self._file.write(data)
+        self.size += len(data)
+        return len(data)
+
+    def _sniff(self):
+        self.ext = sniff_type(self._head)
+        if self.ext is None:
+            self.close()
+            raise UploadRejected()
+
+    @property
+    def content_name(self):
+        """'<sha256>.<ext>' of the complete upload"""
+        if self.ext is None:
+            # Shorter than SNIFF_BYTES
+            self._sniff()
+        return f'{self._sha256.hexdigest()}.{self.ext}'
+
+    def commit(self, directory):
+        """Move the upload to its content name unless that file exists; returns its path"""
+        path = os.path.join(directory, self.content_name)
+        if not os.path.exists(path):
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            os.replace(self.temp_path, path)
+        return path
+
+    def seek(self, *args):
+        return self._file.seek(*args)
+
+    def read(self, *args):
+        return self._file.read(*args)
+
+    def readline(self, *args):
+        return self._file.readline(*args)
+
+    def tell(self):
+        return self._file.tell()
+
+    def close(self):
+        self._file.close()
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+
+class UploadRequest(Request):
+    """Request whose file uploads stream into HashedUpload in UPLOAD_FOLDER"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return HashedUpload(current_app.config['UPLOAD_FOLDER'])